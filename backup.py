@@ -0,0 +1,96 @@
+"""
+Backup database online memakai SQLite backup API
+Snapshot konsisten tanpa menghentikan penulis (WAL), diverifikasi dengan integrity_check,
+dikompres (zstd jika tersedia, selain itu gzip) lalu dirotasi di folder lokal
+"""
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+from typing import List
+
+try:
+    import zstandard
+except ImportError:  # zstandard opsional, fallback ke gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Jumlah page per langkah backup; di antara langkah penulis lain tetap bisa commit
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_STEP_SLEEP = 0.005
+
+BACKUP_PREFIX = 'finance_'
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    """Snapshot gagal dibuat atau tidak lolos integrity_check"""
+
+
+def _compressed_writer(path: str):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).stream_writer(open(path, 'wb'), closefd=True)
+    return gzip.open(path, 'wb', compresslevel=6)
+
+
+def create_backup(helper, backup_dir: str, keep: int = 7) -> str:
+    """
+    Membuat snapshot database ke backup_dir lalu merotasi backup lama.
+    Harus dijalankan di thread database (db.run), karena memakai koneksi thread tersebut
+    sebagai sumber. Returns path file backup terkompresi
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    snapshot_path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{timestamp}.db.tmp")
+    extension = '.db.zst' if zstandard is not None else '.db.gz'
+    backup_path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{timestamp}{extension}")
+    
+    try:
+        # Salin per page ke file sementara
+        target = sqlite3.connect(snapshot_path)
+        try:
+            helper.get_connection().backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+            result = target.execute('PRAGMA integrity_check').fetchone()[0]
+            if result != 'ok':
+                raise BackupError(f"Integrity check failed: {result}")
+            # Snapshot berdiri sendiri, tanpa file -wal terpisah
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+        
+        with open(snapshot_path, 'rb') as source, _compressed_writer(backup_path + '.tmp') as output:
+            shutil.copyfileobj(source, output, COPY_CHUNK_SIZE)
+        os.replace(backup_path + '.tmp', backup_path)
+    except Exception:
+        if os.path.exists(backup_path + '.tmp'):
+            os.remove(backup_path + '.tmp')
+        raise
+    finally:
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+    
+    rotate_backups(backup_dir, keep)
+    logger.info(f"Database backup created: {backup_path} ({os.path.getsize(backup_path)} bytes)")
+    return backup_path
+
+
+def list_backups(backup_dir: str) -> List[str]:
+    """Daftar file backup, terbaru lebih dulu"""
+    paths = []
+    for extension in ('.db.zst', '.db.gz'):
+        paths.extend(glob.glob(os.path.join(backup_dir, f"{BACKUP_PREFIX}*{extension}")))
+    # Nama file memuat timestamp, jadi urutan nama = urutan waktu
+    return sorted(paths, key=os.path.basename, reverse=True)
+
+
+def rotate_backups(backup_dir: str, keep: int):
+    """Menghapus backup selain `keep` file terbaru"""
+    for path in list_backups(backup_dir)[keep:]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.error(f"Error removing old backup {path}: {e}")
@@ -0,0 +1,478 @@
+"""
+Benchmark DBHelper, chart, export & validate_amount pada dataset sintetis (seeded)
+
+    python benchmark.py                                   # skala default, hasil ke benchmark_results.json
+    python benchmark.py --scales 1000,100000 --repeat 10
+    python benchmark.py --save-baseline                   # simpan hasil sebagai baseline
+    python benchmark.py --baseline benchmark_baseline.json --tolerance 0.3   # exit 1 jika regresi
+
+Setiap skala memakai database baru berisi N user & M transaksi dengan distribusi kategori,
+nominal, mode, debt dan subscription yang mirip data produksi. Seed yang sama selalu
+menghasilkan dataset yang sama, jadi hasil antar commit bisa dibandingkan.
+Case yang menambah data (MUTATING_CASES) diukur di salinan database masing-masing, sehingga
+case lain selalu mengukur dataset seeded yang sama.
+
+benchmark_baseline.json di repo dibuat dengan skala & seed default; perbarui dengan
+--save-baseline (di mesin yang sama dengan pembandingnya) saat perubahan performa disengaja
+"""
+import argparse
+import inspect
+import json
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+
+from config import (
+    INCOME_CATEGORIES, EXPENSE_CATEGORIES, SUBSCRIPTION_TIERS, MODE_PERSONAL, MODE_BUSINESS,
+    DEFAULT_TIMEZONE
+)
+from chart_renderers import RENDERERS, render_chart
+from db_helper import DBHelper, TRANSACTION_COLUMNS, local_month, month_bounds
+from utils import (
+    generate_pie_chart, generate_bar_chart, export_to_csv, export_to_excel,
+    export_rows_to_csv, export_rows_to_excel, validate_amount, to_minor_units
+)
+
+logger = logging.getLogger('benchmark')
+
+DEFAULT_SCALES = '1000,10000'
+DEFAULT_OUTPUT = 'benchmark_results.json'
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+# Bobot kemunculan & median nominal (rupiah) per kategori; kategori lain memakai DEFAULT_PROFILE
+INCOME_PROFILE = {
+    '💰 Gaji/Salary': (50, 6_500_000),
+    '💼 Bisnis/Business': (12, 3_000_000),
+    '📈 Investasi/Investment': (6, 750_000),
+    '🎁 Hadiah/Gift': (4, 250_000),
+    '🏆 Bonus/Commission': (6, 1_500_000),
+    '🏠 Sewa/Rental Income': (4, 2_000_000),
+    '💵 Freelance/Project': (12, 1_750_000),
+}
+EXPENSE_PROFILE = {
+    '🍔 Makanan & Minuman': (35, 45_000),
+    '🚗 Transportasi': (18, 30_000),
+    '🏠 Rumah & Utilitas': (6, 650_000),
+    '🎮 Hiburan & Rekreasi': (7, 120_000),
+    '👔 Belanja & Fashion': (8, 250_000),
+    '💊 Kesehatan & Medis': (3, 200_000),
+    '📚 Pendidikan & Kursus': (2, 500_000),
+    '🏢 Operasional Bisnis': (4, 900_000),
+    '👥 Gaji Karyawan': (1, 4_500_000),
+    '📱 Komunikasi & Internet': (5, 150_000),
+    '🔧 Maintenance & Repair': (2, 350_000),
+    '💳 Cicilan & Hutang': (3, 1_200_000),
+}
+DEFAULT_PROFILE = (2, 100_000)
+
+TIER_WEIGHTS = {'free': 70, 'basic': 20, 'premium': 10}
+TIMEZONE_WEIGHTS = {DEFAULT_TIMEZONE: 85, 'Asia/Makassar': 10, 'Asia/Jayapura': 5}
+DESCRIPTIONS = ['-', 'makan siang', 'grab', 'bensin', 'listrik', 'pulsa', 'transfer', 'belanja bulanan',
+                'ngopi', 'gaji bulanan', 'project website', 'servis motor', 'parkir', 'obat']
+INCOME_RATIO = 0.3
+BUSINESS_RATIO = 0.15
+
+# Method yang memang tidak diukur (infrastruktur koneksi, bukan query)
+UNTIMED_METHODS = {'get_connection', 'transaction', 'close'}
+
+# Case yang menambah baris - diukur di salinan database agar dataset case lain tidak ikut membesar
+MUTATING_CASES = {
+    'add_user', 'add_transaction', 'import_transactions', 'add_debt',
+    'create_broadcast_job', 'save_broadcast_results'
+}
+
+
+def _weighted(profile: Dict[str, Tuple[int, int]], categories: List[str]) -> Tuple[List[str], List[int], List[int]]:
+    weights = [profile.get(category, DEFAULT_PROFILE)[0] for category in categories]
+    medians = [profile.get(category, DEFAULT_PROFILE)[1] for category in categories]
+    return categories, weights, medians
+
+
+def _amount(rng: random.Random, median: int) -> int:
+    """Nominal log-normal di sekitar median, dibulatkan ke ratusan rupiah"""
+    value = median * math.exp(rng.gauss(0, 0.6))
+    return to_minor_units(max(100, round(value, -2)))
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate_dataset(db_path: str, users: int, transactions: int, seed: int = 42) -> Dict:
+    """
+    Membuat database sintetis di db_path (skema lewat DBHelper.init_db & migrasi).
+    Transaksi dibagi ke user dengan distribusi Pareto sehingga ada user "berat".
+    Returns info dataset: jumlah baris, heavy_user, typical_user, durasi pembuatan
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    helper = DBHelper(db_path)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    
+    income = _weighted(INCOME_PROFILE, INCOME_CATEGORIES)
+    expense = _weighted(EXPENSE_PROFILE, EXPENSE_CATEGORIES)
+    tiers = list(TIER_WEIGHTS)
+    timezones = list(TIMEZONE_WEIGHTS)
+    
+    user_rows = []
+    for user_id in range(1, users + 1):
+        tier = rng.choices(tiers, [TIER_WEIGHTS[t] for t in tiers])[0]
+        start = now - timedelta(days=rng.randint(0, 60))
+        user_rows.append((
+            user_id, f"user{user_id}", f"User {user_id}", '',
+            tier, start.strftime('%Y-%m-%d') if tier != 'free' else None,
+            (start + timedelta(days=30)).strftime('%Y-%m-%d') if tier != 'free' else None,
+            _timestamp(now - timedelta(days=rng.randint(0, 365))),
+            _timestamp(now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))),
+            rng.choices(timezones, [TIMEZONE_WEIGHTS[t] for t in timezones])[0]
+        ))
+    
+    user_ids = list(range(1, users + 1))
+    user_weights = [rng.paretovariate(1.2) for _ in user_ids]
+    owners = rng.choices(user_ids, user_weights, k=transactions)
+    
+    def transaction_rows():
+        for user_id in owners:
+            categories, weights, medians = income if rng.random() < INCOME_RATIO else expense
+            index = rng.choices(range(len(categories)), weights)[0]
+            row = (
+                user_id,
+                'income' if categories is INCOME_CATEGORIES else 'expense',
+                categories[index],
+                _amount(rng, medians[index]),
+                rng.choice(DESCRIPTIONS),
+                MODE_BUSINESS if rng.random() < BUSINESS_RATIO else MODE_PERSONAL,
+                _timestamp(now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)))
+            )
+            # Bulan lokal seperti yang ditulis DBHelper (kolom timezone ada di akhir user_rows)
+            yield row + (local_month(row[-1], user_rows[user_id - 1][-1]),)
+    
+    debt_rows = []
+    for user_id in rng.sample(user_ids, max(1, users // 5)):
+        for _ in range(rng.randint(1, 6)):
+            paid = rng.random() < 0.4
+            debt_rows.append((
+                user_id, rng.choice(['hutang', 'piutang']), f"Kontak {rng.randint(1, 500)}",
+                _amount(rng, 500_000), rng.choice(DESCRIPTIONS), 'paid' if paid else 'unpaid',
+                _timestamp(now - timedelta(days=rng.randint(0, 180)))
+            ))
+    
+    with helper.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO users (user_id, username, first_name, last_name, subscription_tier,
+                               subscription_start, subscription_end, created_at, last_active, timezone)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', user_rows)
+        # Trigger ringkasan (user_balances, monthly_rollups, transaction_count) ikut jalan
+        conn.executemany('''
+            INSERT INTO transactions (user_id, type, category, amount, description, mode, created_at,
+                                      local_month)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', transaction_rows())
+        conn.executemany('''
+            INSERT INTO debts (user_id, type, person_name, amount, description, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', debt_rows)
+    
+    counts = helper.get_connection().execute('''
+        SELECT user_id, transaction_count FROM users ORDER BY transaction_count DESC
+    ''').fetchall()
+    helper.get_connection().execute('ANALYZE')
+    helper.close()
+    
+    return {
+        'users': users,
+        'transactions': transactions,
+        'debts': len(debt_rows),
+        'heavy_user': counts[0][0],
+        'heavy_user_transactions': counts[0][1],
+        'typical_user': counts[len(counts) // 2][0],
+        'typical_user_transactions': counts[len(counts) // 2][1],
+        'generate_seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def build_cases(helper: DBHelper, info: Dict, rng: random.Random) -> List[Tuple[str, Callable]]:
+    """Daftar (nama, fungsi) yang diukur; nama DBHelper sama dengan nama method-nya"""
+    heavy = info['heavy_user']
+    typical = info['typical_user']
+    month = month_bounds(DEFAULT_TIMEZONE)[0]
+    sample_users = rng.sample(range(1, info['users'] + 1), min(200, info['users']))
+    counter = iter(range(10 ** 9))
+    
+    job_id = helper.create_broadcast_job(0, 'benchmark')
+    broadcast_results = [(user_id, 'sent', None) for user_id in sample_users]
+    oldest_page = helper.get_recent_transactions(heavy, MODE_PERSONAL, limit=10)
+    before_id = oldest_page[-1]['id'] if oldest_page else None
+    chart_data = helper.get_transactions_by_category(heavy, 'expense', MODE_PERSONAL) or [('-', 1)]
+    all_transactions = helper.get_all_transactions(heavy, MODE_PERSONAL)
+    users_info = helper.get_all_users_info()
+    amount_inputs = [rng.choice(['{:,}', '{:_}', 'Rp {:,}', '{}']).format(rng.randint(1, 10 ** 8)).replace('_', '.')
+                     for _ in range(1000)]
+    
+    def import_rows():
+        batch = next(counter)
+        return [
+            ('expense', EXPENSE_CATEGORIES[0], 25_000, 'import', '2024-01-01 00:00:00', f"bench-{batch}-{i}")
+            for i in range(500)
+        ]
+    
+    def validate_many():
+        for text in amount_inputs:
+            validate_amount(text)
+    
+    return [
+        # Users & aktivitas
+        ('init_db', helper.init_db),
+        ('add_user', lambda: helper.add_user(info['users'] + 1 + next(counter), 'bench', 'Bench', 'User')),
+        ('update_last_active', lambda: helper.update_last_active(typical)),
+        ('update_last_active_many', lambda: helper.update_last_active_many(
+            [(datetime.now(), user_id) for user_id in sample_users])),
+        # Transaksi
+        ('add_transaction', lambda: helper.add_transaction(
+            typical, 'expense', EXPENSE_CATEGORIES[0], 25_000, 'bench', max_transactions=10 ** 9)),
+        ('import_transactions', lambda: helper.import_transactions(typical, MODE_PERSONAL, import_rows())),
+        ('get_balance', lambda: helper.get_balance(heavy, MODE_PERSONAL)),
+        ('get_dashboard_summary', lambda: helper.get_dashboard_summary(heavy, MODE_PERSONAL, month)),
+        ('get_monthly_balance', lambda: helper.get_monthly_balance(heavy, MODE_PERSONAL, month)),
+        ('get_transactions_by_category', lambda: helper.get_transactions_by_category(
+            heavy, 'expense', MODE_PERSONAL, month)),
+        ('get_recent_transactions', lambda: helper.get_recent_transactions(heavy, MODE_PERSONAL)),
+        ('get_recent_transactions[before_id]', lambda: helper.get_recent_transactions(
+            heavy, MODE_PERSONAL, before_id=before_id)),
+        ('get_all_transactions', lambda: helper.get_all_transactions(heavy, MODE_PERSONAL)),
+        ('iter_transactions', lambda: sum(1 for _ in helper.iter_transactions(heavy, MODE_PERSONAL))),
+        ('get_transaction_count', lambda: helper.get_transaction_count(heavy)),
+        # Tabel ringkasan
+        ('verify_user_balances', helper.verify_user_balances),
+        ('rebuild_user_balances', helper.rebuild_user_balances),
+        ('rebuild_transaction_counts', helper.rebuild_transaction_counts),
+        ('rebuild_monthly_rollups', lambda: helper.rebuild_monthly_rollups(heavy)),
+        ('rebuild_monthly_rollups[all]', lambda: helper.rebuild_monthly_rollups(None)),
+        # Debt & subscription
+        ('add_debt', lambda: helper.add_debt(typical, 'hutang', 'Bench', 100_000, 'bench')),
+        ('get_debts', lambda: helper.get_debts(heavy)),
+        ('get_user_subscription', lambda: helper.get_user_subscription(typical)),
+        ('set_user_timezone', lambda: helper.set_user_timezone(typical, DEFAULT_TIMEZONE)),
+        ('update_subscription', lambda: helper.update_subscription(typical, 'basic')),
+        # Cache file Telegram
+        ('save_telegram_file_id', lambda: helper.save_telegram_file_id('bench', 'file-id', 'photo', 5000)),
+        ('get_telegram_file_id', lambda: helper.get_telegram_file_id('bench')),
+        ('delete_telegram_file_id', lambda: helper.delete_telegram_file_id('missing')),
+        # Broadcast
+        ('create_broadcast_job', lambda: helper.create_broadcast_job(0, 'benchmark')),
+        ('set_broadcast_progress_message', lambda: helper.set_broadcast_progress_message(job_id, 1)),
+        ('get_pending_broadcast_recipients', lambda: helper.get_pending_broadcast_recipients(job_id, 200)),
+        ('save_broadcast_results', lambda: helper.save_broadcast_results(job_id, broadcast_results)),
+        ('get_broadcast_job', lambda: helper.get_broadcast_job(job_id)),
+        ('get_unfinished_broadcast_jobs', helper.get_unfinished_broadcast_jobs),
+        ('finish_broadcast_job', lambda: helper.finish_broadcast_job(job_id)),
+        # Admin
+        ('get_total_users', helper.get_total_users),
+        ('get_total_transactions', helper.get_total_transactions),
+        ('get_active_users_today', helper.get_active_users_today),
+        ('get_all_user_ids', helper.get_all_user_ids),
+        ('get_all_users_info', helper.get_all_users_info),
+        # Chart (di proses ini, tanpa process pool)
+        ('generate_pie_chart', lambda: generate_pie_chart(
+            chart_data, 'Benchmark', dpi=SUBSCRIPTION_TIERS['premium']['chart_dpi'])),
+        ('generate_bar_chart', lambda: generate_bar_chart(
+            chart_data, 'Benchmark', dpi=SUBSCRIPTION_TIERS['premium']['chart_dpi'])),
+    ] + [
+        (f'render_chart[{kind},{backend}]', lambda kind=kind, backend=backend: render_chart(
+            kind, chart_data, 'Benchmark', backend=backend, dpi=SUBSCRIPTION_TIERS['premium']['chart_dpi']))
+        for backend in RENDERERS for kind in ('pie', 'bar')
+    ] + [
+        # Export
+        ('export_to_csv', lambda: export_to_csv(users_info)),
+        ('export_to_excel', lambda: export_to_excel(all_transactions)),
+        ('export_rows_to_csv[iter_transactions]', lambda: export_rows_to_csv(
+            helper.iter_transactions(heavy, MODE_PERSONAL), TRANSACTION_COLUMNS)),
+        ('export_rows_to_excel[iter_transactions]', lambda: export_rows_to_excel(
+            helper.iter_transactions(heavy, MODE_PERSONAL), TRANSACTION_COLUMNS)),
+        # Input
+        ('validate_amount[x1000]', validate_many),
+    ]
+
+
+def untimed_methods(cases: List[Tuple[str, Callable]]) -> List[str]:
+    """Method publik DBHelper yang belum punya case - tambahkan case saat menambah method"""
+    covered = {name.split('[')[0] for name, _ in cases}
+    public = {name for name, _ in inspect.getmembers(DBHelper, inspect.isfunction) if not name.startswith('_')}
+    return sorted(public - covered - UNTIMED_METHODS)
+
+
+def measure(func: Callable, repeat: int) -> Dict:
+    """Satu kali pemanasan (import, cache) lalu `repeat` kali pengukuran"""
+    def run_once():
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        if hasattr(result, 'close'):
+            result.close()
+        return elapsed
+    
+    run_once()
+    samples = sorted(run_once() * 1000 for _ in range(repeat))
+    return {
+        'median_ms': round(statistics.median(samples), 4),
+        'min_ms': round(samples[0], 4),
+        'p95_ms': round(samples[min(len(samples) - 1, math.ceil(len(samples) * 0.95) - 1)], 4),
+        'runs': repeat
+    }
+
+
+def _remove_database(db_path: str):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+def measure_on_copy(db_path: str, name: str, info: Dict, repeat: int, seed: int) -> Dict:
+    """Mengukur satu case di salinan database (backup SQLite, termasuk isi WAL), lalu salinannya dihapus"""
+    copy_path = f"{db_path}.copy"
+    _remove_database(copy_path)
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(copy_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    
+    helper = DBHelper(copy_path)
+    try:
+        func = dict(build_cases(helper, info, random.Random(seed)))[name]
+        return measure(func, repeat)
+    finally:
+        helper.close()
+        _remove_database(copy_path)
+
+
+def run_scale(transactions: int, users: int, repeat: int, seed: int, db_dir: str) -> Dict:
+    db_path = os.path.join(db_dir, f"benchmark_{transactions}.db")
+    _remove_database(db_path)
+    
+    logger.info(f"Generating {users} users / {transactions} transactions...")
+    info = generate_dataset(db_path, users, transactions, seed)
+    logger.info(f"Dataset ready in {info['generate_seconds']}s (heavy user: {info['heavy_user_transactions']} tx)")
+    
+    helper = DBHelper(db_path)
+    try:
+        cases = build_cases(helper, info, random.Random(seed))
+        missing = untimed_methods(cases)
+        if missing:
+            logger.warning(f"DBHelper methods without benchmark case: {', '.join(missing)}")
+        
+        results = {}
+        for name, func in cases:
+            if name in MUTATING_CASES:
+                results[name] = measure_on_copy(db_path, name, info, repeat, seed)
+            else:
+                results[name] = measure(func, repeat)
+            logger.info(f"  {name:<45} {results[name]['median_ms']:>10.3f} ms")
+    finally:
+        helper.close()
+    
+    return {'dataset': info, 'results': results}
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float, min_delta_ms: float) -> List[Dict]:
+    """
+    Case yang median-nya lebih lambat dari baseline lebih dari `tolerance` (rasio) DAN
+    lebih dari `min_delta_ms` (agar noise pada operasi mikro tidak dianggap regresi)
+    """
+    regressions = []
+    for scale, scale_result in current['scales'].items():
+        base_results = baseline.get('scales', {}).get(scale, {}).get('results', {})
+        for name, result in scale_result['results'].items():
+            base = base_results.get(name)
+            if not base:
+                continue
+            ratio = result['median_ms'] / base['median_ms'] if base['median_ms'] else float('inf')
+            if ratio > 1 + tolerance and result['median_ms'] - base['median_ms'] > min_delta_ms:
+                regressions.append({
+                    'scale': scale,
+                    'name': name,
+                    'baseline_ms': base['median_ms'],
+                    'current_ms': result['median_ms'],
+                    'ratio': round(ratio, 2)
+                })
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default=DEFAULT_SCALES, help='jumlah transaksi per skala, dipisah koma')
+    parser.add_argument('--users', type=int, default=None, help='jumlah user (default: transaksi / 50, min 10)')
+    parser.add_argument('--repeat', type=int, default=5, help='pengukuran per case')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='file JSON hasil')
+    parser.add_argument('--baseline', default=None, help='file JSON baseline untuk dibandingkan')
+    parser.add_argument('--save-baseline', action='store_true', help=f'tulis hasil juga ke {DEFAULT_BASELINE}')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='batas perlambatan relatif (0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help='perlambatan absolut minimum (ms)')
+    parser.add_argument('--db-dir', default=None, help='simpan database sintetis di folder ini')
+    args = parser.parse_args()
+    
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+    
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix='financebot-bench-')
+    os.makedirs(db_dir, exist_ok=True)
+    
+    output = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat
+        },
+        'scales': {}
+    }
+    try:
+        for transactions in (int(scale) for scale in args.scales.split(',')):
+            users = args.users or max(10, transactions // 50)
+            output['scales'][str(transactions)] = run_scale(transactions, users, args.repeat, args.seed, db_dir)
+    finally:
+        if args.db_dir is None:
+            shutil.rmtree(db_dir, ignore_errors=True)
+    
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    logger.info(f"Results written to {args.output}")
+    
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, 'w') as f:
+            json.dump(output, f, indent=2)
+        logger.info(f"Baseline saved to {DEFAULT_BASELINE}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(output, baseline, args.tolerance, args.min_delta_ms)
+        for item in regressions:
+            logger.error(
+                f"REGRESSION [{item['scale']}] {item['name']}: "
+                f"{item['baseline_ms']:.3f} -> {item['current_ms']:.3f} ms ({item['ratio']}x)"
+            )
+        if regressions:
+            return 1
+        logger.info(f"No regressions against {args.baseline}")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,22 +2,49 @@
 Main Bot File - Telegram Bot Manajemen Keuangan & Bisnis
 Modified for Render Web Service with Webhook
 """
+import time
+
+# Dicatat sebelum import lain, untuk mengukur waktu cold start sampai respon pertama
+PROCESS_STARTED_AT = time.monotonic()
+
+import asyncio
+import html
 import logging
 import os
+from datetime import datetime
+from io import BytesIO
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, CallbackQueryHandler,
-    ConversationHandler, MessageHandler, filters, ContextTypes
+    ConversationHandler, MessageHandler, TypeHandler, filters, ContextTypes
 )
 
 from config import (
-    BOT_TOKEN, ADMIN_ID, INCOME_CATEGORIES, EXPENSE_CATEGORIES, 
-    MODE_PERSONAL, MODE_BUSINESS, SUBSCRIPTION_TIERS
+    BOT_TOKEN, ADMIN_ID, UPDATE_CONCURRENCY, DB_PATH, INCOME_CATEGORIES, EXPENSE_CATEGORIES, 
+    MODE_PERSONAL, MODE_BUSINESS, SUBSCRIPTION_TIERS, DB_WORKERS, LAST_ACTIVE_FLUSH_INTERVAL,
+    SUBSCRIPTION_CACHE_SIZE, SUBSCRIPTION_CACHE_TTL,
+    CHART_WORKERS, CHART_MAX_PENDING, CHART_TIMEOUT, CHART_CACHE_MAX_BYTES,
+    CHART_BACKEND, CHART_FORMAT, CHART_TARGET_BYTES, CHART_PREWARM_DELAY,
+    BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PROGRESS_INTERVAL,
+    BACKUP_DIR, BACKUP_KEEP, BACKUP_INTERVAL_HOURS, IMPORT_MAX_FILE_SIZE, IMPORT_MAX_ROWS,
+    METRICS_TOKEN, SLOW_QUERY_MS, SLOW_QUERY_SAMPLE_RATE, SLOW_QUERY_BUFFER_SIZE
+)
+from chart_service import ChartRenderService, ChartServiceBusy, ChartCache
+from file_cache import TelegramFileCache
+from broadcast import BroadcastEngine
+from backup import create_backup
+from importer import ImportFileError, parse_transactions, MAX_REPORTED_ERRORS
+from metrics import instrument_handler
+from update_processor import PerUserUpdateProcessor
+from webhook_server import serve_webhook
+from slow_query_log import SlowQueryLog
+from db_helper import (
+    DBHelper, AsyncDBHelper, SubscriptionCache, TransactionLimitError,
+    TRANSACTION_COLUMNS, month_bounds, get_timezone
 )
-from db_helper import DBHelper
 from utils import (
-    format_currency, generate_pie_chart, generate_bar_chart,
-    export_to_csv, export_to_excel, get_current_month_name, validate_amount
+    format_currency, export_rows_to_csv,
+    export_rows_to_excel, export_to_csv, get_current_month_name, validate_amount
 )
 
 # Setup logging
@@ -27,15 +54,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize Database
-db = DBHelper('finance.db')
+# Database (query dijalankan di thread pool, bukan di event loop).
+# Baru dibuka di post_init: worker chart meng-import ulang modul ini dan tidak boleh ikut membukanya
+db = AsyncDBHelper(
+    DBHelper(
+        DB_PATH,
+        slow_query_log=SlowQueryLog(
+            SLOW_QUERY_MS, SLOW_QUERY_SAMPLE_RATE, SLOW_QUERY_BUFFER_SIZE
+        ) if SLOW_QUERY_MS > 0 else None,
+        initialize=False
+    ),
+    max_workers=DB_WORKERS,
+    subscription_cache=SubscriptionCache(SUBSCRIPTION_CACHE_SIZE, SUBSCRIPTION_CACHE_TTL)
+)
+
+# Render chart (matplotlib/Pillow) di process pool terpisah
+chart_service = ChartRenderService(
+    max_workers=CHART_WORKERS, max_pending=CHART_MAX_PENDING, timeout=CHART_TIMEOUT,
+    backend=CHART_BACKEND, image_format=CHART_FORMAT, target_bytes=CHART_TARGET_BYTES
+)
+chart_cache = ChartCache(max_bytes=CHART_CACHE_MAX_BYTES)
+
+# file_id Telegram untuk chart/export yang isinya identik (hindari upload ulang)
+file_cache = TelegramFileCache(db)
+
+# Broadcast berjalan di background dengan batas kecepatan, progress tersimpan di database
+broadcast_engine = BroadcastEngine(
+    db, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY,
+    progress_interval=BROADCAST_PROGRESS_INTERVAL
+)
 
 # Conversation States
 TRANS_TYPE, TRANS_CATEGORY, TRANS_AMOUNT, TRANS_DESC = range(4)
 DEBT_TYPE, DEBT_PERSON, DEBT_AMOUNT, DEBT_DESC = range(4, 8)
 BROADCAST_MESSAGE = 8
 
+# Jumlah transaksi per halaman riwayat
+HISTORY_PAGE_SIZE = 10
+
 # User data temporary storage
+# Aman dengan concurrent_updates: PerUserUpdateProcessor memproses update satu user berurutan
 user_data_temp = {}
 
 
@@ -46,10 +104,11 @@ def is_admin(user_id: int) -> bool:
     return user_id == ADMIN_ID
 
 
+@instrument_handler
 async def send_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Mengirim main menu dengan inline keyboard - Enhanced UI"""
     user_id = update.effective_user.id
-    subscription = db.get_user_subscription(user_id)
+    subscription = await db.get_user_subscription(user_id)
     tier = subscription['tier']
     
     # Emoji badge berdasarkan tier
@@ -96,12 +155,13 @@ async def send_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ============= COMMAND HANDLERS =============
 
+@instrument_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk command /start"""
     user = update.effective_user
     
     # Simpan user ke database
-    db.add_user(user.id, user.username, user.first_name, user.last_name)
+    await db.add_user(user.id, user.username, user.first_name, user.last_name)
     db.update_last_active(user.id)
     
     welcome_text = (
@@ -125,6 +185,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await send_main_menu(update, context)
 
 
+@instrument_handler
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk command /help"""
     help_text = (
@@ -134,6 +195,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "• <b>Dashboard</b> - Lihat ringkasan keuangan\n"
         "• <b>Laporan Visual</b> - Chart pengeluaran\n"
         "• <b>Export Data</b> - Download laporan Excel/CSV\n"
+        "• <b>Import Data</b> - Kirim file CSV/Excel untuk import transaksi massal\n"
         "• <b>Mode Bisnis</b> - Kelola hutang/piutang\n\n"
         "<b>Tips:</b>\n"
         "💡 Catat transaksi secara rutin\n"
@@ -151,22 +213,52 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(help_text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
+async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk command /timezone - lihat atau ubah timezone laporan bulanan"""
+    user_id = update.effective_user.id
+    
+    if not context.args:
+        subscription = await db.get_user_subscription(user_id)
+        await update.message.reply_text(
+            f"🕐 <b>Timezone:</b> {subscription['timezone']}\n\n"
+            f"Ubah dengan: <code>/timezone Asia/Makassar</code>",
+            parse_mode='HTML'
+        )
+        return
+    
+    tz_name = context.args[0]
+    if str(get_timezone(tz_name)) != tz_name:
+        await update.message.reply_text(
+            "❌ Timezone tidak dikenal!\n\n"
+            "Gunakan nama IANA, contoh: Asia/Jakarta, Asia/Makassar, Asia/Jayapura"
+        )
+        return
+    
+    if await db.set_user_timezone(user_id, tz_name):
+        await update.message.reply_text(f"✅ Timezone diubah ke <b>{tz_name}</b>", parse_mode='HTML')
+    else:
+        await update.message.reply_text("❌ Gagal mengubah timezone. Silakan coba lagi.")
+
+
 # ============= DASHBOARD & REPORTS =============
 
+@instrument_handler
 async def show_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan dashboard keuangan - Enhanced UI"""
     query = update.callback_query
     await query.answer()
     
     user_id = update.effective_user.id
-    db.update_last_active(user_id)
     
-    # Get balance data
-    total_balance = db.get_balance(user_id, MODE_PERSONAL)
-    monthly_balance = db.get_monthly_balance(user_id, MODE_PERSONAL)
-    subscription = db.get_user_subscription(user_id)
+    # Get balance data (last_active sudah diupdate oleh button_callback)
+    subscription = await db.get_user_subscription(user_id)
+    month, _, _ = month_bounds(subscription['timezone'])
+    summary = await db.get_dashboard_summary(user_id, MODE_PERSONAL, month)
+    total_balance = summary['total']
+    monthly_balance = summary['monthly']
     
-    month_name = get_current_month_name()
+    month_name = get_current_month_name(month)
     tier_badge = "🆓" if subscription['tier'] == 'free' else ("⭐" if subscription['tier'] == 'basic' else "👑")
     
     # Calculate percentages
@@ -205,6 +297,7 @@ async def show_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text(dashboard_text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
 async def show_visual_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan menu laporan visual"""
     query = update.callback_query
@@ -222,6 +315,7 @@ async def show_visual_report(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
 async def generate_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Generate dan kirim chart"""
     query = update.callback_query
@@ -233,33 +327,60 @@ async def generate_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text("⏳ Sedang membuat chart...")
     
     try:
-        if 'expense' in chart_type:
-            data = db.get_transactions_by_category(user_id, 'expense', MODE_PERSONAL)
-            title = f"Pengeluaran - {get_current_month_name()}"
-        else:
-            data = db.get_transactions_by_category(user_id, 'income', MODE_PERSONAL)
-            title = f"Pemasukan - {get_current_month_name()}"
+        trans_type = 'expense' if 'expense' in chart_type else 'income'
+        type_text = "Pengeluaran" if trans_type == 'expense' else "Pemasukan"
         
-        if not data:
-            await query.edit_message_text(
-                "❌ Belum ada data transaksi untuk ditampilkan.\n\n"
-                "Silakan tambah transaksi terlebih dahulu!",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Kembali", callback_data="visual_report")
-                ]])
-            )
-            return
+        # Chart bulan berjalan di timezone user (rollup bulan yang sama dengan dashboard)
+        subscription = await db.get_user_subscription(user_id)
+        month, _, _ = month_bounds(subscription['timezone'])
+        title = f"{type_text} - {get_current_month_name(month)}"
         
-        # Generate chart
-        if 'pie' in chart_type:
-            chart_buffer = generate_pie_chart(data, title)
-        else:
-            chart_buffer = generate_bar_chart(data, title)
+        # Resolusi chart mengikuti tier subscription user
+        tier_info = SUBSCRIPTION_TIERS.get(subscription['tier'], SUBSCRIPTION_TIERS['free'])
+        dpi = tier_info['chart_dpi']
+        variant = f"{title}@{dpi}"
+        
+        # Chart yang sama dan data belum berubah: kirim dari cache tanpa query & render
+        chart_buffer = chart_cache.get(user_id, chart_type, MODE_PERSONAL, variant)
+        
+        if chart_buffer is None:
+            data_version = chart_cache.version(user_id)
+            data = await db.get_transactions_by_category(user_id, trans_type, MODE_PERSONAL, month)
+            
+            if not data:
+                await query.edit_message_text(
+                    "❌ Belum ada data transaksi bulan ini untuk ditampilkan.\n\n"
+                    "Silakan tambah transaksi terlebih dahulu!",
+                    reply_markup=InlineKeyboardMarkup([[
+                        InlineKeyboardButton("🔙 Kembali", callback_data="visual_report")
+                    ]])
+                )
+                return
+            
+            # Generate chart di process pool, event loop tetap melayani user lain
+            kind = 'pie' if 'pie' in chart_type else 'bar'
+            try:
+                chart_buffer = await chart_service.render(kind, data, title, dpi)
+            except ChartServiceBusy:
+                await query.edit_message_text(
+                    "⏳ Server sedang sibuk membuat chart lain.\n\n"
+                    "Silakan coba lagi dalam beberapa detik.",
+                    reply_markup=InlineKeyboardMarkup([[
+                        InlineKeyboardButton("🔙 Kembali", callback_data="visual_report")
+                    ]])
+                )
+                return
+            except asyncio.TimeoutError:
+                logger.error(f"Chart render timed out for user {user_id}")
+                await query.edit_message_text("❌ Pembuatan chart terlalu lama. Silakan coba lagi.")
+                return
+            
+            if chart_buffer:
+                chart_cache.put(user_id, chart_type, MODE_PERSONAL, data_version, chart_buffer, variant)
         
         if chart_buffer:
-            await context.bot.send_photo(
-                chat_id=user_id,
-                photo=chart_buffer,
+            await file_cache.send_photo(
+                context.bot, user_id, chart_buffer,
                 caption=f"📊 <b>{title}</b>",
                 parse_mode='HTML'
             )
@@ -274,6 +395,7 @@ async def generate_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ============= EXPORT DATA =============
 
+@instrument_handler
 async def show_export_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan menu export"""
     query = update.callback_query
@@ -281,7 +403,9 @@ async def show_export_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     keyboard = [
         [InlineKeyboardButton("📄 Export ke CSV", callback_data="export_csv")],
+        [InlineKeyboardButton("🗜️ Export ke CSV (gzip)", callback_data="export_csv_gz")],
         [InlineKeyboardButton("📊 Export ke Excel", callback_data="export_excel")],
+        [InlineKeyboardButton("📤 Import dari CSV/Excel", callback_data="import_help")],
         [InlineKeyboardButton("🔙 Kembali", callback_data="main_menu")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -290,6 +414,7 @@ async def show_export_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
 async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Export data transaksi"""
     query = update.callback_query
@@ -301,9 +426,11 @@ async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text("⏳ Sedang menyiapkan file...")
     
     try:
-        transactions = db.get_all_transactions(user_id, MODE_PERSONAL)
+        # Cek jumlah transaksi dari user_balances (O(1)) sebelum membangun file
+        transaction_count = (await db.get_balance(user_id, MODE_PERSONAL))['count']
+        tz_name = (await db.get_user_subscription(user_id))['timezone']
         
-        if not transactions:
+        if not transaction_count:
             await query.edit_message_text(
                 "❌ Belum ada data transaksi untuk di-export.\n\n"
                 "Silakan tambah transaksi terlebih dahulu!",
@@ -314,21 +441,33 @@ async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         if 'csv' in export_type:
-            file_buffer = export_to_csv(transactions)
-            filename = f"transaksi_{user_id}.csv"
-            caption = "📄 Data transaksi Anda (CSV)"
+            # Streaming langsung dari cursor di thread database
+            compress = export_type == 'export_csv_gz'
+            file_buffer = await db.run(
+                export_rows_to_csv,
+                db.helper.iter_transactions(user_id, MODE_PERSONAL, tz_name=tz_name),
+                TRANSACTION_COLUMNS,
+                compress
+            )
+            filename = f"transaksi_{user_id}.csv" + (".gz" if compress else "")
+            caption = "📄 Data transaksi Anda (CSV" + (", gzip)" if compress else ")")
         else:
-            file_buffer = export_to_excel(transactions)
+            file_buffer = await db.run(
+                export_rows_to_excel,
+                db.helper.iter_transactions(user_id, MODE_PERSONAL, tz_name=tz_name),
+                TRANSACTION_COLUMNS
+            )
             filename = f"transaksi_{user_id}.xlsx"
             caption = "📊 Data transaksi Anda (Excel)"
         
         if file_buffer:
-            await context.bot.send_document(
-                chat_id=user_id,
-                document=file_buffer,
-                filename=filename,
-                caption=caption
-            )
+            try:
+                await file_cache.send_document(
+                    context.bot, user_id, file_buffer, filename,
+                    caption=caption
+                )
+            finally:
+                file_buffer.close()
             await send_main_menu(update, context)
         else:
             await query.edit_message_text("❌ Gagal membuat file. Silakan coba lagi.")
@@ -338,8 +477,130 @@ async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("❌ Terjadi kesalahan saat export data.")
 
 
+# ============= IMPORT DATA =============
+
+@instrument_handler
+async def show_import_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Menampilkan format file untuk import transaksi"""
+    query = update.callback_query
+    await query.answer()
+    
+    text = (
+        "📤 <b>Import Transaksi</b>\n\n"
+        "Kirim file <b>.csv</b> atau <b>.xlsx</b> ke chat ini dengan kolom (baris pertama):\n"
+        "<code>Tipe, Kategori, Nominal, Deskripsi, Tanggal</code>\n\n"
+        "• <b>Tipe</b>: Pemasukan/Pengeluaran (income/expense)\n"
+        "• <b>Kategori</b>: nama kategori bot, misal <i>Makanan</i> atau <i>Gaji</i>; "
+        "yang tidak dikenal masuk <i>Lainnya</i>\n"
+        "• <b>Nominal</b>: wajib, misal 50000 atau Rp 50.000\n"
+        "• <b>Tanggal</b>: YYYY-MM-DD atau DD/MM/YYYY (kosong = sekarang)\n\n"
+        "Tulis caption <i>bisnis</i> untuk import ke mode bisnis.\n"
+        f"Maksimal {IMPORT_MAX_ROWS} baris, {IMPORT_MAX_FILE_SIZE // (1024 * 1024)} MB. "
+        "Upload ulang file yang sama tidak akan menggandakan data, "
+        "dan file hasil Export bisa di-import kembali."
+    )
+    keyboard = [[InlineKeyboardButton("🔙 Kembali", callback_data="export_menu")]]
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+
+
+@instrument_handler
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Import transaksi dari file CSV/Excel yang dikirim user"""
+    user_id = update.effective_user.id
+    document = update.message.document
+    
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await update.message.reply_text(
+            f"❌ File terlalu besar (maksimal {IMPORT_MAX_FILE_SIZE // (1024 * 1024)} MB)."
+        )
+        return
+    
+    caption = (update.message.caption or '').lower()
+    mode = MODE_BUSINESS if 'bisnis' in caption or 'business' in caption else MODE_PERSONAL
+    
+    subscription = await db.get_user_subscription(user_id)
+    tier_info = SUBSCRIPTION_TIERS[subscription['tier']]
+    max_transactions = tier_info['max_transactions']
+    
+    status = await update.message.reply_text("⏳ Sedang memproses file...")
+    
+    try:
+        buffer = BytesIO()
+        await (await document.get_file()).download_to_memory(out=buffer)
+        buffer.seek(0)
+        
+        # Parsing (CPU) di thread terpisah agar event loop tetap melayani user lain
+        parsed = await asyncio.to_thread(
+            parse_transactions, buffer, document.file_name, mode,
+            subscription.get('timezone'), IMPORT_MAX_ROWS
+        )
+    except ImportFileError as e:
+        await status.edit_text(f"❌ {e}")
+        return
+    except Exception as e:
+        logger.error(f"Error reading import file: {e}")
+        await status.edit_text("❌ File tidak bisa dibaca. Pastikan format CSV/Excel benar.")
+        return
+    
+    rows, errors = parsed['rows'], parsed['errors']
+    if not rows:
+        await status.edit_text("❌ Tidak ada baris transaksi yang valid di file ini.")
+        return
+    
+    try:
+        result = await db.import_transactions(
+            user_id, mode, rows,
+            max_transactions=None if max_transactions == 'unlimited' else max_transactions
+        )
+    except TransactionLimitError:
+        current_count = await db.get_transaction_count(user_id)
+        text, reply_markup = transaction_limit_message(tier_info, current_count)
+        await status.edit_text(
+            f"❌ Import dibatalkan: {len(rows)} transaksi melebihi limit.\n\n{text}",
+            reply_markup=reply_markup, parse_mode='HTML'
+        )
+        return
+    
+    if result is None:
+        await status.edit_text("❌ Gagal menyimpan transaksi. Silakan coba lagi.")
+        return
+    
+    inserted, duplicates = result
+    if inserted:
+        chart_cache.invalidate(user_id)
+    
+    text = (
+        f"✅ <b>Import Selesai!</b>\n\n"
+        f"📥 Berhasil: {inserted} transaksi\n"
+        f"🔁 Duplikat dilewati: {duplicates}\n"
+        f"⚠️ Baris tidak valid: {len(errors)}"
+    )
+    if errors:
+        text += "\n\n" + "\n".join(
+            f"• Baris {line}: {reason}" for line, reason in errors[:MAX_REPORTED_ERRORS]
+        )
+    await status.edit_text(text, parse_mode='HTML')
+
+
 # ============= ADD TRANSACTION (CONVERSATION) =============
 
+def transaction_limit_message(tier_info: dict, current_count: int):
+    """Teks & keyboard saat user mencapai limit transaksi tier-nya"""
+    text = (
+        f"⚠️ <b>Transaction Limit Reached</b>\n\n"
+        f"Your {tier_info['name']} plan allows up to "
+        f"{tier_info['max_transactions']} transactions.\n\n"
+        f"Current: {current_count}/{tier_info['max_transactions']}\n\n"
+        f"👑 Upgrade to unlock unlimited transactions!"
+    )
+    keyboard = [
+        [InlineKeyboardButton("👑 Upgrade Now", callback_data="subscription_menu")],
+        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
+    ]
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+@instrument_handler
 async def start_add_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Memulai conversation untuk menambah transaksi - With subscription check"""
     query = update.callback_query
@@ -348,26 +609,16 @@ async def start_add_transaction(update: Update, context: ContextTypes.DEFAULT_TY
     user_id = update.effective_user.id
     
     # Check subscription limits
-    subscription = db.get_user_subscription(user_id)
+    subscription = await db.get_user_subscription(user_id)
     tier = subscription['tier']
     tier_info = SUBSCRIPTION_TIERS[tier]
     
-    # Check transaction limit
+    # Check transaction limit (cek awal untuk UX; limit yang mengikat dicek lagi saat insert)
     if tier_info['max_transactions'] != 'unlimited':
-        current_count = db.get_transaction_count(user_id)
+        current_count = await db.get_transaction_count(user_id)
         if current_count >= tier_info['max_transactions']:
-            text = (
-                f"⚠️ <b>Transaction Limit Reached</b>\n\n"
-                f"Your {tier_info['name']} plan allows up to "
-                f"{tier_info['max_transactions']} transactions.\n\n"
-                f"Current: {current_count}/{tier_info['max_transactions']}\n\n"
-                f"👑 Upgrade to unlock unlimited transactions!"
-            )
-            keyboard = [
-                [InlineKeyboardButton("👑 Upgrade Now", callback_data="subscription_menu")],
-                [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-            ]
-            await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+            text, reply_markup = transaction_limit_message(tier_info, current_count)
+            await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
             return ConversationHandler.END
     
     user_data_temp[user_id] = {'mode': MODE_PERSONAL}
@@ -388,6 +639,7 @@ async def start_add_transaction(update: Update, context: ContextTypes.DEFAULT_TY
     return TRANS_TYPE
 
 
+@instrument_handler
 async def transaction_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk memilih tipe transaksi"""
     query = update.callback_query
@@ -420,6 +672,7 @@ async def transaction_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return TRANS_CATEGORY
 
 
+@instrument_handler
 async def transaction_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk memilih kategori"""
     query = update.callback_query
@@ -444,6 +697,7 @@ async def transaction_category(update: Update, context: ContextTypes.DEFAULT_TYP
     return TRANS_AMOUNT
 
 
+@instrument_handler
 async def transaction_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk input nominal"""
     user_id = update.effective_user.id
@@ -471,6 +725,7 @@ async def transaction_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return TRANS_DESC
 
 
+@instrument_handler
 async def transaction_description(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk input deskripsi dan menyimpan transaksi"""
     user_id = update.effective_user.id
@@ -479,17 +734,31 @@ async def transaction_description(update: Update, context: ContextTypes.DEFAULT_
     # Ambil data dari temporary storage
     data = user_data_temp[user_id]
     
-    # Simpan ke database
-    success = db.add_transaction(
-        user_id=user_id,
-        trans_type=data['type'],
-        category=data['category'],
-        amount=data['amount'],
-        description=description,
-        mode=data['mode']
-    )
+    subscription = await db.get_user_subscription(user_id)
+    tier_info = SUBSCRIPTION_TIERS[subscription['tier']]
+    max_transactions = tier_info['max_transactions']
+    
+    # Simpan ke database; limit tier dicek atomik di INSERT yang sama
+    try:
+        success = await db.add_transaction(
+            user_id=user_id,
+            trans_type=data['type'],
+            category=data['category'],
+            amount=data['amount'],
+            description=description,
+            mode=data['mode'],
+            max_transactions=None if max_transactions == 'unlimited' else max_transactions
+        )
+    except TransactionLimitError:
+        del user_data_temp[user_id]
+        current_count = await db.get_transaction_count(user_id)
+        text, reply_markup = transaction_limit_message(tier_info, current_count)
+        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
+        return ConversationHandler.END
     
     if success:
+        chart_cache.invalidate(user_id)
+        
         type_emoji = "💰" if data['type'] == 'income' else "💸"
         type_text = "Pemasukan" if data['type'] == 'income' else "Pengeluaran"
         
@@ -513,6 +782,7 @@ async def transaction_description(update: Update, context: ContextTypes.DEFAULT_
     return ConversationHandler.END
 
 
+@instrument_handler
 async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancel conversation handler"""
     user_id = update.effective_user.id
@@ -525,6 +795,7 @@ async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 # ============= BUSINESS MODE (DEBT MANAGEMENT) =============
 
+@instrument_handler
 async def show_business_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan menu bisnis"""
     query = update.callback_query
@@ -544,6 +815,7 @@ async def show_business_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
 async def start_add_debt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Memulai conversation untuk menambah hutang/piutang"""
     query = update.callback_query
@@ -568,6 +840,7 @@ async def start_add_debt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return DEBT_TYPE
 
 
+@instrument_handler
 async def debt_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk memilih tipe hutang/piutang"""
     query = update.callback_query
@@ -589,6 +862,7 @@ async def debt_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return DEBT_PERSON
 
 
+@instrument_handler
 async def debt_person(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk input nama orang"""
     user_id = update.effective_user.id
@@ -605,6 +879,7 @@ async def debt_person(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return DEBT_AMOUNT
 
 
+@instrument_handler
 async def debt_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk input nominal hutang/piutang"""
     user_id = update.effective_user.id
@@ -632,6 +907,7 @@ async def debt_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return DEBT_DESC
 
 
+@instrument_handler
 async def debt_description(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk input deskripsi dan menyimpan hutang/piutang"""
     user_id = update.effective_user.id
@@ -641,7 +917,7 @@ async def debt_description(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = user_data_temp[user_id]
     
     # Simpan ke database
-    success = db.add_debt(
+    success = await db.add_debt(
         user_id=user_id,
         debt_type=data['type'],
         person_name=data['person'],
@@ -677,13 +953,14 @@ async def debt_description(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+@instrument_handler
 async def view_debts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan daftar hutang/piutang"""
     query = update.callback_query
     await query.answer()
     
     user_id = update.effective_user.id
-    debts = db.get_debts(user_id)
+    debts = await db.get_debts(user_id)
     
     if not debts:
         text = "📋 <b>Daftar Hutang/Piutang</b>\n\n❌ Belum ada data."
@@ -710,6 +987,7 @@ async def view_debts(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ============= ADMIN PANEL =============
 
+@instrument_handler
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk command /admin - HANYA UNTUK ADMIN"""
     user_id = update.effective_user.id
@@ -738,6 +1016,7 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
 async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan statistik sistem"""
     query = update.callback_query
@@ -746,9 +1025,9 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         return
     
-    total_users = db.get_total_users()
-    total_transactions = db.get_total_transactions()
-    active_today = db.get_active_users_today()
+    total_users = await db.get_total_users()
+    total_transactions = await db.get_total_transactions()
+    active_today = await db.get_active_users_today()
     
     stats_text = (
         "📊 <b>System Statistics</b>\n"
@@ -765,6 +1044,7 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text(stats_text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
 async def admin_backup(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Mengirim backup database ke admin"""
     query = update.callback_query
@@ -776,12 +1056,14 @@ async def admin_backup(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text("⏳ Preparing database backup...")
     
     try:
-        # Kirim file database
-        with open('finance.db', 'rb') as db_file:
+        # Snapshot konsisten lewat backup API (bukan salinan file yang sedang ditulis)
+        backup_path = await db.run(create_backup, db.helper, BACKUP_DIR, BACKUP_KEEP)
+        
+        with open(backup_path, 'rb') as backup_file:
             await context.bot.send_document(
                 chat_id=update.effective_user.id,
-                document=db_file,
-                filename=f"backup_finance_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db",
+                document=backup_file,
+                filename=os.path.basename(backup_path),
                 caption="💾 <b>Database Backup</b>\n\nSimpan file ini dengan aman!",
                 parse_mode='HTML'
             )
@@ -797,6 +1079,7 @@ async def admin_backup(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("❌ Gagal mengirim backup database.")
 
 
+@instrument_handler
 async def admin_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Mengirim daftar user ke admin"""
     query = update.callback_query
@@ -808,7 +1091,7 @@ async def admin_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text("⏳ Preparing user list...")
     
     try:
-        users = db.get_all_users_info()
+        users = await db.get_all_users_info()
         
         if not users:
             await query.edit_message_text("❌ Belum ada user terdaftar.")
@@ -818,10 +1101,9 @@ async def admin_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         csv_buffer = export_to_csv(users)
         
         if csv_buffer:
-            await context.bot.send_document(
-                chat_id=update.effective_user.id,
-                document=csv_buffer,
-                filename=f"users_{datetime.now().strftime('%Y%m%d')}.csv",
+            await file_cache.send_document(
+                context.bot, update.effective_user.id, csv_buffer,
+                f"users_{datetime.now().strftime('%Y%m%d')}.csv",
                 caption=f"👥 <b>User List</b>\n\nTotal: {len(users)} users",
                 parse_mode='HTML'
             )
@@ -839,6 +1121,64 @@ async def admin_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("❌ Terjadi kesalahan.")
 
 
+@instrument_handler
+async def admin_rebuild_balances(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk command /rebuild_balances - verifikasi & hitung ulang tabel ringkasan"""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    await update.message.reply_text("⏳ Memverifikasi saldo terhadap ledger transaksi...")
+    
+    mismatches = await db.verify_user_balances()
+    balances_ok = await db.rebuild_user_balances() if mismatches else True
+    rollups_ok = await db.rebuild_monthly_rollups()
+    counts_ok = await db.rebuild_transaction_counts()
+    
+    result_text = (
+        f"🧮 <b>Rebuild Selesai</b>\n\n"
+        f"⚠️ Saldo tidak cocok: {len(mismatches)}\n"
+        f"{'✅' if balances_ok else '❌'} user_balances\n"
+        f"{'✅' if rollups_ok else '❌'} monthly_rollups\n"
+        f"{'✅' if counts_ok else '❌'} transaction_count"
+    )
+    await update.message.reply_text(result_text, parse_mode='HTML')
+
+
+@instrument_handler
+async def admin_slow_queries(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk command /slow_queries [n] - query lambat terbaru beserta query plan"""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    slow_query_log = db.helper.slow_query_log
+    if slow_query_log is None:
+        await update.message.reply_text("ℹ️ Slow-query log tidak aktif. Set SLOW_QUERY_MS (ms) untuk mengaktifkan.")
+        return
+    
+    limit = int(context.args[0]) if context.args and context.args[0].isdigit() else 5
+    entries = slow_query_log.entries(min(limit, 10))
+    if not entries:
+        await update.message.reply_text(f"✅ Belum ada query di atas {SLOW_QUERY_MS:g} ms.")
+        return
+    
+    text = f"🐢 <b>Slow Queries</b> (≥ {SLOW_QUERY_MS:g} ms)"
+    for entry in entries:
+        plan = '\n'.join(entry['plan'][:8]) or '-'
+        block = (
+            f"\n\n⏱️ <b>{entry['duration_ms']:.1f} ms</b> • {entry['rows']} baris • {entry['time']}\n"
+            f"<code>{html.escape(entry['sql'][:300])}</code>\n"
+            f"Params: {html.escape(entry['params'][:100])}\n"
+            f"<pre>{html.escape(plan[:500])}</pre>"
+        )
+        # Batas panjang pesan Telegram 4096 karakter
+        if len(text) + len(block) > 4096:
+            break
+        text += block
+    
+    await update.message.reply_text(text, parse_mode='HTML')
+
+
+@instrument_handler
 async def admin_broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Memulai broadcast message"""
     query = update.callback_query
@@ -858,47 +1198,24 @@ async def admin_broadcast_start(update: Update, context: ContextTypes.DEFAULT_TY
     return BROADCAST_MESSAGE
 
 
+@instrument_handler
 async def admin_broadcast_send(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Mengirim broadcast message ke semua user"""
     if not is_admin(update.effective_user.id):
         return ConversationHandler.END
     
     message = update.message.text
-    user_ids = db.get_all_user_ids()
-    
-    await update.message.reply_text(
-        f"📤 Mengirim broadcast ke {len(user_ids)} users...\n"
-        "Mohon tunggu..."
-    )
-    
-    success_count = 0
-    fail_count = 0
-    
     broadcast_text = f"📢 <b>Pengumuman dari Admin</b>\n\n{message}"
     
-    for user_id in user_ids:
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=broadcast_text,
-                parse_mode='HTML'
-            )
-            success_count += 1
-        except Exception as e:
-            logger.error(f"Failed to send to {user_id}: {e}")
-            fail_count += 1
-    
-    result_text = (
-        f"✅ <b>Broadcast Selesai!</b>\n\n"
-        f"✅ Berhasil: {success_count}\n"
-        f"❌ Gagal: {fail_count}"
-    )
-    
-    await update.message.reply_text(result_text, parse_mode='HTML')
+    # Dikirim di background; pesan progress dari engine di-edit sampai selesai
+    job_id = await broadcast_engine.start(context.bot, update.effective_chat.id, broadcast_text)
+    if job_id is None:
+        await update.message.reply_text("❌ Gagal memulai broadcast. Silakan coba lagi.")
     
     return ConversationHandler.END
 
 
+@instrument_handler
 async def admin_panel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Callback untuk kembali ke admin panel"""
     query = update.callback_query
@@ -925,6 +1242,7 @@ async def admin_panel_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
 async def admin_close(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menutup admin panel"""
     query = update.callback_query
@@ -940,13 +1258,14 @@ async def admin_close(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ============= SUBSCRIPTION MENU =============
 
+@instrument_handler
 async def show_subscription_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan menu subscription dengan pricing"""
     query = update.callback_query
     await query.answer()
     
     user_id = update.effective_user.id
-    subscription = db.get_user_subscription(user_id)
+    subscription = await db.get_user_subscription(user_id)
     current_tier = subscription['tier']
     
     # Build subscription info text
@@ -997,6 +1316,7 @@ async def show_subscription_menu(update: Update, context: ContextTypes.DEFAULT_T
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
 async def show_upgrade_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan informasi upgrade dan cara pembayaran"""
     query = update.callback_query
@@ -1037,13 +1357,41 @@ async def show_upgrade_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
 
+@instrument_handler
 async def show_transaction_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Menampilkan riwayat transaksi terbaru"""
+    """Menampilkan riwayat transaksi per halaman (keyset pagination)"""
     query = update.callback_query
     await query.answer()
     
     user_id = update.effective_user.id
-    transactions = db.get_all_transactions(user_id, MODE_PERSONAL)
+    
+    # callback_data: transaction_history | history_older_<id> | history_newer_<id>
+    before_id = after_id = None
+    if query.data.startswith("history_older_"):
+        before_id = int(query.data.rsplit('_', 1)[1])
+    elif query.data.startswith("history_newer_"):
+        after_id = int(query.data.rsplit('_', 1)[1])
+    
+    # Ambil 1 baris ekstra untuk mengetahui apakah masih ada halaman berikutnya
+    transactions = await db.get_recent_transactions(
+        user_id, MODE_PERSONAL, HISTORY_PAGE_SIZE + 1,
+        before_id=before_id, after_id=after_id
+    )
+    if after_id is not None and len(transactions) <= HISTORY_PAGE_SIZE:
+        # Sudah sampai transaksi terbaru, tampilkan halaman pertama yang penuh
+        after_id = None
+        transactions = await db.get_recent_transactions(user_id, MODE_PERSONAL, HISTORY_PAGE_SIZE + 1)
+    
+    if after_id is not None:
+        has_newer = True
+        has_older = True
+        transactions = transactions[-HISTORY_PAGE_SIZE:]
+    else:
+        has_newer = before_id is not None
+        has_older = len(transactions) > HISTORY_PAGE_SIZE
+        transactions = transactions[:HISTORY_PAGE_SIZE]
+    
+    keyboard = []
     
     if not transactions:
         text = (
@@ -1053,27 +1401,37 @@ async def show_transaction_history(update: Update, context: ContextTypes.DEFAULT
             "Mulai catat transaksi Anda sekarang!"
         )
     else:
+        total_count = (await db.get_balance(user_id, MODE_PERSONAL))['count']
         text = (
             "📋 <b>Riwayat Transaksi Terbaru</b>\n"
+            f"<i>Total: {total_count} transaksi</i>\n"
             "━━━━━━━━━━━━━━━━━━━━━━\n\n"
         )
         
-        # Show last 10 transactions
-        for i, trans in enumerate(transactions[:10], 1):
-            emoji = "💰" if trans['Tipe'] == 'income' else "💸"
+        for trans in transactions:
+            emoji = "💰" if trans['type'] == 'income' else "💸"
             text += (
-                f"{i}. {emoji} <b>{trans['Kategori']}</b>\n"
-                f"   {format_currency(trans['Nominal'])}\n"
-                f"   📝 {trans['Deskripsi']}\n"
-                f"   📅 {trans['Tanggal'][:10]}\n\n"
+                f"{emoji} <b>{trans['category']}</b>\n"
+                f"   {format_currency(trans['amount'])}\n"
+                f"   📝 {trans['description']}\n"
+                f"   📅 {trans['date'][:10]}\n\n"
             )
         
-        if len(transactions) > 10:
-            text += f"<i>... dan {len(transactions) - 10} transaksi lainnya</i>\n\n"
-        
         text += "💡 <i>Export untuk melihat semua transaksi</i>"
+        
+        nav_row = []
+        if has_newer:
+            nav_row.append(InlineKeyboardButton(
+                "⬅️ Lebih Baru", callback_data=f"history_newer_{transactions[0]['id']}"
+            ))
+        if has_older:
+            nav_row.append(InlineKeyboardButton(
+                "Lebih Lama ➡️", callback_data=f"history_older_{transactions[-1]['id']}"
+            ))
+        if nav_row:
+            keyboard.append(nav_row)
     
-    keyboard = [[InlineKeyboardButton("🔙 Kembali", callback_data="main_menu")]]
+    keyboard.append([InlineKeyboardButton("🔙 Kembali", callback_data="main_menu")])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
@@ -1081,12 +1439,13 @@ async def show_transaction_history(update: Update, context: ContextTypes.DEFAULT
 
 # ============= CALLBACK QUERY ROUTER =============
 
+@instrument_handler
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Router untuk semua callback query"""
     query = update.callback_query
     data = query.data
     
-    # Update last active
+    # Update last active (dicatat di memori, ditulis berkala oleh flusher)
     db.update_last_active(update.effective_user.id)
     
     # Route berdasarkan callback data
@@ -1102,6 +1461,8 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_export_menu(update, context)
     elif data.startswith("export_"):
         await export_data(update, context)
+    elif data == "import_help":
+        await show_import_help(update, context)
     elif data == "business_menu":
         await show_business_menu(update, context)
     elif data == "view_debts":
@@ -1110,7 +1471,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_subscription_menu(update, context)
     elif data.startswith("upgrade_"):
         await show_upgrade_info(update, context)
-    elif data == "transaction_history":
+    elif data == "transaction_history" or data.startswith("history_"):
         await show_transaction_history(update, context)
     elif data == "help":
         await help_command(update, context)
@@ -1126,26 +1487,110 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await admin_close(update, context)
 
 
-# ============= MAIN FUNCTION =============
+# ============= STARTUP & SHUTDOWN =============
 
-def main():
-    """Main function untuk menjalankan bot dengan webhook (Web Service)"""
-    
-    # Validasi TOKEN dan ADMIN_ID
-    if BOT_TOKEN == 'YOUR_BOT_TOKEN_HERE':
-        logger.error("❌ BOT_TOKEN belum diset! Set environment variable BOT_TOKEN")
+async def scheduled_backup(context: ContextTypes.DEFAULT_TYPE):
+    """Job terjadwal: snapshot database ke BACKUP_DIR, admin diberi tahu jika gagal"""
+    try:
+        await db.run(create_backup, db.helper, BACKUP_DIR, BACKUP_KEEP)
+    except Exception as e:
+        logger.error(f"Scheduled backup failed: {e}")
+        if ADMIN_ID != 0:
+            await context.bot.send_message(chat_id=ADMIN_ID, text=f"⚠️ Backup database terjadwal gagal: {e}")
+
+
+_first_response_logged = False
+
+
+@instrument_handler
+async def log_first_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler group terakhir: mencatat waktu dari start proses sampai update pertama selesai dijawab"""
+    global _first_response_logged
+    if _first_response_logged:
         return
+    _first_response_logged = True
+    logger.info(f"⏱️ First response {time.monotonic() - PROCESS_STARTED_AT:.2f}s after process start")
+
+
+async def prewarm_charts(application):
+    """Menunggu webhook aktif, lalu memuat library chart di worker di background"""
+    try:
+        while not application.running:
+            await asyncio.sleep(0.5)
+        logger.info(f"⏱️ Webhook ready {time.monotonic() - PROCESS_STARTED_AT:.2f}s after process start")
+        
+        if CHART_PREWARM_DELAY < 0:
+            return
+        await asyncio.sleep(CHART_PREWARM_DELAY)
+        started = time.monotonic()
+        await chart_service.warm_up()
+        logger.info(f"Chart workers warmed up in {time.monotonic() - started:.2f}s")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Error warming up chart workers: {e}")
+
+
+async def post_init(application):
+    """Dipanggil sebelum webhook dipasang - buka database, jalankan task background & lanjutkan broadcast"""
+    # Tabel & migrasi; SchemaConfigError menggagalkan start
+    await db.run(db.helper.init_db)
     
-    if ADMIN_ID == 0:
-        logger.warning("⚠️ ADMIN_ID belum diset! Admin panel tidak akan berfungsi.")
+    application.bot_data['prewarm_task'] = asyncio.create_task(prewarm_charts(application))
+    
+    application.bot_data['last_active_task'] = asyncio.create_task(
+        db.run_last_active_flusher(LAST_ACTIVE_FLUSH_INTERVAL)
+    )
     
-    # Build application
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+    # Lanjutkan broadcast yang terputus karena restart
+    await broadcast_engine.resume(application.bot)
+
+
+async def post_shutdown(application):
+    """Dipanggil saat bot berhenti - tutup thread pool database dan worker chart"""
+    prewarm_task = application.bot_data.get('prewarm_task')
+    if prewarm_task is not None:
+        prewarm_task.cancel()
+    await broadcast_engine.stop()
+    
+    # Tulis aktivitas user yang masih tertunda sebelum thread pool database ditutup
+    last_active_task = application.bot_data.get('last_active_task')
+    if last_active_task is not None:
+        last_active_task.cancel()
+    await db.flush_last_active()
+    
+    chart_service.shutdown()
+    db.shutdown()
+
+
+# ============= MAIN FUNCTION =============
+
+def build_application(token: str = BOT_TOKEN, base_url: str = None, base_file_url: str = None):
+    """
+    Application lengkap dengan semua handler (tanpa menjalankannya).
+    base_url/base_file_url mengganti alamat Bot API, misal server tiruan di loadtest.py
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .updater(None)  # Update diterima oleh webhook_server, bukan Updater bawaan
+        .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if base_file_url:
+        builder = builder.base_file_url(base_file_url)
+    application = builder.build()
     
     # Command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("timezone", timezone_command))
     application.add_handler(CommandHandler("admin", admin_panel))
+    application.add_handler(CommandHandler("rebuild_balances", admin_rebuild_balances))
+    application.add_handler(CommandHandler("slow_queries", admin_slow_queries))
     
     # Conversation handler untuk Add Transaction
     trans_conv_handler = ConversationHandler(
@@ -1192,9 +1637,43 @@ def main():
     )
     application.add_handler(broadcast_conv_handler)
     
+    # Upload file CSV/Excel untuk import transaksi
+    application.add_handler(MessageHandler(
+        filters.Document.FileExtension('csv') | filters.Document.FileExtension('xlsx'),
+        import_document
+    ))
+    
     # Callback query handler (harus di akhir)
     application.add_handler(CallbackQueryHandler(button_callback))
     
+    # Group terpisah, jalan setelah handler utama selesai membalas
+    application.add_handler(TypeHandler(Update, log_first_response), group=99)
+    
+    # Backup terjadwal (butuh python-telegram-bot[job-queue])
+    if BACKUP_INTERVAL_HOURS > 0:
+        if application.job_queue is not None:
+            application.job_queue.run_repeating(
+                scheduled_backup, interval=BACKUP_INTERVAL_HOURS * 3600, first=60, name="database_backup"
+            )
+        else:
+            logger.warning("⚠️ JobQueue tidak tersedia, backup terjadwal dimatikan")
+    
+    return application
+
+
+def main():
+    """Main function untuk menjalankan bot dengan webhook (Web Service)"""
+    
+    # Validasi TOKEN dan ADMIN_ID
+    if BOT_TOKEN == 'YOUR_BOT_TOKEN_HERE':
+        logger.error("❌ BOT_TOKEN belum diset! Set environment variable BOT_TOKEN")
+        return
+    
+    if ADMIN_ID == 0:
+        logger.warning("⚠️ ADMIN_ID belum diset! Admin panel tidak akan berfungsi.")
+    
+    application = build_application()
+    
     # Get webhook URL from environment or construct from Render
     webhook_url = os.getenv('WEBHOOK_URL')
     if not webhook_url:
@@ -1209,21 +1688,25 @@ def main():
     # Get port from environment (Render provides this)
     port = int(os.getenv('PORT', 10000))
     
+    # Buat worker chart sekarang, sebelum bot menjalankan thread lain
+    chart_service.start()
+    
     # Start bot with webhook
     logger.info("🚀 Starting bot with webhook...")
     logger.info(f"📊 Database: {db.db_path}")
     logger.info(f"👤 Admin ID: {ADMIN_ID if ADMIN_ID != 0 else 'Not set'}")
     logger.info(f"🌐 Webhook URL: {webhook_url}")
-    logger.info(f"🔌 Port: {port}")
+    logger.info(f"🔌 Port: {port} (metrics: /metrics)")
     
-    # Run webhook
-    application.run_webhook(
+    # Run webhook (server sendiri agar /metrics bisa dilayani di port yang sama)
+    asyncio.run(serve_webhook(
+        application,
         listen="0.0.0.0",
         port=port,
         url_path=BOT_TOKEN,
         webhook_url=webhook_url,
-        allowed_updates=Update.ALL_TYPES
-    )
+        metrics_token=METRICS_TOKEN or None
+    ))
 
 
 if __name__ == '__main__':
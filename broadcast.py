@@ -0,0 +1,249 @@
+"""
+Engine broadcast: kirim pesan ke semua user dengan batas kecepatan (token bucket),
+jumlah request paralel terbatas, patuh RetryAfter dari Telegram, dan progress
+yang tersimpan per penerima sehingga job bisa dilanjutkan setelah restart
+"""
+import asyncio
+import html
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError, TimedOut
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket async: rata-rata `rate` token per detik dengan burst maksimum `capacity`
+    (default 1: pesan dikirim merata, tidak menumpuk di awal detik).
+    pause() menahan semua pengambil token (dipakai saat Telegram membalas RetryAfter)
+    """
+    
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def pause(self, seconds: float):
+        """Tidak ada token yang keluar selama `seconds` detik ke depan"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+    
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+class BroadcastEngine:
+    """
+    Menjalankan job broadcast di background task.
+    - rate: pesan per detik (Telegram membatasi ~30 pesan/detik untuk bot)
+    - concurrency: jumlah request send_message yang berjalan bersamaan
+    - batch_size: jumlah penerima yang diambil & disimpan hasilnya sekaligus
+    - progress_interval: detik minimum antar edit pesan progress ke admin
+    - max_attempts: percobaan per penerima untuk error jaringan
+    - max_flood_waits: batas terpisah berapa kali satu penerima menunggu RetryAfter
+      (flood limit bukan kesalahan penerima, jadi tidak memakai jatah max_attempts)
+    """
+    
+    def __init__(self, db, rate: float = 25, concurrency: int = 8, batch_size: int = 200,
+                 progress_interval: float = 5, max_attempts: int = 3, max_flood_waits: int = 20):
+        self.db = db  # AsyncDBHelper
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.max_attempts = max_attempts
+        self.max_flood_waits = max_flood_waits
+        self._tasks: Dict[int, asyncio.Task] = {}
+    
+    async def start(self, bot, admin_chat_id: int, text: str) -> int:
+        """
+        Membuat job baru lalu mulai mengirim di background.
+        Returns job ID, None jika job gagal dibuat
+        """
+        job_id = await self.db.create_broadcast_job(admin_chat_id, text)
+        if job_id is None:
+            return None
+        
+        job = await self.db.get_broadcast_job(job_id)
+        message = await bot.send_message(
+            chat_id=admin_chat_id,
+            text=self._progress_text(job),
+            parse_mode='HTML'
+        )
+        await self.db.set_broadcast_progress_message(job_id, message.message_id)
+        
+        self._spawn(bot, job_id)
+        return job_id
+    
+    async def resume(self, bot) -> List[int]:
+        """Melanjutkan job yang terhenti karena restart. Returns ID job yang dilanjutkan"""
+        job_ids = await self.db.get_unfinished_broadcast_jobs()
+        for job_id in job_ids:
+            if job_id not in self._tasks:
+                logger.info(f"Resuming broadcast job {job_id}")
+                self._spawn(bot, job_id)
+        return job_ids
+    
+    async def stop(self):
+        """
+        Menghentikan semua job yang sedang berjalan. Hasil yang sudah terkirim disimpan,
+        penerima sisanya tetap 'pending' dan dilanjutkan oleh resume()
+        """
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _spawn(self, bot, job_id: int):
+        task = asyncio.create_task(self._run(bot, job_id), name=f"broadcast-{job_id}")
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+    
+    async def _run(self, bot, job_id: int):
+        job = await self.db.get_broadcast_job(job_id)
+        if job is None:
+            return
+        
+        text = job['text']
+        semaphore = asyncio.Semaphore(self.concurrency)
+        last_progress = time.monotonic()
+        
+        try:
+            while True:
+                user_ids = await self.db.get_pending_broadcast_recipients(job_id, self.batch_size)
+                if not user_ids:
+                    break
+                
+                results: List[Tuple[int, str, str]] = []
+                try:
+                    await asyncio.gather(*(
+                        self._deliver(bot, semaphore, user_id, text, results) for user_id in user_ids
+                    ))
+                finally:
+                    # Simpan juga saat dibatalkan, supaya pesan yang sudah terkirim tidak diulang
+                    if results:
+                        saved = await self.db.save_broadcast_results(job_id, results)
+                        if not saved:
+                            raise RuntimeError("Failed to save broadcast results")
+                
+                if time.monotonic() - last_progress >= self.progress_interval:
+                    last_progress = time.monotonic()
+                    await self._report(bot, job_id)
+            
+            await self.db.finish_broadcast_job(job_id)
+            await self._report(bot, job_id)
+            logger.info(f"Broadcast job {job_id} finished")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Tandai failed agar tidak di-resume terus saat startup, lalu kabari admin
+            logger.error(f"Broadcast job {job_id} stopped: {e}")
+            await self.db.finish_broadcast_job(job_id, 'failed', str(e))
+            await self._report(bot, job_id)
+            try:
+                await bot.send_message(
+                    chat_id=job['admin_chat_id'],
+                    text=f"⚠️ Broadcast #{job_id} berhenti karena error: {e}\n\n"
+                         f"Penerima yang belum terkirim tidak dilanjutkan otomatis."
+                )
+            except Exception as notify_error:
+                logger.error(f"Error notifying admin about broadcast {job_id}: {notify_error}")
+    
+    async def _deliver(self, bot, semaphore: asyncio.Semaphore, user_id: int, text: str,
+                       results: List[Tuple[int, str, str]]):
+        async with semaphore:
+            status, error = await self._send(bot, user_id, text)
+        results.append((user_id, status, error))
+    
+    async def _send(self, bot, user_id: int, text: str) -> Tuple[str, str]:
+        """Kirim ke satu user. Returns (status, error) dengan status sent/blocked/failed"""
+        error = None
+        attempt = 0
+        flood_waits = 0
+        while attempt < self.max_attempts and flood_waits <= self.max_flood_waits:
+            await self.bucket.acquire()
+            try:
+                await bot.send_message(chat_id=user_id, text=text, parse_mode='HTML')
+                return 'sent', None
+            except RetryAfter as e:
+                # Flood limit berlaku untuk seluruh bot, jadi semua pengiriman ikut berhenti;
+                # acquire() berikutnya menunggu jeda selesai lalu kirim ulang
+                delay = _retry_after_seconds(e)
+                logger.warning(f"Broadcast flood limit, pausing {delay}s")
+                self.bucket.pause(delay)
+                flood_waits += 1
+                error = str(e)
+                continue
+            except Forbidden as e:
+                # Bot diblokir / akun user dihapus
+                return 'blocked', str(e)
+            except BadRequest as e:
+                return 'failed', str(e)
+            except (TimedOut, NetworkError) as e:
+                error = str(e)
+                await asyncio.sleep(2 ** attempt)
+            except TelegramError as e:
+                return 'failed', str(e)
+            attempt += 1
+        
+        logger.error(f"Failed to send broadcast to {user_id}: {error}")
+        return 'failed', error
+    
+    @staticmethod
+    def _progress_text(job: Dict) -> str:
+        done = job['sent'] + job['failed'] + job['blocked']
+        titles = {'done': "✅ <b>Broadcast Selesai!</b>", 'failed': "⚠️ <b>Broadcast Berhenti (error)</b>"}
+        text = (
+            f"{titles.get(job['status'], '📤 <b>Broadcast berjalan...</b>')}\n\n"
+            f"Progress: {done}/{job['total']}\n"
+            f"✅ Berhasil: {job['sent']}\n"
+            f"❌ Gagal: {job['failed']}\n"
+            f"🚫 Memblokir bot: {job['blocked']}"
+        )
+        if job.get('error'):
+            text += f"\n\nError: {html.escape(job['error'])}"
+        return text
+    
+    async def _report(self, bot, job_id: int):
+        """Edit pesan progress ke admin"""
+        job = await self.db.get_broadcast_job(job_id)
+        if job is None or not job['progress_message_id']:
+            return
+        
+        try:
+            await bot.edit_message_text(
+                chat_id=job['admin_chat_id'],
+                message_id=job['progress_message_id'],
+                text=self._progress_text(job),
+                parse_mode='HTML'
+            )
+        except BadRequest as e:
+            # "Message is not modified" saat progress belum berubah
+            if 'not modified' not in str(e).lower():
+                logger.error(f"Error updating broadcast progress: {e}")
+        except Exception as e:
+            logger.error(f"Error updating broadcast progress: {e}")
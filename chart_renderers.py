@@ -0,0 +1,372 @@
+"""
+Backend render chart yang bisa dipilih lewat config (CHART_BACKEND):
+- matplotlib: tampilan lengkap, figure dibuat sekali lalu dipakai ulang
+- pillow: gambar pie/bar sederhana langsung dengan Pillow, jauh lebih ringan
+Hasil render di-encode sebagai PNG berpalet teroptimasi atau JPEG dengan target ukuran byte
+"""
+import colorsys
+import importlib.util
+import io
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils import format_amount, format_currency, load_chart_libraries
+
+# Ukuran figure (inci) per jenis chart - ukuran pixel = inci x dpi tier user
+CHART_SIZES = {
+    'pie': (10, 8),
+    'bar': (12, 6),
+}
+
+# Batas kualitas JPEG saat mencari ukuran file di bawah target
+JPEG_MAX_QUALITY = 85
+JPEG_MIN_QUALITY = 40
+
+
+def _plain_label(text: str) -> str:
+    """Buang emoji (tidak ada di font) dari nama kategori"""
+    return ''.join(ch for ch in str(text) if ord(ch) <= 0xFFFF and ch != '\ufe0f').strip()
+
+
+def encode_image(image: Image.Image, image_format: str = 'png', target_bytes: int = None) -> bytes:
+    """
+    Encode hasil render.
+    - png: dikonversi ke palet 256 warna (chart hanya punya sedikit warna); zlib level
+      default karena optimize=True ~2.5x lebih lambat untuk selisih ukuran <10%
+    - jpeg: kualitas tertinggi yang ukurannya <= target_bytes (binary search)
+    """
+    image = image.convert('RGB')
+    
+    if image_format == 'jpeg':
+        def save(quality: int) -> bytes:
+            buf = io.BytesIO()
+            image.save(buf, format='JPEG', quality=quality, optimize=True)
+            return buf.getvalue()
+        
+        best = save(JPEG_MAX_QUALITY)
+        if not target_bytes or len(best) <= target_bytes:
+            return best
+        
+        low, high = JPEG_MIN_QUALITY, JPEG_MAX_QUALITY - 1
+        best = None
+        while low <= high:
+            quality = (low + high) // 2
+            encoded = save(quality)
+            if len(encoded) <= target_bytes:
+                best = encoded
+                low = quality + 1
+            else:
+                high = quality - 1
+        return best or save(JPEG_MIN_QUALITY)
+    
+    buf = io.BytesIO()
+    image.quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class MatplotlibRenderer:
+    """
+    Render dengan matplotlib tanpa pyplot. Satu figure per jenis chart dibuat sekali
+    per worker lalu dipakai ulang (axes di-clear), dengan margin tetap sebagai ganti
+    bbox_inches='tight' yang butuh layout pass tambahan
+    """
+    
+    def __init__(self):
+        self._templates: Dict[str, Tuple] = {}
+    
+    def _template(self, kind: str):
+        if kind not in self._templates:
+            load_chart_libraries()
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            
+            fig = Figure(figsize=CHART_SIZES[kind])
+            canvas = FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
+            self._templates[kind] = (fig, canvas, ax)
+        return self._templates[kind]
+    
+    def warm_up(self):
+        for kind in CHART_SIZES:
+            self._template(kind)
+    
+    def render(self, kind: str, data: List[Tuple], title: str, dpi: int,
+               xlabel: str = "Kategori", ylabel: str = "Nominal (Rp)") -> Image.Image:
+        load_chart_libraries()
+        fig, canvas, ax = self._template(kind)
+        ax.clear()
+        fig.set_dpi(dpi)
+        
+        categories = [_plain_label(row[0]) for row in data]
+        amounts = [row[1] for row in data]
+        
+        if kind == 'pie':
+            colors = _matplotlib_colors(_husl_colors(len(categories)))
+            wedges, texts, autotexts = ax.pie(
+                amounts,
+                labels=categories,
+                autopct='%1.1f%%',
+                startangle=90,
+                colors=colors,
+                textprops={'fontsize': 11}
+            )
+            for autotext in autotexts:
+                autotext.set_color('white')
+                autotext.set_fontweight('bold')
+            # Ruang kiri/kanan untuk label kategori di luar lingkaran
+            fig.subplots_adjust(left=0.2, right=0.8, top=0.88, bottom=0.06)
+        else:
+            colors = _matplotlib_colors(_viridis_colors(len(categories)))
+            bars = ax.bar(categories, amounts, color=colors, edgecolor='black', linewidth=0.5)
+            for bar in bars:
+                height = bar.get_height()
+                ax.text(bar.get_x() + bar.get_width() / 2., height,
+                        f'{format_currency(height)}',
+                        ha='center', va='bottom', fontsize=9, rotation=0)
+            
+            ax.set_xlabel(xlabel, fontsize=12, fontweight='bold')
+            ax.set_ylabel(ylabel, fontsize=12, fontweight='bold')
+            
+            rotated = len(categories) > 5
+            if rotated:
+                ax.tick_params(axis='x', labelrotation=45)
+                for label in ax.get_xticklabels():
+                    label.set_horizontalalignment('right')
+            
+            # Nilai chart dalam satuan terkecil; label sumbu Y dalam nominal biasa
+            ax.yaxis.set_major_formatter(lambda value, _: format_amount(value))
+            ax.yaxis.grid(True, linestyle='--', alpha=0.7)
+            ax.set_axisbelow(True)
+            fig.subplots_adjust(left=0.1, right=0.97, top=0.9, bottom=0.3 if rotated else 0.14)
+        
+        ax.set_title(_plain_label(title), fontsize=14, fontweight='bold', pad=20)
+        
+        canvas.draw()
+        width, height = canvas.get_width_height()
+        return Image.frombuffer('RGBA', (width, height), canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+
+
+def _matplotlib_colors(colors: List[Tuple[int, int, int]]) -> List[Tuple[float, float, float]]:
+    """Warna RGB 0-255 (palet yang sama dengan backend Pillow) -> 0-1 untuk matplotlib"""
+    return [tuple(channel / 255 for channel in color) for color in colors]
+
+
+def _font_path(bold: bool = False) -> str:
+    """Font DejaVu bawaan matplotlib (dicari tanpa meng-import matplotlib)"""
+    spec = importlib.util.find_spec('matplotlib')
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    name = 'DejaVuSans-Bold.ttf' if bold else 'DejaVuSans.ttf'
+    path = os.path.join(spec.submodule_search_locations[0], 'mpl-data', 'fonts', 'ttf', name)
+    return path if os.path.exists(path) else None
+
+
+@lru_cache(maxsize=32)
+def _font(size: int, bold: bool = False) -> ImageFont.ImageFont:
+    path = _font_path(bold)
+    if path:
+        return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size)
+
+
+def _husl_colors(count: int) -> List[Tuple[int, int, int]]:
+    """Hue merata (mirip palet 'husl')"""
+    colors = []
+    for i in range(count):
+        r, g, b = colorsys.hls_to_rgb((0.01 + i / max(count, 1)) % 1.0, 0.6, 0.65)
+        colors.append((int(r * 255), int(g * 255), int(b * 255)))
+    return colors
+
+
+_VIRIDIS = [(68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37)]
+
+
+def _viridis_colors(count: int) -> List[Tuple[int, int, int]]:
+    """Interpolasi palet viridis tanpa ujung paling gelap/terang"""
+    colors = []
+    for i in range(count):
+        position = (i + 1) / (count + 1) * (len(_VIRIDIS) - 1)
+        index = min(int(position), len(_VIRIDIS) - 2)
+        frac = position - index
+        start, end = _VIRIDIS[index], _VIRIDIS[index + 1]
+        colors.append(tuple(int(s + (e - s) * frac) for s, e in zip(start, end)))
+    return colors
+
+
+def _nice_step(max_value: float, ticks: int = 5) -> float:
+    """Jarak garis grid 1/2/5 x 10^n"""
+    raw = max_value / ticks
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if raw <= factor * magnitude:
+            return factor * magnitude
+    return 10 * magnitude
+
+
+class PillowRenderer:
+    """
+    Render pie/bar langsung dengan ImageDraw. Digambar 2x lebih besar lalu diperkecil
+    (anti-aliasing), tetap jauh lebih murah daripada matplotlib
+    """
+    
+    SUPERSAMPLE = 2
+    
+    def warm_up(self):
+        _font(12)
+        _font(12, bold=True)
+    
+    def render(self, kind: str, data: List[Tuple], title: str, dpi: int,
+               xlabel: str = "Kategori", ylabel: str = "Nominal (Rp)") -> Image.Image:
+        scale = dpi * self.SUPERSAMPLE
+        width_in, height_in = CHART_SIZES[kind]
+        size = (int(width_in * scale), int(height_in * scale))
+        image = Image.new('RGB', size, 'white')
+        draw = ImageDraw.Draw(image)
+        
+        def pt(points: float) -> int:
+            return max(1, int(points * scale / 72))
+        
+        title_font = _font(pt(14), bold=True)
+        draw.text((size[0] / 2, pt(14)), _plain_label(title), fill='black', font=title_font, anchor='mt')
+        top = pt(14) * 3
+        
+        if kind == 'pie':
+            self._draw_pie(draw, data, size, top, pt)
+        else:
+            self._draw_bar(image, draw, data, size, top, pt, xlabel, ylabel)
+        
+        return image.reduce(self.SUPERSAMPLE)
+    
+    def _draw_pie(self, draw, data, size, top, pt):
+        amounts = [max(row[1], 0) for row in data]
+        total = sum(amounts) or 1
+        colors = _husl_colors(len(data))
+        
+        # Lingkaran di kiri, legenda (kategori + persentase) di kanan
+        available = size[1] - top - pt(14)
+        diameter = min(size[0] * 0.55, available)
+        left = size[0] * 0.05
+        top += (available - diameter) / 2
+        box = (left, top, left + diameter, top + diameter)
+        center = (left + diameter / 2, top + diameter / 2)
+        
+        label_font = _font(pt(11), bold=True)
+        angle = -90.0
+        for amount, color in zip(amounts, colors):
+            sweep = amount / total * 360
+            if sweep <= 0:
+                continue
+            draw.pieslice(box, angle, angle + sweep, fill=color, outline='white', width=pt(1))
+            if sweep >= 14:  # persentase di dalam slice yang cukup besar
+                middle = math.radians(angle + sweep / 2)
+                radius = diameter * 0.3
+                position = (center[0] + radius * math.cos(middle), center[1] + radius * math.sin(middle))
+                draw.text(position, f"{amount / total * 100:.1f}%", fill='white', font=label_font, anchor='mm')
+            angle += sweep
+        
+        legend_font = _font(pt(11))
+        legend_x = left + diameter + size[0] * 0.05
+        row_height = pt(11) * 2
+        legend_y = max(top, center[1] - row_height * len(data) / 2)
+        for (category, amount), color in zip([(row[0], row[1]) for row in data], colors):
+            draw.rectangle((legend_x, legend_y, legend_x + pt(11), legend_y + pt(11)), fill=color)
+            text = f"{_plain_label(category)} ({max(amount, 0) / total * 100:.1f}%)"
+            draw.text((legend_x + pt(11) * 1.6, legend_y + pt(11) / 2), text,
+                      fill='black', font=legend_font, anchor='lm')
+            legend_y += row_height
+    
+    def _draw_bar(self, image, draw, data, size, top, pt, xlabel, ylabel):
+        amounts = [max(row[1], 0) for row in data]
+        colors = _viridis_colors(len(data))
+        rotated = len(data) > 5
+        
+        tick_font = _font(pt(9))
+        axis_font = _font(pt(12), bold=True)
+        
+        max_value = max(amounts) or 1
+        step = _nice_step(max_value)
+        axis_max = step * math.ceil(max_value * 1.1 / step)
+        
+        plot_left = size[0] * 0.14
+        plot_right = size[0] * 0.97
+        plot_top = top + pt(12)
+        plot_bottom = size[1] * (0.7 if rotated else 0.86)
+        plot_height = plot_bottom - plot_top
+        
+        def y_of(value: float) -> float:
+            return plot_bottom - value / axis_max * plot_height
+        
+        # Grid & label sumbu Y
+        value = 0.0
+        while value <= axis_max + step / 2:
+            y = y_of(value)
+            for x in range(int(plot_left), int(plot_right), pt(6)):
+                draw.line((x, y, min(x + pt(3), plot_right), y), fill=(200, 200, 200), width=max(1, pt(0.5)))
+            draw.text((plot_left - pt(4), y), format_currency(value), fill='black', font=tick_font, anchor='rm')
+            value += step
+        draw.line((plot_left, plot_top, plot_left, plot_bottom), fill='black', width=pt(0.8))
+        draw.line((plot_left, plot_bottom, plot_right, plot_bottom), fill='black', width=pt(0.8))
+        
+        slot = (plot_right - plot_left) / len(data)
+        bar_width = slot * 0.8
+        for i, (row, amount, color) in enumerate(zip(data, amounts, colors)):
+            x0 = plot_left + slot * i + (slot - bar_width) / 2
+            draw.rectangle((x0, y_of(amount), x0 + bar_width, plot_bottom), fill=color,
+                           outline='black', width=max(1, pt(0.5)))
+            draw.text((x0 + bar_width / 2, y_of(amount) - pt(2)), format_currency(amount),
+                      fill='black', font=tick_font, anchor='mb')
+            
+            label = _plain_label(row[0])
+            label_x = x0 + bar_width / 2
+            if rotated:
+                # Label miring 45 derajat, ujung kanan label tepat di bawah bar
+                left, upper, right, lower = tick_font.getbbox(label)
+                text_image = Image.new('L', (right + pt(2), lower + pt(2)), 0)
+                ImageDraw.Draw(text_image).text((0, 0), label, fill=255, font=tick_font)
+                text_image = text_image.rotate(45, expand=True, resample=Image.BICUBIC)
+                image.paste('black', (int(label_x - text_image.width), int(plot_bottom + pt(4))), text_image)
+            else:
+                draw.text((label_x, plot_bottom + pt(4)), label, fill='black', font=tick_font, anchor='mt')
+        
+        draw.text(((plot_left + plot_right) / 2, size[1] - pt(6)), xlabel,
+                  fill='black', font=axis_font, anchor='md')
+        
+        ylabel_box = axis_font.getbbox(ylabel)
+        ylabel_image = Image.new('L', (ylabel_box[2] + pt(2), ylabel_box[3] + pt(2)), 0)
+        ImageDraw.Draw(ylabel_image).text((0, 0), ylabel, fill=255, font=axis_font)
+        ylabel_image = ylabel_image.rotate(90, expand=True)
+        image.paste('black', (pt(6), int((plot_top + plot_bottom - ylabel_image.height) / 2)), ylabel_image)
+
+
+RENDERERS = {
+    'matplotlib': MatplotlibRenderer,
+    'pillow': PillowRenderer,
+}
+
+_renderers = {}
+
+
+def get_renderer(backend: str):
+    """Instance renderer per proses (figure template matplotlib ikut tersimpan di sini)"""
+    if backend not in RENDERERS:
+        raise ValueError(f"Unknown chart backend: {backend}")
+    if backend not in _renderers:
+        _renderers[backend] = RENDERERS[backend]()
+    return _renderers[backend]
+
+
+def render_chart(kind: str, data: List[Tuple], title: str, backend: str = 'matplotlib',
+                 dpi: int = 150, image_format: str = 'png', target_bytes: int = None,
+                 **labels) -> bytes:
+    """
+    Render chart 'pie' atau 'bar' lalu return bytes PNG/JPEG.
+    Returns None jika tidak ada data
+    """
+    if not data:
+        return None
+    image = get_renderer(backend).render(kind, data, title, dpi, **labels)
+    return encode_image(image, image_format, target_bytes)
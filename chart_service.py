@@ -0,0 +1,222 @@
+"""
+Service render chart di process pool terpisah
+Render matplotlib bersifat CPU-bound, jadi dijalankan di luar event loop bot
+"""
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ChartServiceBusy(Exception):
+    """Antrian render penuh - request ditolak agar bot tetap responsif"""
+
+
+def _render_chart(kind: str, data: List[Tuple], title: str, backend: str, dpi: int,
+                  image_format: str, target_bytes: int) -> bytes:
+    """Dijalankan di worker process - import library chart terjadi di sini, bukan di bot"""
+    from chart_renderers import render_chart
+    return render_chart(kind, data, title, backend=backend, dpi=dpi,
+                        image_format=image_format, target_bytes=target_bytes)
+
+
+def _noop():
+    """Task kosong untuk memaksa worker process dibuat"""
+    return None
+
+
+def _warm_up(backend: str):
+    """Import library chart (dan siapkan template figure) di worker sebelum ada request chart"""
+    from chart_renderers import get_renderer
+    get_renderer(backend).warm_up()
+
+
+class ChartRenderService:
+    """
+    Render chart di process pool terbatas.
+    - max_workers: jumlah worker process
+    - max_pending: batas antrian; request di atasnya ditolak dengan ChartServiceBusy
+    - timeout: detik maksimum menunggu satu render
+    - backend: 'matplotlib' atau 'pillow' (lihat chart_renderers)
+    - image_format/target_bytes: 'png' atau 'jpeg' dengan target ukuran file
+    """
+    
+    def __init__(self, max_workers: int = 1, max_pending: int = 4, timeout: float = 30,
+                 backend: str = 'matplotlib', image_format: str = 'png', target_bytes: int = None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.backend = backend
+        self.image_format = image_format
+        self.target_bytes = target_bytes
+        self._executor = None
+        self._pending = 0
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # forkserver (spawn jika tidak ada): worker tidak di-fork dari bot yang sudah punya
+            # thread database & event loop, jadi pool aman dibuat ulang kapan saja. Worker
+            # meng-import ulang modul utama (bot.py), yang aman karena database baru dibuka di post_init
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            if context.get_start_method() == 'forkserver':
+                # Import sekali di proses server, worker baru tinggal fork dari sana
+                context.set_forkserver_preload(['__main__', 'chart_renderers'])
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self._executor
+    
+    def start(self):
+        """
+        Membuat semua worker process sekarang (dipanggil di main() sebelum bot mulai
+        berjalan), supaya chart pertama tidak menunggu worker dibuat
+        """
+        executor = self._get_executor()
+        for _ in range(self.max_workers):
+            executor.submit(_noop)
+    
+    async def warm_up(self):
+        """
+        Memuat library chart di semua worker di background, supaya chart pertama
+        setelah bot bangun tidak ikut menanggung waktu import matplotlib
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        futures = [loop.run_in_executor(executor, _warm_up, self.backend) for _ in range(self.max_workers)]
+        await asyncio.gather(*futures)
+    
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """
+        Mematikan pool yang rusak (thread manajemen & worker yang tersisa ikut berhenti).
+        Pool baru yang sudah dibuat oleh request lain tidak ikut dibuang
+        """
+        executor.shutdown(wait=False, cancel_futures=True)
+        if self._executor is executor:
+            self._executor = None
+    
+    def _release(self, future):
+        self._pending -= 1
+        if not future.cancelled():
+            future.exception()  # tandai sudah diambil (hasil render yang timeout dibuang)
+    
+    async def render(self, kind: str, data: List[Tuple], title: str, dpi: int = 150) -> bytes:
+        """
+        Render chart ('pie' atau 'bar') dengan resolusi `dpi` lalu return bytes gambar.
+        Raises ChartServiceBusy jika antrian penuh, asyncio.TimeoutError jika terlalu lama
+        """
+        if self._pending >= self.max_pending:
+            raise ChartServiceBusy()
+        
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            future = loop.run_in_executor(
+                executor, _render_chart, kind, data, title,
+                self.backend, dpi, self.image_format, self.target_bytes
+            )
+        except BrokenProcessPool:
+            # Worker mati (misalnya kehabisan memori) - buat pool baru untuk request berikutnya
+            logger.error("Chart process pool broken, recreating")
+            self._discard_executor(executor)
+            raise
+        
+        # Slot antrian baru dilepas saat worker benar-benar selesai, bukan saat timeout,
+        # sehingga render yang macet tetap dihitung sebagai beban
+        self._pending += 1
+        future.add_done_callback(self._release)
+        
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except BrokenProcessPool:
+            logger.error("Chart worker crashed, recreating process pool")
+            self._discard_executor(executor)
+            raise
+    
+    def shutdown(self):
+        """Menghentikan semua worker process"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class ChartCache:
+    """
+    Cache LRU untuk gambar chart yang sudah dirender, dibatasi total ukuran byte.
+    Key: (user_id, jenis chart, mode, varian/judul); invalidate() membuang semua chart user.
+    Versi adalah jam global yang naik setiap invalidate(). Hasil render yang versinya diambil
+    sebelum invalidate terakhir user itu ditolak oleh put(). Waktu invalidate hanya diingat
+    untuk `max_tracked_users` user terakhir; yang lebih lama dilupakan dan digantikan batas
+    bawah `_floor`, sehingga memori tetap terbatas tanpa menerima hasil render yang basi.
+    """
+    
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, max_tracked_users: int = 10000):
+        self.max_bytes = max_bytes
+        self.max_tracked_users = max_tracked_users
+        self._entries = OrderedDict()
+        self._user_keys: Dict[int, Set[Tuple]] = {}
+        self._clock = 0
+        self._invalidated: OrderedDict = OrderedDict()  # user_id -> versi saat invalidate terakhir
+        self._floor = 0
+        self._size = 0
+    
+    def version(self, user_id: int) -> int:
+        """Versi saat ini - ambil SEBELUM membaca data dari database"""
+        return self._clock
+    
+    def _is_stale(self, user_id: int, version: int) -> bool:
+        """True jika data user (mungkin) sudah berubah sejak `version` diambil"""
+        return version < max(self._floor, self._invalidated.get(user_id, 0))
+    
+    def get(self, user_id: int, chart_type: str, mode: str, variant: str = '') -> bytes:
+        """Mendapatkan chart dari cache, None jika tidak ada"""
+        key = (user_id, chart_type, mode, variant)
+        image = self._entries.get(key)
+        if image is not None:
+            self._entries.move_to_end(key)
+        return image
+    
+    def put(self, user_id: int, chart_type: str, mode: str, version: int,
+            image: bytes, variant: str = ''):
+        """
+        Menyimpan chart hasil render. Diabaikan jika data user sudah berubah
+        sejak `version` diambil (hasil render sudah basi) atau ukurannya melebihi batas.
+        """
+        if self._is_stale(user_id, version) or len(image) > self.max_bytes:
+            return
+        
+        key = (user_id, chart_type, mode, variant)
+        if key in self._entries:
+            self._remove(key)
+        
+        self._entries[key] = image
+        self._user_keys.setdefault(user_id, set()).add(key)
+        self._size += len(image)
+        
+        while self._size > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+    
+    def invalidate(self, user_id: int):
+        """Dipanggil setelah transaksi user ditambah/diubah - buang semua chart user"""
+        self._clock += 1
+        self._invalidated[user_id] = self._clock
+        self._invalidated.move_to_end(user_id)
+        while len(self._invalidated) > self.max_tracked_users:
+            _, forgotten = self._invalidated.popitem(last=False)
+            self._floor = max(self._floor, forgotten)
+        
+        for key in list(self._user_keys.get(user_id, ())):
+            self._remove(key)
+    
+    def _remove(self, key: Tuple):
+        image = self._entries.pop(key)
+        self._size -= len(image)
+        user_keys = self._user_keys.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._user_keys[key[0]]
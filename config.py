@@ -7,9 +7,54 @@ import os
 # Bot Configuration
 BOT_TOKEN = os.getenv('BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
 ADMIN_ID = int(os.getenv('ADMIN_ID', '0'))  # Ganti dengan Telegram User ID Admin
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '32'))  # Update diproses paralel; update satu user tetap berurutan
 
 # Database Configuration
 DB_PATH = os.getenv('DB_PATH', 'finance.db')
+DB_WORKERS = int(os.getenv('DB_WORKERS', '4'))  # Jumlah thread untuk query database
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '8192'))  # Page cache per koneksi (KB)
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(64 * 1024 * 1024)))  # Memory-mapped I/O (bytes)
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '10'))  # Detik menunggu write lock
+SUBSCRIPTION_CACHE_SIZE = int(os.getenv('SUBSCRIPTION_CACHE_SIZE', '10000'))  # Jumlah user di cache subscription
+SUBSCRIPTION_CACHE_TTL = float(os.getenv('SUBSCRIPTION_CACHE_TTL', '300'))  # Detik sebelum dibaca ulang dari database
+LAST_ACTIVE_FLUSH_INTERVAL = float(os.getenv('LAST_ACTIVE_FLUSH_INTERVAL', '5'))  # Detik antar tulis last_active
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '0'))  # Ambang slow-query log (ms); 0 = mati
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_SAMPLE_RATE', '1'))  # Porsi query lambat yang disimpan untuk /slow_queries
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv('SLOW_QUERY_BUFFER_SIZE', '100'))  # Jumlah entri terakhir yang disimpan
+
+# Backup database (snapshot terkompresi, dirotasi di folder lokal)
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))  # Jumlah backup terbaru yang disimpan
+BACKUP_INTERVAL_HOURS = float(os.getenv('BACKUP_INTERVAL_HOURS', '24'))  # 0 = tanpa backup terjadwal
+
+# Chart Rendering (process pool)
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', '1'))  # Jumlah worker process matplotlib
+CHART_MAX_PENDING = int(os.getenv('CHART_MAX_PENDING', '4'))  # Antrian maksimum sebelum ditolak
+CHART_TIMEOUT = float(os.getenv('CHART_TIMEOUT', '30'))  # Detik maksimum per render
+CHART_CACHE_MAX_BYTES = int(os.getenv('CHART_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))  # Cache PNG chart
+CHART_BACKEND = os.getenv('CHART_BACKEND', 'matplotlib')  # 'matplotlib' atau 'pillow' (lebih ringan)
+CHART_FORMAT = os.getenv('CHART_FORMAT', 'png')  # 'png' (palet, teroptimasi) atau 'jpeg'
+CHART_TARGET_BYTES = int(os.getenv('CHART_TARGET_BYTES', '150000'))  # Target ukuran file untuk JPEG
+CHART_PREWARM_DELAY = float(os.getenv('CHART_PREWARM_DELAY', '5'))  # Detik setelah webhook aktif; < 0 = tanpa pre-warm
+
+# Broadcast (Telegram membatasi ~30 pesan/detik per bot)
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '25'))  # Pesan per detik
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '8'))  # Request kirim paralel
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', '5'))  # Detik antar update progress
+
+# Import transaksi dari file CSV/Excel yang di-upload user
+IMPORT_MAX_FILE_SIZE = int(os.getenv('IMPORT_MAX_FILE_SIZE', str(5 * 1024 * 1024)))  # Ukuran file maksimum (bytes)
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', '20000'))  # Baris maksimum per file
+
+# Nominal disimpan sebagai INTEGER satuan terkecil: 0 = rupiah utuh, 2 = sen.
+# Ditetapkan sebelum database dibuat; mengubahnya kemudian butuh konversi data
+CURRENCY_DECIMALS = int(os.getenv('CURRENCY_DECIMALS', '0'))
+
+# Endpoint Prometheus /metrics di port webhook; jika diisi wajib header Authorization: Bearer <token>
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Timezone default untuk batas bulan (bisa diubah per user via /timezone)
+DEFAULT_TIMEZONE = os.getenv('TIMEZONE', 'Asia/Jakarta')
 
 # Categories - Expanded & Professional
 INCOME_CATEGORIES = [
@@ -51,6 +96,7 @@ SUBSCRIPTION_TIERS = {
         'max_categories': 5,
         'export_limit': 10,
         'chart_types': ['pie'],
+        'chart_dpi': 100,  # Resolusi chart (pie 10x8 inci = 1000x800 px)
         'features': ['Basic Dashboard', 'Simple Reports', 'Limited Export']
     },
     'basic': {
@@ -60,6 +106,7 @@ SUBSCRIPTION_TIERS = {
         'max_categories': 'unlimited',
         'export_limit': 100,
         'chart_types': ['pie', 'bar', 'line'],
+        'chart_dpi': 120,
         'features': ['Advanced Dashboard', 'All Chart Types', 'Unlimited Export', 'Priority Support']
     },
     'premium': {
@@ -69,6 +116,7 @@ SUBSCRIPTION_TIERS = {
         'max_categories': 'unlimited',
         'export_limit': 'unlimited',
         'chart_types': ['pie', 'bar', 'line', 'trend'],
+        'chart_dpi': 150,
         'features': [
             'All Basic Features',
             'Unlimited Transactions',
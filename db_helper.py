@@ -1,27 +1,186 @@
 """
 Database Helper untuk mengelola SQLite Database
+Semua nominal (amount, income, expense, total) berupa integer satuan terkecil
+(lihat utils.to_minor_units / CURRENCY_DECIMALS), kecuali baris export iter_transactions
 """
+import asyncio
+import functools
 import sqlite3
-from datetime import datetime
-from typing import List, Dict, Tuple
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Tuple, Iterator
+from zoneinfo import ZoneInfo
 import logging
 
+from config import DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_BUSY_TIMEOUT, DEFAULT_TIMEZONE
+from migrations import (
+    run_migrations, check_currency_decimals, SchemaConfigError, REBUILD_USER_BALANCES, REBUILD_MONTHLY_ROLLUPS, REBUILD_USER_TRANSACTION_COUNTS,
+    refresh_local_months
+)
+from utils import from_minor_units
+from metrics import DB_DURATION, DB_ERRORS, DB_IN_PROGRESS, track
+from slow_query_log import SlowQueryLog, TimedConnection
+
 logger = logging.getLogger(__name__)
 
+# Pragma yang dipasang pada setiap koneksi baru.
+# journal_mode=WAL bersifat persisten di file database dan diset di init_db.
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}',
+    f'PRAGMA mmap_size = {DB_MMAP_SIZE}',
+    'PRAGMA temp_store = MEMORY',
+)
+
+# Jumlah prepared statement yang di-cache per koneksi
+STATEMENT_CACHE_SIZE = 256
+
+# Header kolom export transaksi (urutan sama dengan iter_transactions)
+TRANSACTION_COLUMNS = ['Tipe', 'Kategori', 'Nominal', 'Deskripsi', 'Tanggal']
+
+# Rowid terbesar di SQLite, batas atas keyset pagination halaman pertama
+MAX_ROWID = 2 ** 63 - 1
+
+
+class TransactionLimitError(Exception):
+    """Transaksi ditolak karena user sudah mencapai max_transactions tier-nya"""
+
+
+@functools.lru_cache(maxsize=64)
+def get_timezone(tz_name: str = None):
+    """Mendapatkan objek timezone user (fallback ke DEFAULT_TIMEZONE, lalu UTC)"""
+    for name in (tz_name, DEFAULT_TIMEZONE):
+        if name:
+            try:
+                return ZoneInfo(name)
+            except Exception:
+                continue
+    return timezone.utc
+
+
+def local_month(created_at: str, tz_name: str = None) -> str:
+    """
+    Bulan lokal (YYYY-MM) dari created_at yang tersimpan dalam UTC.
+    Nilai kolom transactions.local_month yang dibaca trigger monthly_rollups; tidak pernah raise.
+    """
+    if not created_at:
+        return ''
+    try:
+        moment = datetime.fromisoformat(str(created_at)).replace(tzinfo=timezone.utc)
+        return moment.astimezone(get_timezone(tz_name)).strftime('%Y-%m')
+    except Exception:
+        return str(created_at)[:7]
+
+
+def _user_timezone(cursor: sqlite3.Cursor, user_id: int) -> str:
+    """users.timezone (None = DEFAULT_TIMEZONE), dibaca di transaksi penulis transactions"""
+    row = cursor.execute('SELECT timezone FROM users WHERE user_id = ?', (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+def local_timestamp(created_at: str, tz_name: str = None) -> str:
+    """
+    created_at UTC -> waktu lokal user dengan offset, misal '2024-01-05 14:00:00+07:00'.
+    Dipakai file export; importer membaca offset-nya sehingga export -> import tidak bergeser
+    """
+    try:
+        moment = datetime.fromisoformat(str(created_at)).replace(tzinfo=timezone.utc)
+        return moment.astimezone(get_timezone(tz_name)).isoformat(sep=' ')
+    except Exception:
+        return created_at
+
+
+def month_bounds(tz_name: str = None, now: datetime = None) -> Tuple[str, str, str]:
+    """
+    Bulan berjalan di timezone user.
+    Returns (bulan 'YYYY-MM', awal, awal bulan depan) - awal & akhir adalah range
+    setengah-terbuka dalam UTC dengan format kolom created_at, sehingga bisa memakai index.
+    Hitung sekali per request lalu teruskan ke query yang butuh.
+    """
+    tz = get_timezone(tz_name)
+    now = (now or datetime.now(timezone.utc)).astimezone(tz)
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start.replace(tzinfo=None) + timedelta(days=32)).replace(day=1, tzinfo=tz)
+    
+    def to_utc(moment: datetime) -> str:
+        return moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    
+    return start.strftime('%Y-%m'), to_utc(start), to_utc(end)
+
 
 class DBHelper:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, slow_query_log: SlowQueryLog = None, initialize: bool = True):
+        """initialize=False: database baru dibuka saat init_db() dipanggil (modul bot tetap aman di-import)"""
         self.db_path = db_path
-        self.init_db()
+        # Opsional: koneksi memakai TimedConnection dan statement lambat dicatat di sini
+        self.slow_query_log = slow_query_log
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        if initialize:
+            self.init_db()
+    
+    def get_connection(self) -> sqlite3.Connection:
+        """
+        Mengambil koneksi persisten milik thread ini.
+        Koneksi dibuat sekali per thread (autocommit) lalu dipakai ulang,
+        sehingga page cache dan statement cache tetap hangat.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=DB_BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE,
+                factory=TimedConnection if self.slow_query_log else sqlite3.Connection
+            )
+            if self.slow_query_log:
+                conn.slow_query_log = self.slow_query_log
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager untuk beberapa statement dalam satu transaksi.
+        BEGIN IMMEDIATE langsung mengambil write lock; pembaca tetap jalan (WAL).
+        """
+        conn = self.get_connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            # Termasuk COMMIT yang gagal (misal SQLITE_BUSY): koneksi thread ini tidak boleh
+            # tertinggal di dalam transaksi terbuka
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
     
-    def get_connection(self):
-        """Membuat koneksi ke database"""
-        return sqlite3.connect(self.db_path)
+    def close(self):
+        """Menutup semua koneksi yang pernah dibuat"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
     
     def init_db(self):
         """Inisialisasi tabel database"""
         try:
             conn = self.get_connection()
+            # WAL: pembaca tidak pernah diblokir oleh penulis
+            conn.execute('PRAGMA journal_mode = WAL')
             cursor = conn.cursor()
             
             # Tabel Users - Enhanced with subscription
@@ -39,14 +198,14 @@ class DBHelper:
                 )
             ''')
             
-            # Tabel Transactions - Enhanced
+            # Tabel Transactions - Enhanced (amount: integer satuan terkecil)
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS transactions (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER,
                     type TEXT,
                     category TEXT,
-                    amount REAL,
+                    amount INTEGER,
                     description TEXT,
                     mode TEXT DEFAULT 'personal',
                     tags TEXT,
@@ -63,7 +222,7 @@ class DBHelper:
                     user_id INTEGER,
                     type TEXT,
                     person_name TEXT,
-                    amount REAL,
+                    amount INTEGER,
                     description TEXT,
                     status TEXT DEFAULT 'unpaid',
                     due_date DATE,
@@ -79,7 +238,7 @@ class DBHelper:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER,
                     category TEXT,
-                    amount REAL,
+                    amount INTEGER,
                     period TEXT DEFAULT 'monthly',
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users(user_id)
@@ -92,7 +251,7 @@ class DBHelper:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER,
                     tier TEXT,
-                    amount REAL,
+                    amount INTEGER,
                     payment_method TEXT,
                     payment_proof TEXT,
                     status TEXT DEFAULT 'pending',
@@ -102,9 +261,15 @@ class DBHelper:
                 )
             ''')
             
-            conn.commit()
-            conn.close()
-            logger.info("Database initialized successfully")
+            # Upgrade skema database lama secara in-place
+            version = run_migrations(conn)
+            check_currency_decimals(conn)
+            
+            logger.info(f"Database initialized successfully (schema v{version})")
+        except SchemaConfigError as e:
+            # Menolak start daripada membaca semua nominal dengan skala yang salah
+            logger.error(f"❌ {e}")
+            raise
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
     
@@ -113,12 +278,18 @@ class DBHelper:
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
+            # Upsert (bukan INSERT OR REPLACE) agar subscription & timezone tidak ter-reset.
+            # User yang kembali memakai bot tidak lagi dianggap memblokir bot
             cursor.execute('''
-                INSERT OR REPLACE INTO users (user_id, username, first_name, last_name, last_active)
+                INSERT INTO users (user_id, username, first_name, last_name, last_active)
                 VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    last_active = excluded.last_active,
+                    is_blocked = 0
             ''', (user_id, username, first_name, last_name, datetime.now()))
-            conn.commit()
-            conn.close()
         except Exception as e:
             logger.error(f"Error adding user: {e}")
     
@@ -129,82 +300,174 @@ class DBHelper:
             cursor = conn.cursor()
             cursor.execute('UPDATE users SET last_active = ? WHERE user_id = ?', 
                          (datetime.now(), user_id))
-            conn.commit()
-            conn.close()
         except Exception as e:
             logger.error(f"Error updating last active: {e}")
     
-    def add_transaction(self, user_id: int, trans_type: str, category: str, 
-                       amount: float, description: str, mode: str = 'personal'):
-        """Menambahkan transaksi baru"""
+    def update_last_active_many(self, updates: List[Tuple[datetime, int]]) -> bool:
+        """Update last_active banyak user sekaligus (satu transaksi, satu commit)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO transactions (user_id, type, category, amount, description, mode)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_id, trans_type, category, amount, description, mode))
-            conn.commit()
-            conn.close()
+            with self.transaction() as conn:
+                conn.executemany('UPDATE users SET last_active = ? WHERE user_id = ?', updates)
             return True
+        except Exception as e:
+            logger.error(f"Error updating last active: {e}")
+            return False
+    
+    def add_transaction(self, user_id: int, trans_type: str, category: str, 
+                       amount: int, description: str, mode: str = 'personal',
+                       max_transactions: int = None):
+        """
+        Menambahkan transaksi baru.
+        Jika max_transactions diisi, limit dicek di statement INSERT yang sama (atomik,
+        tidak bisa ditembus conversation paralel); raises TransactionLimitError jika penuh
+        """
+        try:
+            created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            # Timezone dibaca di transaksi yang sama agar tidak balapan dengan set_user_timezone
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                month = local_month(created_at, _user_timezone(cursor, user_id))
+                if max_transactions is None:
+                    cursor.execute('''
+                        INSERT INTO transactions (user_id, type, category, amount, description, mode,
+                                                  created_at, local_month)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (user_id, trans_type, category, amount, description, mode, created_at, month))
+                    return True
+                
+                cursor.execute('''
+                    INSERT INTO transactions (user_id, type, category, amount, description, mode,
+                                              created_at, local_month)
+                    SELECT ?, ?, ?, ?, ?, ?, ?, ?
+                    WHERE COALESCE((SELECT transaction_count FROM users WHERE user_id = ?), 0) < ?
+                ''', (user_id, trans_type, category, amount, description, mode, created_at, month,
+                      user_id, max_transactions))
+                if cursor.rowcount == 0:
+                    raise TransactionLimitError()
+                return True
+        except TransactionLimitError:
+            raise
         except Exception as e:
             logger.error(f"Error adding transaction: {e}")
             return False
     
+    def import_transactions(self, user_id: int, mode: str, rows: List[Tuple],
+                            max_transactions: int = None) -> Tuple[int, int]:
+        """
+        Insert massal hasil importer.parse_transactions dalam satu transaksi (executemany).
+        rows: (type, category, amount, description, created_at, import_fingerprint).
+        Baris dengan fingerprint yang sudah pernah di-import dilewati (INSERT OR IGNORE).
+        Raises TransactionLimitError (seluruh import dibatalkan) jika melewati max_transactions.
+        Returns (jumlah baris masuk, jumlah duplikat), None jika gagal
+        """
+        try:
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                tz_name = _user_timezone(cursor, user_id)
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO transactions
+                        (user_id, type, category, amount, description, created_at, local_month, mode,
+                         import_fingerprint)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', ((user_id, trans_type, category, amount, description, created_at,
+                       local_month(created_at, tz_name), mode, fingerprint)
+                      for trans_type, category, amount, description, created_at, fingerprint in rows))
+                inserted = cursor.rowcount
+                
+                if max_transactions is not None and inserted:
+                    # transaction_count sudah diperbarui trigger, dicek sebelum COMMIT.
+                    # Tanpa baris users trigger tidak menghitung: dianggap 0 + baris yang baru masuk
+                    cursor.execute('''
+                        SELECT COALESCE((SELECT transaction_count FROM users WHERE user_id = ?), ?)
+                    ''', (user_id, inserted))
+                    if cursor.fetchone()[0] > max_transactions:
+                        raise TransactionLimitError()
+            
+            return inserted, len(rows) - inserted
+        except TransactionLimitError:
+            raise
+        except Exception as e:
+            logger.error(f"Error importing transactions: {e}")
+            return None
+    
     def get_balance(self, user_id: int, mode: str = 'personal') -> Dict:
-        """Mendapatkan saldo dan statistik"""
+        """Mendapatkan saldo dan statistik (O(1) dari tabel ringkasan user_balances)"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
-            
-            # Total pemasukan
             cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE user_id = ? AND type = 'income' AND mode = ?
-            ''', (user_id, mode))
-            total_income = cursor.fetchone()[0]
-            
-            # Total pengeluaran
-            cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE user_id = ? AND type = 'expense' AND mode = ?
+                SELECT income, expense, tx_count FROM user_balances
+                WHERE user_id = ? AND mode = ?
             ''', (user_id, mode))
-            total_expense = cursor.fetchone()[0]
-            
-            conn.close()
+            row = cursor.fetchone()
+            total_income, total_expense, count = row if row else (0, 0, 0)
             
             return {
                 'income': total_income,
                 'expense': total_expense,
-                'balance': total_income - total_expense
+                'balance': total_income - total_expense,
+                'count': count
             }
         except Exception as e:
             logger.error(f"Error getting balance: {e}")
-            return {'income': 0, 'expense': 0, 'balance': 0}
+            return {'income': 0, 'expense': 0, 'balance': 0, 'count': 0}
     
-    def get_monthly_balance(self, user_id: int, mode: str = 'personal') -> Dict:
-        """Mendapatkan saldo bulan ini"""
+    def get_dashboard_summary(self, user_id: int, mode: str = 'personal', month: str = None) -> Dict:
+        """
+        Mendapatkan saldo total dan saldo bulan ini dalam satu query.
+        Total diambil dari user_balances, bulan ini dari beberapa baris monthly_rollups.
+        month: 'YYYY-MM' di timezone user (lihat month_bounds)
+        """
+        empty = {'income': 0, 'expense': 0, 'balance': 0}
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
-            
-            current_month = datetime.now().strftime('%Y-%m')
+            month = month or month_bounds()[0]
             
             cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE user_id = ? AND type = 'income' AND mode = ?
-                AND strftime('%Y-%m', created_at) = ?
-            ''', (user_id, mode, current_month))
-            monthly_income = cursor.fetchone()[0]
+                SELECT
+                    COALESCE((SELECT income FROM user_balances
+                              WHERE user_id = ?1 AND mode = ?2), 0),
+                    COALESCE((SELECT expense FROM user_balances
+                              WHERE user_id = ?1 AND mode = ?2), 0),
+                    COALESCE(SUM(CASE WHEN type = 'income' THEN total END), 0),
+                    COALESCE(SUM(CASE WHEN type = 'expense' THEN total END), 0)
+                FROM monthly_rollups
+                WHERE user_id = ?1 AND mode = ?2 AND month = ?3
+            ''', (user_id, mode, month))
+            total_income, total_expense, monthly_income, monthly_expense = cursor.fetchone()
             
-            cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE user_id = ? AND type = 'expense' AND mode = ?
-                AND strftime('%Y-%m', created_at) = ?
-            ''', (user_id, mode, current_month))
-            monthly_expense = cursor.fetchone()[0]
+            return {
+                'total': {
+                    'income': total_income,
+                    'expense': total_expense,
+                    'balance': total_income - total_expense
+                },
+                'monthly': {
+                    'income': monthly_income,
+                    'expense': monthly_expense,
+                    'balance': monthly_income - monthly_expense
+                }
+            }
+        except Exception as e:
+            logger.error(f"Error getting dashboard summary: {e}")
+            return {'total': dict(empty), 'monthly': dict(empty)}
+    
+    def get_monthly_balance(self, user_id: int, mode: str = 'personal', month: str = None) -> Dict:
+        """Mendapatkan saldo bulan ini dari monthly_rollups (month: 'YYYY-MM' di timezone user)"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            month = month or month_bounds()[0]
             
-            conn.close()
+            cursor.execute('''
+                SELECT
+                    COALESCE(SUM(CASE WHEN type = 'income' THEN total END), 0),
+                    COALESCE(SUM(CASE WHEN type = 'expense' THEN total END), 0)
+                FROM monthly_rollups
+                WHERE user_id = ? AND mode = ? AND month = ?
+            ''', (user_id, mode, month))
+            monthly_income, monthly_expense = cursor.fetchone()
             
             return {
                 'income': monthly_income,
@@ -216,25 +479,74 @@ class DBHelper:
             return {'income': 0, 'expense': 0, 'balance': 0}
     
     def get_transactions_by_category(self, user_id: int, trans_type: str, 
-                                    mode: str = 'personal') -> List[Tuple]:
-        """Mendapatkan transaksi berdasarkan kategori untuk chart"""
+                                    mode: str = 'personal', month: str = None) -> List[Tuple]:
+        """
+        Mendapatkan total per kategori untuk chart dari monthly_rollups.
+        month: 'YYYY-MM' untuk satu bulan, None untuk semua bulan
+        """
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT category, SUM(amount) as total
-                FROM transactions
-                WHERE user_id = ? AND type = ? AND mode = ?
+                SELECT category, SUM(total) as total
+                FROM monthly_rollups
+                WHERE user_id = ? AND mode = ? AND type = ?
+                AND (?4 IS NULL OR month = ?4)
                 GROUP BY category
                 ORDER BY total DESC
-            ''', (user_id, trans_type, mode))
+            ''', (user_id, mode, trans_type, month))
             result = cursor.fetchall()
-            conn.close()
             return result
         except Exception as e:
             logger.error(f"Error getting transactions by category: {e}")
             return []
     
+    def get_recent_transactions(self, user_id: int, mode: str = 'personal', limit: int = 10,
+                                before_id: int = None, after_id: int = None) -> List[Dict]:
+        """
+        Keyset pagination riwayat transaksi, terbaru lebih dulu.
+        before_id: halaman lebih lama (id < before_id)
+        after_id: halaman lebih baru (id > after_id)
+        Biaya per halaman tetap, berapa pun jumlah transaksi user.
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            if after_id is not None:
+                cursor.execute('''
+                    SELECT id, type, category, amount, description, created_at
+                    FROM transactions
+                    WHERE user_id = ? AND mode = ? AND id > ?
+                    ORDER BY id ASC
+                    LIMIT ?
+                ''', (user_id, mode, after_id, limit))
+                rows = cursor.fetchall()[::-1]
+            else:
+                cursor.execute('''
+                    SELECT id, type, category, amount, description, created_at
+                    FROM transactions
+                    WHERE user_id = ? AND mode = ? AND id < ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                ''', (user_id, mode, before_id if before_id is not None else MAX_ROWID, limit))
+                rows = cursor.fetchall()
+            
+            return [
+                {
+                    'id': row[0],
+                    'type': row[1],
+                    'category': row[2],
+                    'amount': row[3],
+                    'description': row[4],
+                    'date': row[5]
+                }
+                for row in rows
+            ]
+        except Exception as e:
+            logger.error(f"Error getting recent transactions: {e}")
+            return []
+    
     def get_all_transactions(self, user_id: int, mode: str = 'personal') -> List[Dict]:
         """Mendapatkan semua transaksi user untuk export"""
         try:
@@ -247,20 +559,126 @@ class DBHelper:
                 ORDER BY created_at DESC
             ''', (user_id, mode))
             
-            columns = ['Tipe', 'Kategori', 'Nominal', 'Deskripsi', 'Tanggal']
             transactions = []
             for row in cursor.fetchall():
-                transactions.append(dict(zip(columns, row)))
+                transactions.append(dict(zip(TRANSACTION_COLUMNS, row)))
             
-            conn.close()
             return transactions
         except Exception as e:
             logger.error(f"Error getting all transactions: {e}")
             return []
     
+    def iter_transactions(self, user_id: int, mode: str = 'personal',
+                          chunk_size: int = 500, tz_name: str = None) -> Iterator[Tuple]:
+        """
+        Generator transaksi user untuk export streaming (kolom: TRANSACTION_COLUMNS).
+        Nominal dikonversi ke satuan utama (Decimal) dan tanggal ke waktu lokal tz_name
+        beserta offset-nya (lihat local_timestamp) agar file export mudah dibaca.
+        Membaca cursor per chunk sehingga memori tetap konstan.
+        Harus dikonsumsi seluruhnya di thread yang sama, misalnya lewat AsyncDBHelper.run()
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT type, category, amount, description, created_at
+            FROM transactions
+            WHERE user_id = ? AND mode = ?
+            ORDER BY created_at DESC
+        ''', (user_id, mode))
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for trans_type, category, amount, description, created_at in rows:
+                    yield (trans_type, category, from_minor_units(amount), description,
+                           local_timestamp(created_at, tz_name))
+        finally:
+            cursor.close()
+    
+    def verify_user_balances(self) -> List[Dict]:
+        """
+        Membandingkan user_balances dengan hasil hitung ulang dari ledger transactions.
+        Returns daftar baris yang tidak cocok (kosong berarti konsisten)
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                WITH ledger AS (
+                    SELECT user_id, mode,
+                           COALESCE(SUM(CASE WHEN type = 'income' THEN amount END), 0) AS income,
+                           COALESCE(SUM(CASE WHEN type = 'expense' THEN amount END), 0) AS expense,
+                           COUNT(*) AS tx_count
+                    FROM transactions
+                    GROUP BY user_id, mode
+                ),
+                keys AS (
+                    SELECT user_id, mode FROM ledger
+                    UNION
+                    SELECT user_id, mode FROM user_balances
+                )
+                SELECT k.user_id, k.mode,
+                       COALESCE(b.income, 0), COALESCE(b.expense, 0), COALESCE(b.tx_count, 0),
+                       COALESCE(l.income, 0), COALESCE(l.expense, 0), COALESCE(l.tx_count, 0)
+                FROM keys k
+                LEFT JOIN user_balances b ON b.user_id = k.user_id AND b.mode = k.mode
+                LEFT JOIN ledger l ON l.user_id = k.user_id AND l.mode = k.mode
+            ''')
+            
+            mismatches = []
+            for row in cursor.fetchall():
+                # Nominal integer: dibandingkan persis, tanpa toleransi pembulatan float
+                stored, actual = row[2:5], row[5:8]
+                if stored != actual:
+                    mismatches.append({
+                        'user_id': row[0],
+                        'mode': row[1],
+                        'stored': stored,
+                        'actual': actual
+                    })
+            return mismatches
+        except Exception as e:
+            logger.error(f"Error verifying user balances: {e}")
+            return []
+    
+    def rebuild_user_balances(self) -> bool:
+        """Menghitung ulang seluruh user_balances dari ledger transactions"""
+        try:
+            with self.transaction() as conn:
+                for statement in REBUILD_USER_BALANCES:
+                    conn.execute(statement)
+            return True
+        except Exception as e:
+            logger.error(f"Error rebuilding user balances: {e}")
+            return False
+    
+    def rebuild_transaction_counts(self) -> bool:
+        """Menghitung ulang users.transaction_count dari ledger transactions"""
+        try:
+            with self.transaction() as conn:
+                for statement in REBUILD_USER_TRANSACTION_COUNTS:
+                    conn.execute(statement)
+            return True
+        except Exception as e:
+            logger.error(f"Error rebuilding transaction counts: {e}")
+            return False
+    
+    def rebuild_monthly_rollups(self, user_id: int = None) -> bool:
+        """Menghitung ulang monthly_rollups dari ledger (satu user atau semua user)"""
+        try:
+            with self.transaction() as conn:
+                refresh_local_months(conn, user_id)
+                for statement in REBUILD_MONTHLY_ROLLUPS:
+                    conn.execute(statement, (user_id,))
+            return True
+        except Exception as e:
+            logger.error(f"Error rebuilding monthly rollups: {e}")
+            return False
+    
     # === DEBT MANAGEMENT ===
     def add_debt(self, user_id: int, debt_type: str, person_name: str, 
-                 amount: float, description: str):
+                 amount: int, description: str):
         """Menambahkan hutang/piutang"""
         try:
             conn = self.get_connection()
@@ -269,8 +687,6 @@ class DBHelper:
                 INSERT INTO debts (user_id, type, person_name, amount, description)
                 VALUES (?, ?, ?, ?, ?)
             ''', (user_id, debt_type, person_name, amount, description))
-            conn.commit()
-            conn.close()
             return True
         except Exception as e:
             logger.error(f"Error adding debt: {e}")
@@ -299,13 +715,11 @@ class DBHelper:
                     'date': row[5]
                 })
             
-            conn.close()
             return debts
         except Exception as e:
             logger.error(f"Error getting debts: {e}")
             return []
     
-    
     # === SUBSCRIPTION FUNCTIONS ===
     def get_user_subscription(self, user_id: int) -> Dict:
         """Mendapatkan info subscription user"""
@@ -313,31 +727,44 @@ class DBHelper:
             conn = self.get_connection()
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT subscription_tier, subscription_start, subscription_end
+                SELECT subscription_tier, subscription_start, subscription_end, timezone
                 FROM users WHERE user_id = ?
             ''', (user_id,))
             result = cursor.fetchone()
-            conn.close()
             
             if result:
-                from datetime import datetime
                 tier = result[0] or 'free'
                 is_active = True
+                expires_at = None
                 
                 if result[2]:  # subscription_end exists
                     end_date = datetime.strptime(result[2], '%Y-%m-%d')
+                    expires_at = end_date.timestamp()
                     is_active = datetime.now() < end_date
                 
                 return {
                     'tier': tier,
                     'start_date': result[1],
                     'end_date': result[2],
-                    'is_active': is_active
+                    'is_active': is_active,
+                    'expires_at': expires_at,  # Unix timestamp, dipakai SubscriptionCache
+                    'timezone': result[3] or DEFAULT_TIMEZONE
                 }
-            return {'tier': 'free', 'is_active': True}
+            return {'tier': 'free', 'is_active': True, 'expires_at': None, 'timezone': DEFAULT_TIMEZONE}
         except Exception as e:
             logger.error(f"Error getting subscription: {e}")
-            return {'tier': 'free', 'is_active': True}
+            return {'tier': 'free', 'is_active': True, 'timezone': DEFAULT_TIMEZONE}
+    
+    def set_user_timezone(self, user_id: int, tz_name: str) -> bool:
+        """Update timezone user lalu hitung ulang local_month transaksinya (trigger memindahkan rollup)"""
+        try:
+            with self.transaction() as conn:
+                conn.execute('UPDATE users SET timezone = ? WHERE user_id = ?', (tz_name, user_id))
+                refresh_local_months(conn, user_id)
+            return True
+        except Exception as e:
+            logger.error(f"Error setting timezone: {e}")
+            return False
     
     def update_subscription(self, user_id: int, tier: str, days: int = 30):
         """Update subscription user"""
@@ -355,26 +782,195 @@ class DBHelper:
                 WHERE user_id = ?
             ''', (tier, start_date, end_date, user_id))
             
-            conn.commit()
-            conn.close()
             return True
         except Exception as e:
             logger.error(f"Error updating subscription: {e}")
             return False
     
     def get_transaction_count(self, user_id: int) -> int:
-        """Mendapatkan jumlah transaksi user (untuk limit check)"""
+        """Mendapatkan jumlah transaksi user (untuk limit check), dari counter users.transaction_count"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM transactions WHERE user_id = ?', (user_id,))
-            count = cursor.fetchone()[0]
-            conn.close()
-            return count
+            cursor.execute('SELECT transaction_count FROM users WHERE user_id = ?', (user_id,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
         except Exception as e:
             logger.error(f"Error getting transaction count: {e}")
             return 0
     
+    # === TELEGRAM FILE CACHE ===
+    def get_telegram_file_id(self, content_hash: str) -> str:
+        """Mendapatkan file_id Telegram untuk konten yang pernah di-upload"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT file_id FROM telegram_files WHERE content_hash = ?', (content_hash,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error getting telegram file id: {e}")
+            return None
+    
+    def save_telegram_file_id(self, content_hash: str, file_id: str, kind: str, max_entries: int = None):
+        """
+        Menyimpan file_id Telegram hasil upload.
+        max_entries: hanya N file_id yang terakhir disimpan dipertahankan (REPLACE = rowid baru)
+        """
+        try:
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO telegram_files (content_hash, file_id, kind)
+                    VALUES (?, ?, ?)
+                ''', (content_hash, file_id, kind))
+                if max_entries is not None:
+                    cursor.execute('''
+                        DELETE FROM telegram_files WHERE rowid IN (
+                            SELECT rowid FROM telegram_files ORDER BY rowid DESC LIMIT -1 OFFSET ?
+                        )
+                    ''', (max_entries,))
+        except Exception as e:
+            logger.error(f"Error saving telegram file id: {e}")
+    
+    def delete_telegram_file_id(self, content_hash: str):
+        """Menghapus file_id yang sudah tidak valid"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM telegram_files WHERE content_hash = ?', (content_hash,))
+        except Exception as e:
+            logger.error(f"Error deleting telegram file id: {e}")
+    
+    # === BROADCAST ===
+    def create_broadcast_job(self, admin_chat_id: int, text: str) -> int:
+        """
+        Membuat job broadcast beserta daftar penerimanya (semua user yang tidak memblokir bot).
+        Returns job ID, None jika gagal
+        """
+        try:
+            with self.transaction() as conn:
+                cursor = conn.execute(
+                    'INSERT INTO broadcast_jobs (admin_chat_id, text) VALUES (?, ?)',
+                    (admin_chat_id, text)
+                )
+                job_id = cursor.lastrowid
+                conn.execute('''
+                    INSERT INTO broadcast_recipients (job_id, user_id)
+                    SELECT ?, user_id FROM users WHERE is_blocked = 0
+                ''', (job_id,))
+            return job_id
+        except Exception as e:
+            logger.error(f"Error creating broadcast job: {e}")
+            return None
+    
+    def set_broadcast_progress_message(self, job_id: int, message_id: int):
+        """Menyimpan ID pesan progress admin agar bisa terus di-edit setelah restart"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('UPDATE broadcast_jobs SET progress_message_id = ? WHERE id = ?',
+                           (message_id, job_id))
+        except Exception as e:
+            logger.error(f"Error saving broadcast progress message: {e}")
+    
+    def get_pending_broadcast_recipients(self, job_id: int, limit: int) -> List[int]:
+        """Mendapatkan user ID berikutnya yang belum dikirimi pesan broadcast"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id FROM broadcast_recipients
+                WHERE job_id = ? AND status = 'pending'
+                ORDER BY user_id
+                LIMIT ?
+            ''', (job_id, limit))
+            return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting broadcast recipients: {e}")
+            return []
+    
+    def save_broadcast_results(self, job_id: int, results: List[Tuple[int, str, str]]) -> bool:
+        """
+        Menyimpan hasil pengiriman (user_id, status, error) dalam satu transaksi.
+        User dengan status 'blocked' ditandai agar dilewati broadcast berikutnya
+        """
+        try:
+            with self.transaction() as conn:
+                conn.executemany('''
+                    UPDATE broadcast_recipients SET status = ?, error = ?
+                    WHERE job_id = ? AND user_id = ?
+                ''', [(status, error, job_id, user_id) for user_id, status, error in results])
+                conn.executemany(
+                    'UPDATE users SET is_blocked = 1 WHERE user_id = ?',
+                    [(user_id,) for user_id, status, _ in results if status == 'blocked']
+                )
+            return True
+        except Exception as e:
+            logger.error(f"Error saving broadcast results: {e}")
+            return False
+    
+    def get_broadcast_job(self, job_id: int) -> Dict:
+        """Mendapatkan info job broadcast beserta jumlah penerima per status"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, admin_chat_id, text, status, progress_message_id, created_at, error
+                FROM broadcast_jobs WHERE id = ?
+            ''', (job_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            cursor.execute('''
+                SELECT status, COUNT(*) FROM broadcast_recipients
+                WHERE job_id = ? GROUP BY status
+            ''', (job_id,))
+            counts = {'pending': 0, 'sent': 0, 'failed': 0, 'blocked': 0}
+            counts.update(dict(cursor.fetchall()))
+            
+            return {
+                'id': row[0],
+                'admin_chat_id': row[1],
+                'text': row[2],
+                'status': row[3],
+                'progress_message_id': row[4],
+                'created_at': row[5],
+                'error': row[6],
+                'total': sum(counts.values()),
+                **counts
+            }
+        except Exception as e:
+            logger.error(f"Error getting broadcast job: {e}")
+            return None
+    
+    def get_unfinished_broadcast_jobs(self) -> List[int]:
+        """
+        Mendapatkan ID job broadcast yang terputus sebelum selesai (restart / crash).
+        Job yang berhenti karena error berstatus 'failed' dan tidak dilanjutkan otomatis
+        """
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM broadcast_jobs WHERE status = 'running' ORDER BY id")
+            return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting unfinished broadcast jobs: {e}")
+            return []
+    
+    def finish_broadcast_job(self, job_id: int, status: str = 'done', error: str = None):
+        """Menandai job broadcast selesai ('done') atau berhenti karena error ('failed')"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE broadcast_jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, error, job_id))
+        except Exception as e:
+            logger.error(f"Error finishing broadcast job: {e}")
+    
     # === ADMIN FUNCTIONS ===
     def get_total_users(self) -> int:
         """Mendapatkan jumlah total user"""
@@ -383,7 +979,6 @@ class DBHelper:
             cursor = conn.cursor()
             cursor.execute('SELECT COUNT(*) FROM users')
             count = cursor.fetchone()[0]
-            conn.close()
             return count
         except Exception as e:
             logger.error(f"Error getting total users: {e}")
@@ -396,7 +991,6 @@ class DBHelper:
             cursor = conn.cursor()
             cursor.execute('SELECT COUNT(*) FROM transactions')
             count = cursor.fetchone()[0]
-            conn.close()
             return count
         except Exception as e:
             logger.error(f"Error getting total transactions: {e}")
@@ -407,13 +1001,14 @@ class DBHelper:
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
-            today = datetime.now().strftime('%Y-%m-%d')
+            # Range setengah-terbuka agar bisa memakai index last_active
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            tomorrow = today + timedelta(days=1)
             cursor.execute('''
-                SELECT COUNT(*) FROM users 
-                WHERE DATE(last_active) = ?
-            ''', (today,))
+                SELECT COUNT(*) FROM users
+                WHERE last_active >= ? AND last_active < ?
+            ''', (today.strftime('%Y-%m-%d'), tomorrow.strftime('%Y-%m-%d')))
             count = cursor.fetchone()[0]
-            conn.close()
             return count
         except Exception as e:
             logger.error(f"Error getting active users today: {e}")
@@ -426,7 +1021,6 @@ class DBHelper:
             cursor = conn.cursor()
             cursor.execute('SELECT user_id FROM users')
             user_ids = [row[0] for row in cursor.fetchall()]
-            conn.close()
             return user_ids
         except Exception as e:
             logger.error(f"Error getting all user IDs: {e}")
@@ -454,8 +1048,137 @@ class DBHelper:
                     'Last Active': row[5]
                 })
             
-            conn.close()
             return users
         except Exception as e:
             logger.error(f"Error getting all users info: {e}")
             return []
+
+
+class SubscriptionCache:
+    """
+    Cache LRU + TTL untuk hasil get_user_subscription.
+    Tanggal berakhir disimpan sebagai timestamp (sudah di-parse), is_active dihitung
+    ulang setiap dibaca sehingga langganan berakhir tepat waktu tanpa query database.
+    TTL hanya jaga-jaga untuk perubahan dari luar bot (misalnya script admin).
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (waktu kadaluarsa cache, subscription)
+    
+    def get(self, user_id: int) -> Dict:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        
+        cached_until, subscription = entry
+        if time.monotonic() >= cached_until:
+            del self._entries[user_id]
+            return None
+        
+        self._entries.move_to_end(user_id)
+        result = dict(subscription)
+        if result['expires_at'] is not None:
+            result['is_active'] = time.time() < result['expires_at']
+        return result
+    
+    def put(self, user_id: int, subscription: Dict):
+        # Hasil fallback karena error database tidak punya 'expires_at', jangan di-cache
+        if 'expires_at' not in subscription:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, dict(subscription))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+
+class AsyncDBHelper:
+    """
+    Facade async untuk DBHelper.
+    Semua query sqlite3 dijalankan di thread pool khusus database sehingga
+    query yang lambat (misalnya export) tidak membekukan event loop bot.
+    """
+    
+    def __init__(self, helper: DBHelper, max_workers: int = 4,
+                 subscription_cache: SubscriptionCache = None):
+        self.helper = helper
+        self.db_path = helper.db_path
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+        # user_id -> waktu aktivitas terakhir yang belum ditulis ke database
+        self._last_active: Dict[int, datetime] = {}
+        self.subscription_cache = subscription_cache or SubscriptionCache()
+    
+    async def run(self, func, *args, **kwargs):
+        """Menjalankan fungsi blocking apa pun di thread pool database (durasi dicatat di metrics)"""
+        loop = asyncio.get_running_loop()
+        with track(getattr(func, '__name__', 'unknown'), DB_DURATION, DB_ERRORS, DB_IN_PROGRESS):
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+    
+    def __getattr__(self, name):
+        attr = getattr(self.helper, name)
+        if not callable(attr):
+            return attr
+        
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+        
+        return wrapper
+    
+    async def get_user_subscription(self, user_id: int) -> Dict:
+        """Subscription user dari cache; query database hanya saat belum ada/kadaluarsa"""
+        subscription = self.subscription_cache.get(user_id)
+        if subscription is None:
+            subscription = await self.run(self.helper.get_user_subscription, user_id)
+            self.subscription_cache.put(user_id, subscription)
+        return subscription
+    
+    async def update_subscription(self, user_id: int, tier: str, days: int = 30) -> bool:
+        result = await self.run(self.helper.update_subscription, user_id, tier, days)
+        self.subscription_cache.invalidate(user_id)
+        return result
+    
+    async def set_user_timezone(self, user_id: int, tz_name: str) -> bool:
+        # Timezone ikut tersimpan di hasil get_user_subscription
+        result = await self.run(self.helper.set_user_timezone, user_id, tz_name)
+        self.subscription_cache.invalidate(user_id)
+        return result
+    
+    def update_last_active(self, user_id: int):
+        """
+        Mencatat aktivitas user di memori saja (bukan coroutine, tanpa query).
+        Beberapa klik dari user yang sama sebelum flush cukup ditulis sekali
+        """
+        self._last_active[user_id] = datetime.now()
+    
+    async def flush_last_active(self) -> int:
+        """Menulis aktivitas yang tertunda dengan satu executemany. Returns jumlah user"""
+        if not self._last_active:
+            return 0
+        
+        pending, self._last_active = self._last_active, {}
+        updates = [(active_at, user_id) for user_id, active_at in pending.items()]
+        if not await self.run(self.helper.update_last_active_many, updates):
+            # Gagal: kembalikan ke buffer kecuali sudah ada aktivitas yang lebih baru
+            for user_id, active_at in pending.items():
+                self._last_active.setdefault(user_id, active_at)
+            return 0
+        return len(updates)
+    
+    async def run_last_active_flusher(self, interval: float):
+        """Loop background: flush aktivitas user setiap `interval` detik"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush_last_active()
+            except Exception as e:
+                logger.error(f"Error flushing last active: {e}")
+    
+    def shutdown(self):
+        """Menunggu query yang sedang berjalan lalu menutup thread pool dan koneksi"""
+        self.executor.shutdown(wait=True)
+        self.helper.close()
@@ -0,0 +1,103 @@
+"""
+Cache file_id Telegram untuk chart dan file export
+File dengan konten identik dikirim ulang memakai file_id, tanpa upload ulang
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import IO, Union
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from utils import upload_content
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(kind: str, content: Union[bytes, IO[bytes]], filename: str = '') -> str:
+    """
+    Hash SHA-256 dari jenis, nama file dan isi file.
+    File object dibaca per chunk lalu dikembalikan ke posisi awal.
+    """
+    digest = hashlib.sha256(f"{kind}:{filename}:".encode())
+    if isinstance(content, bytes):
+        digest.update(content)
+    else:
+        for chunk in iter(lambda: content.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        content.seek(0)
+    return digest.hexdigest()
+
+
+class TelegramFileCache:
+    """
+    Mengingat file_id yang dikembalikan Telegram per hash konten.
+    Disimpan di memori (LRU) dan di tabel telegram_files agar tetap berlaku setelah restart;
+    keduanya dibatasi max_entries.
+    """
+    
+    def __init__(self, db, max_entries: int = 5000):
+        self.db = db  # AsyncDBHelper
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+    
+    async def _lookup(self, key: str) -> str:
+        file_id = self._memory.get(key)
+        if file_id is not None:
+            self._memory.move_to_end(key)
+            return file_id
+        
+        file_id = await self.db.get_telegram_file_id(key)
+        if file_id is not None:
+            self._remember(key, file_id)
+        return file_id
+    
+    def _remember(self, key: str, file_id: str):
+        self._memory[key] = file_id
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    async def _forget(self, key: str):
+        self._memory.pop(key, None)
+        await self.db.delete_telegram_file_id(key)
+    
+    async def _send(self, send, kind: str, content, filename: str = '', **kwargs) -> Message:
+        key = content_hash(kind, content, filename)
+        
+        file_id = await self._lookup(key)
+        if file_id is not None:
+            try:
+                return await send(file_id, **kwargs)
+            except BadRequest as e:
+                # file_id kadaluarsa/tidak valid - upload ulang
+                logger.warning(f"Cached file_id rejected, re-uploading: {e}")
+                await self._forget(key)
+        
+        if filename:
+            kwargs['filename'] = filename
+        message = await send(upload_content(content), **kwargs)
+        
+        attachment = message.photo[-1] if kind == 'photo' and message.photo else message.document
+        if attachment is not None:
+            self._remember(key, attachment.file_id)
+            await self.db.save_telegram_file_id(key, attachment.file_id, kind, self.max_entries)
+        return message
+    
+    async def send_photo(self, bot, chat_id: int, photo: bytes, **kwargs) -> Message:
+        """send_photo yang memakai file_id jika gambar identik pernah dikirim"""
+        async def send(media, **send_kwargs):
+            return await bot.send_photo(chat_id=chat_id, photo=media, **send_kwargs)
+        
+        return await self._send(send, 'photo', photo, **kwargs)
+    
+    async def send_document(self, bot, chat_id: int, document: Union[bytes, IO[bytes]],
+                            filename: str, **kwargs) -> Message:
+        """send_document yang memakai file_id jika file identik pernah dikirim"""
+        async def send(media, **send_kwargs):
+            return await bot.send_document(chat_id=chat_id, document=media, **send_kwargs)
+        
+        return await self._send(send, 'document', document, filename, **kwargs)
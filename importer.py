@@ -0,0 +1,247 @@
+"""
+Import transaksi massal dari file CSV / Excel (XLSX) yang di-upload user
+File dibaca baris per baris (streaming), hasilnya siap dimasukkan dengan executemany
+"""
+import csv
+import hashlib
+import io
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from typing import IO, Dict, Iterator, List, Sequence, Tuple
+
+from config import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+from db_helper import get_timezone
+from utils import MAX_AMOUNT, from_minor_units, to_minor_units, validate_amount
+
+# Nama kolom yang dikenali (huruf kecil) -> field internal.
+# Header file export bot (TRANSACTION_COLUMNS) juga dikenali
+IMPORT_COLUMN_ALIASES = {
+    'tipe': 'type', 'type': 'type', 'jenis': 'type',
+    'kategori': 'category', 'category': 'category',
+    'nominal': 'amount', 'amount': 'amount', 'jumlah': 'amount',
+    'deskripsi': 'description', 'description': 'description', 'keterangan': 'description',
+    'tanggal': 'date', 'date': 'date', 'waktu': 'date',
+}
+
+TYPE_ALIASES = {
+    'income': 'income', 'pemasukan': 'income', 'masuk': 'income', 'in': 'income',
+    'expense': 'expense', 'pengeluaran': 'expense', 'keluar': 'expense', 'out': 'expense',
+}
+
+# Format tanggal yang dicoba berurutan. Tanggal dengan offset (format file export bot,
+# '2024-01-05 14:00:00+07:00') dipakai apa adanya; tanpa offset dianggap waktu lokal user
+DATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S%z',
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+    '%d-%m-%Y', '%d.%m.%Y',
+)
+
+# Kategori terakhir di config adalah "Lainnya", dipakai jika kategori file tidak dikenali
+FALLBACK_CATEGORY = {'income': INCOME_CATEGORIES[-1], 'expense': EXPENSE_CATEGORIES[-1]}
+
+MAX_REPORTED_ERRORS = 10
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ImportFileError(Exception):
+    """File tidak bisa dibaca atau kolom wajib tidak ditemukan"""
+
+
+def _normalize(text) -> str:
+    """Huruf kecil tanpa emoji/tanda baca: '🍔 Makanan & Minuman' -> 'makanan minuman'"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', str(text or '').lower()).split())
+
+
+def _category_lookup(categories: List[str]) -> Dict[str, str]:
+    """Nama lengkap maupun tiap bagian ('Gaji/Salary' -> 'gaji', 'salary') dipetakan ke kategori bot"""
+    lookup = {}
+    for category in categories:
+        lookup.setdefault(_normalize(category), category)
+        for part in re.split(r'[/&]', category):
+            if _normalize(part):
+                lookup.setdefault(_normalize(part), category)
+    return lookup
+
+
+CATEGORY_LOOKUP = {
+    'income': _category_lookup(INCOME_CATEGORIES),
+    'expense': _category_lookup(EXPENSE_CATEGORIES),
+}
+
+
+def _file_digest(file: IO[bytes]) -> str:
+    """sha256 seluruh isi file, lalu posisi dikembalikan ke awal untuk dibaca reader"""
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _read_csv_rows(file: IO[bytes]) -> Iterator[Sequence]:
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', errors='replace', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        # Excel versi Indonesia biasanya memakai ';' sebagai pemisah
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        yield from csv.reader(text, dialect)
+    finally:
+        text.detach()
+
+
+def _read_xlsx_rows(file: IO[bytes]) -> Iterator[Sequence]:
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _parse_type(value) -> str:
+    return TYPE_ALIASES.get(_normalize(value))
+
+
+def _parse_amount(value) -> Tuple[bool, int, bool]:
+    """
+    Returns (is_valid, amount, is_negative) dengan amount integer satuan terkecil;
+    nominal negatif dianggap pengeluaran
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            amount = to_minor_units(abs(value))
+        except (ArithmeticError, ValueError):
+            return False, 0, False
+        return 0 < amount <= MAX_AMOUNT, amount, value < 0
+    
+    text = str(value or '').strip().replace('Rp', '').replace('rp', '').strip()
+    negative = text.startswith('-')
+    is_valid, amount = validate_amount(text.lstrip('-'))
+    return is_valid, amount, negative
+
+
+def _parse_date(value, tz) -> str:
+    """Tanggal lokal -> string UTC format CURRENT_TIMESTAMP SQLite, None jika tidak valid"""
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        text = str(value).strip()
+        for date_format in DATE_FORMATS:
+            try:
+                moment = datetime.strptime(text, date_format)
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=tz)
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def parse_transactions(file: IO[bytes], filename: str, mode: str, tz_name: str = None,
+                       max_rows: int = 20000) -> Dict:
+    """
+    Membaca file CSV/XLSX menjadi baris transaksi yang siap di-insert.
+    Returns dict:
+    - rows: list (type, category, amount, description, created_at, fingerprint)
+    - errors: list (nomor baris, alasan) untuk baris yang dilewati
+    Raises ImportFileError jika format file / header tidak dikenali atau baris terlalu banyak
+    """
+    lowered = (filename or '').lower()
+    if lowered.endswith('.csv'):
+        reader = _read_csv_rows(file)
+    elif lowered.endswith('.xlsx'):
+        reader = _read_xlsx_rows(file)
+    else:
+        raise ImportFileError("Format file harus .csv atau .xlsx")
+    
+    # Kunci baris tanpa tanggal: file yang sama di-upload ulang dikenali, file lain tidak
+    file_key = f"file:{_file_digest(file)}"
+    tz = get_timezone(tz_name)
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    
+    try:
+        header = next(reader, None)
+    except Exception as e:
+        raise ImportFileError(f"File tidak bisa dibaca: {e}")
+    if not header:
+        raise ImportFileError("File kosong")
+    
+    columns = {}
+    for index, name in enumerate(header):
+        field = IMPORT_COLUMN_ALIASES.get(_normalize(name))
+        if field and field not in columns:
+            columns[field] = index
+    if 'amount' not in columns:
+        raise ImportFileError("Kolom Nominal/Amount tidak ditemukan di baris pertama")
+    
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index] if index is not None and index < len(row) else None
+    
+    rows = []
+    errors = []
+    occurrences = Counter()
+    
+    for line_number, row in enumerate(reader, start=2):
+        if not row or all(value in (None, '') for value in row):
+            continue
+        if len(rows) + len(errors) >= max_rows:
+            raise ImportFileError(f"Maksimal {max_rows} baris per file")
+        
+        is_valid, amount, negative = _parse_amount(cell(row, 'amount'))
+        if not is_valid:
+            errors.append((line_number, "nominal tidak valid"))
+            continue
+        
+        # Tipe: kolom tipe -> kategori yang hanya ada di satu daftar -> tanda nominal
+        trans_type = _parse_type(cell(row, 'type'))
+        category_key = _normalize(cell(row, 'category'))
+        if trans_type is None:
+            in_income = category_key in CATEGORY_LOOKUP['income']
+            in_expense = category_key in CATEGORY_LOOKUP['expense']
+            if in_income != in_expense:
+                trans_type = 'income' if in_income else 'expense'
+            elif negative:
+                trans_type = 'expense'
+            else:
+                errors.append((line_number, "tipe tidak dikenali"))
+                continue
+        
+        category = CATEGORY_LOOKUP[trans_type].get(category_key, FALLBACK_CATEGORY[trans_type])
+        
+        raw_date = cell(row, 'date')
+        if raw_date in (None, '') or str(raw_date).strip() == '':
+            created_at = now
+            date_key = file_key
+        else:
+            created_at = _parse_date(raw_date, tz)
+            if created_at is None:
+                errors.append((line_number, "tanggal tidak valid"))
+                continue
+            date_key = created_at
+        
+        description = str(cell(row, 'description') or '-').strip() or '-'
+        
+        # Fingerprint konten + urutan kemunculan: baris kembar dalam satu file tetap
+        # masuk semua, tapi upload ulang file yang sama tidak menggandakan data.
+        # Baris tanpa tanggal memakai hash isi file (bukan waktu upload) agar upload ulang
+        # tetap dikenali, sedangkan baris sama persis dari file berbeda tetap masuk
+        content = f"{mode}|{trans_type}|{category}|{from_minor_units(amount):.2f}|{description}|{date_key}"
+        occurrences[content] += 1
+        fingerprint = hashlib.sha256(f"{content}|{occurrences[content]}".encode()).hexdigest()
+        
+        rows.append((trans_type, category, amount, description, created_at, fingerprint))
+    
+    return {'rows': rows, 'errors': errors}
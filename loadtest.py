@@ -0,0 +1,469 @@
+"""
+Load test end-to-end: Application yang sama dengan bot.main() + Bot API tiruan lokal (offline)
+
+    python loadtest.py                                        # 50 user, 20 update/detik, 30 detik
+    python loadtest.py --users 200 --rate 100 --duration 60 --transport webhook
+    python loadtest.py --prefill 20000 --mix dashboard=50,chart=30,export=20 --output loadtest.json
+
+Setiap user virtual menjalankan skenario berurutan (/start, buka dashboard, conversation tambah
+transaksi, chart, export); update dikirim dengan laju tetap ke user yang sedang tidak menunggu
+balasan. Latency dihitung dari update dikirim sampai semua handler selesai memprosesnya.
+Database memakai file sementara, bukan DB_PATH produksi
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Tuple
+
+import tornado.web
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from telegram import Update
+from telegram.ext import TypeHandler
+
+# Modul bot (config, db_helper, ...) baru di-import setelah environment disiapkan di main(),
+# karena config membaca environment saat di-import
+
+logger = logging.getLogger('loadtest')
+
+LOADTEST_TOKEN = '123456:LOADTEST'
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'FinanceHub', 'username': 'financehub_loadtest_bot'}
+
+# Urutan update per skenario: (label, jenis update, teks/callback_data)
+SCENARIOS = {
+    'start': [('start', 'message', '/start')],
+    'dashboard': [('dashboard', 'callback', 'dashboard')],
+    'add_transaction': [
+        ('add_transaction', 'callback', 'add_transaction'),
+        ('trans_type', 'callback', 'trans_expense'),
+        ('trans_category', 'callback', 'cat_0'),
+        ('trans_amount', 'message', '25000'),
+        ('trans_description', 'message', 'loadtest'),
+    ],
+    'chart': [('chart', 'callback', 'chart_expense_pie')],
+    'export': [('export', 'callback', 'export_csv')],
+}
+DEFAULT_MIX = 'dashboard=40,add_transaction=25,chart=15,export=10,start=10'
+
+# Balasan ❌ yang normal (user memang belum punya transaksi), bukan error
+EXPECTED_ERROR_REPLIES = ('❌ Belum ada data',)
+
+# Group setelah semua handler bot (log_first_response ada di group 99)
+COMPLETION_GROUP = 100
+
+
+class FakeBotAPI:
+    """Bot API tiruan: setiap method dijawab hasil valid, panggilan & balasan error dicatat"""
+    
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.on_error_reply = None
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+    
+    def _message(self, params: Dict, **fields) -> Dict:
+        chat_id = int(params.get('chat_id') or 0)
+        return {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            **fields
+        }
+    
+    def _file(self, prefix: str) -> Dict:
+        number = next(self._file_ids)
+        return {'file_id': f"{prefix}-{number}", 'file_unique_id': f"u{prefix}-{number}", 'file_size': 1}
+    
+    def call(self, method: str, params: Dict):
+        self.calls[method] += 1
+        
+        text = params.get('text') or params.get('caption') or ''
+        if text.startswith('❌') and not text.startswith(EXPECTED_ERROR_REPLIES) and self.on_error_reply:
+            # Handler menangkap exception sendiri lalu membalas pesan error
+            self.on_error_reply(int(params.get('chat_id') or 0), text.splitlines()[0])
+        
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('sendMessage', 'editMessageText'):
+            return self._message(params, text=text)
+        if method == 'sendPhoto':
+            return self._message(params, caption=text, photo=[{**self._file('photo'), 'width': 800, 'height': 640}])
+        if method == 'sendDocument':
+            return self._message(params, caption=text, document={**self._file('document'), 'file_name': 'file'})
+        # answerCallbackQuery, sendChatAction, setWebhook, deleteMessage, ...
+        return True
+
+
+class FakeBotAPIHandler(tornado.web.RequestHandler):
+    """POST /bot<token>/<method> - parameter form/multipart (format python-telegram-bot) atau JSON"""
+    
+    def initialize(self, api: FakeBotAPI):
+        self.api = api
+    
+    async def post(self, token: str, method: str):
+        if self.request.headers.get('Content-Type', '').startswith('application/json'):
+            params = json.loads(self.request.body or b'{}')
+        else:
+            params = {key: self.get_body_argument(key) for key in self.request.body_arguments}
+        
+        if self.api.latency:
+            await asyncio.sleep(self.api.latency)
+        self.write({'ok': True, 'result': self.api.call(method, params)})
+    
+    get = post
+
+
+class UpdateFactory:
+    """Membuat JSON update Telegram sintetis (message & callback_query)"""
+    
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._ids = itertools.count(1)
+    
+    @staticmethod
+    def _user(user_id: int) -> Dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}", 'username': f"user{user_id}"}
+    
+    def message(self, user_id: int, text: str) -> Dict:
+        message = {
+            'message_id': next(self._ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            'text': text
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': next(self._update_ids), 'message': message}
+    
+    def callback(self, user_id: int, data: str) -> Dict:
+        return {
+            'update_id': next(self._update_ids),
+            'callback_query': {
+                'id': str(next(self._ids)),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': next(self._ids),
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'from': BOT_USER,
+                    'text': 'menu'
+                }
+            }
+        }
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}' (pilihan: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def user_steps(rng: random.Random, mix: Dict[str, float]):
+    """Langkah user virtual tanpa akhir: /start dulu, lalu skenario acak sesuai bobot mix"""
+    yield from SCENARIOS['start']
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while True:
+        yield from SCENARIOS[rng.choices(names, weights)[0]]
+
+
+class LoadTracker:
+    """Mencatat waktu kirim, selesai dan error setiap update yang diinjeksi"""
+    
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.sent = Counter()
+        self.dropped = 0
+        self._pending: Dict[int, Tuple[str, int, float, asyncio.Future]] = {}
+        self._by_user: Dict[int, int] = {}
+        self._failed = set()
+    
+    def begin(self, update_id: int, user_id: int, label: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[update_id] = (label, user_id, time.perf_counter(), future)
+        self._by_user[user_id] = update_id
+        self.sent[label] += 1
+        return future
+    
+    def fail(self, update_id: int, reason: str):
+        """Error dihitung sekali per update; latency tetap dicatat saat update selesai"""
+        if update_id in self._pending and update_id not in self._failed:
+            self._failed.add(update_id)
+            self.errors[self._pending[update_id][0]][reason] += 1
+    
+    def fail_user(self, user_id: int, reason: str):
+        update_id = self._by_user.get(user_id)
+        if update_id is not None:
+            self.fail(update_id, reason)
+    
+    def complete(self, update_id: int):
+        pending = self._pending.pop(update_id, None)
+        if pending is None:
+            return
+        label, user_id, started, future = pending
+        self.latencies[label].append(time.perf_counter() - started)
+        self._failed.discard(update_id)
+        if self._by_user.get(user_id) == update_id:
+            del self._by_user[user_id]
+        if not future.done():
+            future.set_result(None)
+    
+    def abandon(self, update_id: int, reason: str):
+        """Update tidak selesai (timeout / gagal dikirim)"""
+        self.fail(update_id, reason)
+        pending = self._pending.pop(update_id, None)
+        self._failed.discard(update_id)
+        if pending is not None and self._by_user.get(pending[1]) == update_id:
+            del self._by_user[pending[1]]
+    
+    async def on_completed(self, update: Update, context):
+        self.complete(update.update_id)
+    
+    async def on_error(self, update, context):
+        if isinstance(update, Update):
+            self.fail(update.update_id, type(context.error).__name__)
+        logger.debug(f"Handler error: {context.error}")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile dari list yang sudah terurut"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def run_load(inject, tracker: LoadTracker, factory: UpdateFactory, users: List[int],
+                   rate: float, duration: float, mix: Dict[str, float], timeout: float, seed: int) -> float:
+    """
+    Mengirim update dengan laju `rate`/detik selama `duration` detik. Setiap tick memilih user
+    yang sedang tidak menunggu balasan (conversation tetap berurutan per user); jika semua
+    sibuk, tick dihitung sebagai dropped. Returns durasi sampai semua update selesai (detik)
+    """
+    rng = random.Random(seed)
+    steps = {user_id: user_steps(random.Random(seed + user_id), mix) for user_id in users}
+    idle = deque(rng.sample(users, len(users)))
+    tasks = set()
+    
+    async def send(user_id: int):
+        label, kind, payload = next(steps[user_id])
+        data = factory.message(user_id, payload) if kind == 'message' else factory.callback(user_id, payload)
+        future = tracker.begin(data['update_id'], user_id, label)
+        try:
+            await inject(data)
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            tracker.abandon(data['update_id'], 'timeout')
+        except Exception as e:
+            tracker.abandon(data['update_id'], f"inject: {type(e).__name__}")
+        finally:
+            idle.append(user_id)
+    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    interval = 1 / rate
+    for tick in itertools.count():
+        next_tick = started + tick * interval
+        if next_tick - started >= duration:
+            break
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+        
+        if not idle:
+            tracker.dropped += 1
+            continue
+        task = asyncio.create_task(send(idle.popleft()))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    if tasks:
+        await asyncio.wait(set(tasks))
+    return loop.time() - started
+
+
+def build_report(tracker: LoadTracker, api: FakeBotAPI, elapsed: float, args) -> Dict:
+    steps = {}
+    all_latencies = []
+    for label in tracker.sent:
+        latencies = sorted(tracker.latencies[label])
+        all_latencies.extend(latencies)
+        steps[label] = {
+            'sent': tracker.sent[label],
+            'completed': len(latencies),
+            'errors': sum(tracker.errors[label].values()),
+            'error_reasons': dict(tracker.errors[label]),
+            **{f"p{q}_ms": round(percentile(latencies, q) * 1000, 2) for q in (50, 90, 99)},
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0
+        }
+    
+    all_latencies.sort()
+    sent = sum(tracker.sent.values())
+    errors = sum(step['errors'] for step in steps.values())
+    return {
+        'config': {
+            'transport': args.transport, 'users': args.users, 'rate': args.rate, 'duration': args.duration,
+            'mix': args.mix, 'api_latency_ms': args.api_latency_ms, 'prefill': args.prefill, 'seed': args.seed
+        },
+        'elapsed_seconds': round(elapsed, 3),
+        'sent': sent,
+        'completed': len(all_latencies),
+        'dropped': tracker.dropped,
+        'errors': errors,
+        'error_rate': round(errors / sent, 4) if sent else 0.0,
+        'throughput': round(len(all_latencies) / elapsed, 2) if elapsed else 0.0,
+        **{f"p{q}_ms": round(percentile(all_latencies, q) * 1000, 2) for q in (50, 90, 99)},
+        'max_ms': round(all_latencies[-1] * 1000, 2) if all_latencies else 0.0,
+        'steps': steps,
+        'bot_api_calls': dict(api.calls.most_common())
+    }
+
+
+def print_report(report: Dict):
+    config = report['config']
+    print(f"\nTransport: {config['transport']} | Users: {config['users']} | Target: {config['rate']:g} update/s "
+          f"| Duration: {config['duration']:g}s | Bot API latency: {config['api_latency_ms']:g}ms")
+    print(f"Sent {report['sent']} | Completed {report['completed']} | Errors {report['errors']} "
+          f"({report['error_rate']:.2%}) | Dropped {report['dropped']} (semua user sedang menunggu balasan)")
+    print(f"Throughput: {report['throughput']:.2f} update/s | p50 {report['p50_ms']:.1f}ms "
+          f"| p90 {report['p90_ms']:.1f}ms | p99 {report['p99_ms']:.1f}ms | max {report['max_ms']:.1f}ms\n")
+    
+    print(f"{'step':<20}{'sent':>7}{'done':>7}{'err':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, step in sorted(report['steps'].items(), key=lambda item: -item[1]['sent']):
+        print(f"{label:<20}{step['sent']:>7}{step['completed']:>7}{step['errors']:>6}"
+              f"{step['p50_ms']:>10.1f}{step['p90_ms']:>10.1f}{step['p99_ms']:>10.1f}{step['max_ms']:>10.1f}")
+        for reason, count in step['error_reasons'].items():
+            print(f"    {count} x {reason}")
+    
+    print("\nBot API calls: " + ', '.join(f"{method}={count}" for method, count in report['bot_api_calls'].items()))
+
+
+async def run(args) -> Dict:
+    import bot
+    from webhook_server import serve_webhook
+    
+    api = FakeBotAPI(args.api_latency_ms / 1000)
+    api_server = HTTPServer(tornado.web.Application([
+        (r'/bot([^/]+)/(\w+)', FakeBotAPIHandler, {'api': api}),
+        (r'/file/bot([^/]+)/(.+)', FakeBotAPIHandler, {'api': api}),
+    ], log_function=lambda handler: None))
+    api_server.listen(args.api_port, address='127.0.0.1')
+    
+    application = bot.build_application(
+        token=LOADTEST_TOKEN,
+        base_url=f"http://127.0.0.1:{args.api_port}/bot",
+        base_file_url=f"http://127.0.0.1:{args.api_port}/file/bot"
+    )
+    tracker = LoadTracker()
+    api.on_error_reply = lambda chat_id, text: tracker.fail_user(chat_id, f"reply: {text}")
+    application.add_handler(TypeHandler(Update, tracker.on_completed), group=COMPLETION_GROUP)
+    application.add_error_handler(tracker.on_error)
+    
+    stop_event = asyncio.Event()
+    server_task = asyncio.create_task(serve_webhook(
+        application, listen='127.0.0.1', port=args.port, url_path=LOADTEST_TOKEN, stop_event=stop_event
+    ))
+    while not application.running:
+        if server_task.done():
+            await server_task
+        await asyncio.sleep(0.05)
+    
+    http_client = AsyncHTTPClient(max_clients=max(10, args.users))
+    webhook_url = f"http://127.0.0.1:{args.port}/{LOADTEST_TOKEN}"
+    
+    async def inject_queue(data: Dict):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    
+    async def inject_webhook(data: Dict):
+        await http_client.fetch(
+            webhook_url, method='POST', body=json.dumps(data),
+            headers={'Content-Type': 'application/json'}, request_timeout=args.timeout
+        )
+    
+    users = list(range(1, args.users + 1))
+    try:
+        elapsed = await run_load(
+            inject_webhook if args.transport == 'webhook' else inject_queue,
+            tracker, UpdateFactory(), users, args.rate, args.duration, args.mix, args.timeout, args.seed
+        )
+    finally:
+        stop_event.set()
+        await server_task
+        http_client.close()
+        api_server.stop()
+    
+    return build_report(tracker, api, elapsed, args)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50, help='jumlah user virtual')
+    parser.add_argument('--rate', type=float, default=20, help='target update per detik')
+    parser.add_argument('--duration', type=float, default=30, help='lama pengiriman update (detik)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help=f'bobot skenario (default: {DEFAULT_MIX})')
+    parser.add_argument('--transport', choices=('queue', 'webhook'), default='queue',
+                        help='queue = langsung ke update_queue, webhook = HTTP POST ke server webhook')
+    parser.add_argument('--api-latency-ms', type=float, default=0, help='delay tiap panggilan Bot API tiruan')
+    parser.add_argument('--prefill', type=int, default=0,
+                        help='isi database dengan N transaksi sintetis (generator benchmark.py)')
+    parser.add_argument('--timeout', type=float, default=30, help='batas tunggu per update (detik)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--port', type=int, default=18443, help='port server webhook bot')
+    parser.add_argument('--api-port', type=int, default=18081, help='port Bot API tiruan')
+    parser.add_argument('--output', default=None, help='simpan laporan ke file JSON')
+    args = parser.parse_args()
+    
+    work_dir = tempfile.mkdtemp(prefix='financebot-loadtest-')
+    db_path = os.path.join(work_dir, 'loadtest.db')
+    # Jangan sampai memakai database / token / backup produksi
+    os.environ['DB_PATH'] = db_path
+    os.environ['BOT_TOKEN'] = LOADTEST_TOKEN
+    os.environ['BACKUP_INTERVAL_HOURS'] = '0'
+    os.environ['BACKUP_DIR'] = os.path.join(work_dir, 'backups')
+    
+    try:
+        if args.prefill:
+            from benchmark import generate_dataset
+            info = generate_dataset(db_path, args.users, args.prefill, args.seed)
+            print(f"Prefilled {info['transactions']} transactions for {info['users']} users "
+                  f"in {info['generate_seconds']}s")
+        
+        import bot
+        # Handler & httpx mencatat setiap request di level INFO
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        
+        bot.chart_service.start()
+        report = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nReport written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
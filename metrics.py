@@ -0,0 +1,177 @@
+"""
+Metrics latency & error handler bot dan query database dalam format teks Prometheus
+Diekspos di /metrics pada port webhook yang sama (lihat webhook_server.py)
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Batas bucket histogram (detik)
+HANDLER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry: List['_Metric'] = []
+
+# Handler terluar yang sedang diukur di task ini (setiap update punya task & context sendiri)
+_current_handler: ContextVar[Optional[str]] = ContextVar('current_handler', default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Metric dengan satu label (misal handler / method); aman dipakai dari banyak thread"""
+    kind = ''
+    
+    def __init__(self, name: str, documentation: str, label: str):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._values: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+    
+    def _labels(self, label_value: str, extra: str = '') -> str:
+        return f'{{{self.label}="{_escape(label_value)}"{extra}}}'
+    
+    def _samples(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return [(self.name + self._labels(key), value) for key, value in sorted(self._values.items())]
+    
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{sample} {_format_value(value)}' for sample, value in self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    
+    def inc(self, label_value: str, amount: float = 1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    
+    def inc(self, label_value: str, amount: float = 1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+    
+    def dec(self, label_value: str, amount: float = 1):
+        self.inc(label_value, -amount)
+
+
+class Histogram(_Metric):
+    """Histogram kumulatif ala Prometheus: _bucket{le=...}, _sum, _count per label"""
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, label: str, buckets: Tuple[float, ...]):
+        super().__init__(name, documentation, label)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+    
+    def observe(self, label_value: str, value: float):
+        with self._lock:
+            state = self._values.get(label_value)
+            if state is None:
+                state = self._values[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+    
+    def _samples(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            snapshot = [(key, list(state[0]), state[1], state[2]) for key, state in sorted(self._values.items())]
+        
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((
+                    f'{self.name}_bucket' + self._labels(key, f',le="{_format_value(bound)}"'),
+                    cumulative
+                ))
+            samples.append((f'{self.name}_sum' + self._labels(key), total))
+            samples.append((f'{self.name}_count' + self._labels(key), count))
+        return samples
+
+
+HANDLER_DURATION = Histogram(
+    'financebot_handler_duration_seconds', 'Latency handler update Telegram', 'handler', HANDLER_BUCKETS
+)
+HANDLER_ERRORS = Counter(
+    'financebot_handler_errors_total', 'Exception yang lolos dari handler', 'handler'
+)
+HANDLER_IN_PROGRESS = Gauge(
+    'financebot_handler_in_progress', 'Handler yang sedang berjalan', 'handler'
+)
+DB_DURATION = Histogram(
+    'financebot_db_duration_seconds', 'Latency method DBHelper termasuk antrian thread pool', 'method', DB_BUCKETS
+)
+DB_ERRORS = Counter(
+    'financebot_db_errors_total', 'Exception yang lolos dari method DBHelper', 'method'
+)
+DB_IN_PROGRESS = Gauge(
+    'financebot_db_in_progress', 'Method DBHelper yang sedang berjalan / mengantri', 'method'
+)
+
+
+@contextmanager
+def track(label_value: str, duration: Histogram, errors: Counter, in_progress: Gauge):
+    """Mengukur durasi blok kode; exception dihitung lalu diteruskan (pembatalan task tidak)"""
+    in_progress.inc(label_value)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.inc(label_value)
+        raise
+    finally:
+        duration.observe(label_value, time.perf_counter() - started)
+        in_progress.dec(label_value)
+
+
+def instrument_handler(func):
+    """
+    Decorator handler async (update, context): latency, error & in-flight per nama fungsi.
+    Handler ter-decorate yang dipanggil dari handler lain (mis. menu dari callback) tidak
+    dihitung lagi - satu update tercatat sekali, atas nama handler terluar
+    """
+    name = func.__name__
+    
+    @functools.wraps(func)
+    async def wrapper(update, context):
+        if _current_handler.get() is not None:
+            return await func(update, context)
+        
+        token = _current_handler.set(name)
+        try:
+            with track(name, HANDLER_DURATION, HANDLER_ERRORS, HANDLER_IN_PROGRESS):
+                return await func(update, context)
+        finally:
+            _current_handler.reset(token)
+    
+    return wrapper
+
+
+def render_metrics() -> str:
+    """Semua metric dalam format teks Prometheus"""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
@@ -0,0 +1,484 @@
+"""
+Migrasi skema database berbasis PRAGMA user_version
+Setiap migrasi dijalankan sekali, berurutan, masing-masing dalam satu transaksi
+"""
+import sqlite3
+import logging
+
+from config import CURRENCY_DECIMALS
+
+logger = logging.getLogger(__name__)
+
+
+# Trigger yang menjaga user_balances tetap sinkron dengan tabel transactions.
+# Disimpan terpisah agar bisa dibuat ulang bila tabel transactions di-rebuild.
+USER_BALANCE_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_balance_insert
+       AFTER INSERT ON transactions
+       BEGIN
+           INSERT INTO user_balances (user_id, mode, income, expense, tx_count)
+           VALUES (
+               NEW.user_id, NEW.mode,
+               CASE WHEN NEW.type = 'income' THEN COALESCE(NEW.amount, 0) ELSE 0 END,
+               CASE WHEN NEW.type = 'expense' THEN COALESCE(NEW.amount, 0) ELSE 0 END,
+               1
+           )
+           ON CONFLICT (user_id, mode) DO UPDATE SET
+               income = income + excluded.income,
+               expense = expense + excluded.expense,
+               tx_count = tx_count + 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_balance_delete
+       AFTER DELETE ON transactions
+       BEGIN
+           UPDATE user_balances SET
+               income = income - CASE WHEN OLD.type = 'income' THEN COALESCE(OLD.amount, 0) ELSE 0 END,
+               expense = expense - CASE WHEN OLD.type = 'expense' THEN COALESCE(OLD.amount, 0) ELSE 0 END,
+               tx_count = tx_count - 1
+           WHERE user_id = OLD.user_id AND mode = OLD.mode;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_balance_update
+       AFTER UPDATE OF user_id, mode, type, amount ON transactions
+       BEGIN
+           UPDATE user_balances SET
+               income = income - CASE WHEN OLD.type = 'income' THEN COALESCE(OLD.amount, 0) ELSE 0 END,
+               expense = expense - CASE WHEN OLD.type = 'expense' THEN COALESCE(OLD.amount, 0) ELSE 0 END,
+               tx_count = tx_count - 1
+           WHERE user_id = OLD.user_id AND mode = OLD.mode;
+           INSERT INTO user_balances (user_id, mode, income, expense, tx_count)
+           VALUES (
+               NEW.user_id, NEW.mode,
+               CASE WHEN NEW.type = 'income' THEN COALESCE(NEW.amount, 0) ELSE 0 END,
+               CASE WHEN NEW.type = 'expense' THEN COALESCE(NEW.amount, 0) ELSE 0 END,
+               1
+           )
+           ON CONFLICT (user_id, mode) DO UPDATE SET
+               income = income + excluded.income,
+               expense = expense + excluded.expense,
+               tx_count = tx_count + 1;
+       END''',
+]
+
+# Menghitung ulang user_balances dari ledger transactions
+REBUILD_USER_BALANCES = [
+    'DELETE FROM user_balances',
+    '''INSERT INTO user_balances (user_id, mode, income, expense, tx_count)
+       SELECT user_id, mode,
+              COALESCE(SUM(CASE WHEN type = 'income' THEN amount END), 0),
+              COALESCE(SUM(CASE WHEN type = 'expense' THEN amount END), 0),
+              COUNT(*)
+       FROM transactions
+       GROUP BY user_id, mode''',
+]
+
+# Trigger rollup bulanan per (user, mode, bulan, tipe, kategori).
+# Bulan diambil dari kolom transactions.local_month (YYYY-MM di timezone user) yang ditulis
+# DBHelper saat insert, jadi trigger hanya membaca kolom dan jalan di koneksi mana pun
+# (sqlite3 CLI, script restore). Baris tanpa local_month masuk ke bulan UTC dari created_at;
+# refresh_local_months() (dipanggil /timezone & rebuild rollup) mengisinya dengan bulan lokal.
+_ROLLUP_MONTH_NEW = "COALESCE(NEW.local_month, substr(NEW.created_at, 1, 7), '')"
+_ROLLUP_MONTH_OLD = "COALESCE(OLD.local_month, substr(OLD.created_at, 1, 7), '')"
+
+_ROLLUP_ADD_NEW = f'''
+           INSERT INTO monthly_rollups (user_id, mode, month, type, category, total, tx_count)
+           VALUES (NEW.user_id, NEW.mode, {_ROLLUP_MONTH_NEW}, NEW.type,
+                   COALESCE(NEW.category, ''), COALESCE(NEW.amount, 0), 1)
+           ON CONFLICT (user_id, mode, month, type, category) DO UPDATE SET
+               total = total + excluded.total,
+               tx_count = tx_count + 1;'''
+
+_ROLLUP_REMOVE_OLD = f'''
+           UPDATE monthly_rollups SET
+               total = total - COALESCE(OLD.amount, 0),
+               tx_count = tx_count - 1
+           WHERE user_id = OLD.user_id AND mode = OLD.mode AND month = {_ROLLUP_MONTH_OLD}
+           AND type = OLD.type AND category = COALESCE(OLD.category, '');
+           DELETE FROM monthly_rollups
+           WHERE user_id = OLD.user_id AND mode = OLD.mode AND month = {_ROLLUP_MONTH_OLD}
+           AND type = OLD.type AND category = COALESCE(OLD.category, '') AND tx_count <= 0;'''
+
+MONTHLY_ROLLUP_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_insert
+       AFTER INSERT ON transactions
+       BEGIN{_ROLLUP_ADD_NEW}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_delete
+       AFTER DELETE ON transactions
+       BEGIN{_ROLLUP_REMOVE_OLD}
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_update
+       AFTER UPDATE OF user_id, mode, type, category, amount, local_month, created_at ON transactions
+       BEGIN{_ROLLUP_REMOVE_OLD}{_ROLLUP_ADD_NEW}
+       END''',
+]
+
+# Menghitung ulang monthly_rollups dari ledger (parameter: user_id atau NULL untuk semua)
+REBUILD_MONTHLY_ROLLUPS = [
+    'DELETE FROM monthly_rollups WHERE ?1 IS NULL OR user_id = ?1',
+    '''INSERT INTO monthly_rollups (user_id, mode, month, type, category, total, tx_count)
+       SELECT user_id, mode, COALESCE(local_month, substr(created_at, 1, 7), ''), type,
+              COALESCE(category, ''), COALESCE(SUM(amount), 0), COUNT(*)
+       FROM transactions
+       WHERE ?1 IS NULL OR user_id = ?1
+       GROUP BY 1, 2, 3, 4, 5''',
+]
+
+
+def refresh_local_months(conn: sqlite3.Connection, user_id: int = None):
+    """
+    Menghitung ulang transactions.local_month dengan timezone user saat ini (satu user atau
+    semua). Hanya baris yang berubah ditulis; trigger rollup memindahkan nominalnya ke bulan baru
+    """
+    from db_helper import local_month  # db_helper meng-import modul ini
+    
+    rows = conn.execute('''
+        SELECT t.id, t.created_at, u.timezone, t.local_month
+        FROM transactions t
+        LEFT JOIN users u ON u.user_id = t.user_id
+        WHERE ?1 IS NULL OR t.user_id = ?1
+    ''', (user_id,)).fetchall()
+    changed = []
+    for trans_id, created_at, tz_name, current in rows:
+        month = local_month(created_at, tz_name)
+        if month != current:
+            changed.append((month, trans_id))
+    conn.executemany('UPDATE transactions SET local_month = ? WHERE id = ?', changed)
+
+# Trigger penghitung users.transaction_count (dipakai untuk limit transaksi per tier)
+USER_TRANSACTION_COUNT_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_count_insert
+       AFTER INSERT ON transactions
+       BEGIN
+           UPDATE users SET transaction_count = transaction_count + 1
+           WHERE user_id = NEW.user_id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_count_delete
+       AFTER DELETE ON transactions
+       BEGIN
+           UPDATE users SET transaction_count = transaction_count - 1
+           WHERE user_id = OLD.user_id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_count_update
+       AFTER UPDATE OF user_id ON transactions
+       WHEN OLD.user_id IS NOT NEW.user_id
+       BEGIN
+           UPDATE users SET transaction_count = transaction_count - 1
+           WHERE user_id = OLD.user_id;
+           UPDATE users SET transaction_count = transaction_count + 1
+           WHERE user_id = NEW.user_id;
+       END''',
+]
+
+# Menghitung ulang users.transaction_count dari ledger transactions
+REBUILD_USER_TRANSACTION_COUNTS = [
+    '''UPDATE users SET transaction_count = (
+           SELECT COUNT(*) FROM transactions t WHERE t.user_id = users.user_id
+       )''',
+]
+
+# Skema tabel dengan kolom amount INTEGER (satuan terkecil, lihat CURRENCY_DECIMALS).
+# Dibuat dengan nama <tabel>_new lalu di-rename oleh _rebuild_with_integer_amount
+INTEGER_AMOUNT_TABLES = {
+    'transactions': '''CREATE TABLE transactions_new (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER,
+               type TEXT,
+               category TEXT,
+               amount INTEGER,
+               description TEXT,
+               mode TEXT DEFAULT 'personal',
+               tags TEXT,
+               is_recurring INTEGER DEFAULT 0,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               import_fingerprint TEXT,
+               FOREIGN KEY (user_id) REFERENCES users(user_id)
+           )''',
+    'debts': '''CREATE TABLE debts_new (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER,
+               type TEXT,
+               person_name TEXT,
+               amount INTEGER,
+               description TEXT,
+               status TEXT DEFAULT 'unpaid',
+               due_date DATE,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               paid_at TIMESTAMP,
+               FOREIGN KEY (user_id) REFERENCES users(user_id)
+           )''',
+    'budgets': '''CREATE TABLE budgets_new (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER,
+               category TEXT,
+               amount INTEGER,
+               period TEXT DEFAULT 'monthly',
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               FOREIGN KEY (user_id) REFERENCES users(user_id)
+           )''',
+    'subscription_history': '''CREATE TABLE subscription_history_new (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER,
+               tier TEXT,
+               amount INTEGER,
+               payment_method TEXT,
+               payment_proof TEXT,
+               status TEXT DEFAULT 'pending',
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               approved_at TIMESTAMP,
+               FOREIGN KEY (user_id) REFERENCES users(user_id)
+           )''',
+}
+
+
+def _backfill_monthly_rollups(conn: sqlite3.Connection):
+    """Mengisi monthly_rollups untuk semua user dari ledger"""
+    for statement in REBUILD_MONTHLY_ROLLUPS:
+        conn.execute(statement, (None,))
+
+
+def _rebuild_with_integer_amount(conn: sqlite3.Connection, table: str):
+    """
+    Rebuild tabel (SQLite tidak bisa ALTER COLUMN): salin ke skema baru dengan amount
+    dikonversi ke satuan terkecil, lalu buat ulang index-nya. Trigger tabel ikut terhapus
+    dan harus dibuat ulang oleh pemanggil
+    """
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    indexes = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (table,)
+    )]
+    sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    
+    column_list = ', '.join(columns)
+    select_list = ', '.join(
+        f'CAST(ROUND(amount * {10 ** CURRENCY_DECIMALS}) AS INTEGER)' if column == 'amount' else column
+        for column in columns
+    )
+    conn.execute(INTEGER_AMOUNT_TABLES[table])
+    conn.execute(f'INSERT INTO {table}_new ({column_list}) SELECT {select_list} FROM {table}')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    
+    for statement in indexes:
+        conn.execute(statement)
+    # AUTOINCREMENT: ID yang pernah dipakai (termasuk yang sudah dihapus) tidak dipakai ulang
+    if sequence:
+        conn.execute('DELETE FROM sqlite_sequence WHERE name = ?', (table,))
+        conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, sequence[0]))
+
+
+def _convert_amounts_to_integer(conn: sqlite3.Connection):
+    for table in INTEGER_AMOUNT_TABLES:
+        _rebuild_with_integer_amount(conn, table)
+
+
+class SchemaConfigError(Exception):
+    """Isi database tidak cocok dengan konfigurasi, bot tidak boleh jalan"""
+
+
+def _record_currency_decimals(conn: sqlite3.Connection):
+    conn.execute(
+        "INSERT OR REPLACE INTO app_meta (key, value) VALUES ('currency_decimals', ?)",
+        (str(CURRENCY_DECIMALS),)
+    )
+
+
+def check_currency_decimals(conn: sqlite3.Connection):
+    """
+    Nominal tersimpan sebagai nominal x 10^CURRENCY_DECIMALS. Jika config berubah setelah
+    data ada, semua nominal terbaca salah 10^n kali - raises SchemaConfigError
+    """
+    row = conn.execute("SELECT value FROM app_meta WHERE key = 'currency_decimals'").fetchone()
+    if row is not None and int(row[0]) != CURRENCY_DECIMALS:
+        raise SchemaConfigError(
+            f"CURRENCY_DECIMALS={CURRENCY_DECIMALS} tidak cocok dengan database "
+            f"(nominal tersimpan dengan {row[0]} desimal). Kembalikan CURRENCY_DECIMALS={row[0]}"
+        )
+
+
+# Daftar migrasi: (versi, deskripsi, langkah)
+# Langkah berupa string SQL atau callable(conn) untuk migrasi yang butuh logika Python.
+# JANGAN mengubah migrasi yang sudah dirilis - tambahkan versi baru di akhir.
+MIGRATIONS = [
+    (1, 'Index untuk transactions, debts dan users', [
+        # get_balance / get_monthly_balance: range per user, mode, tipe & tanggal (covering)
+        '''CREATE INDEX IF NOT EXISTS idx_transactions_user_mode_type_created
+           ON transactions (user_id, mode, type, created_at, amount)''',
+        # get_all_transactions: urut berdasarkan tanggal per user & mode
+        '''CREATE INDEX IF NOT EXISTS idx_transactions_user_mode_created
+           ON transactions (user_id, mode, created_at)''',
+        # get_debts: filter status per user, urut tanggal
+        '''CREATE INDEX IF NOT EXISTS idx_debts_user_status_created
+           ON debts (user_id, status, created_at)''',
+        # get_active_users_today
+        '''CREATE INDEX IF NOT EXISTS idx_users_last_active
+           ON users (last_active)''',
+    ]),
+    (2, 'Tabel ringkasan saldo per user & mode (user_balances)', [
+        '''CREATE TABLE IF NOT EXISTS user_balances (
+               user_id INTEGER NOT NULL,
+               mode TEXT NOT NULL,
+               income REAL NOT NULL DEFAULT 0,
+               expense REAL NOT NULL DEFAULT 0,
+               tx_count INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (user_id, mode)
+           ) WITHOUT ROWID''',
+        *USER_BALANCE_TRIGGERS,
+        *REBUILD_USER_BALANCES,
+    ]),
+    (3, 'Timezone per user dan rollup bulanan (monthly_rollups)', [
+        'ALTER TABLE users ADD COLUMN timezone TEXT',
+        '''CREATE TABLE IF NOT EXISTS monthly_rollups (
+               user_id INTEGER NOT NULL,
+               mode TEXT NOT NULL,
+               month TEXT NOT NULL,
+               type TEXT NOT NULL,
+               category TEXT NOT NULL,
+               total REAL NOT NULL DEFAULT 0,
+               tx_count INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (user_id, mode, month, type, category)
+           ) WITHOUT ROWID''',
+        # Trigger & isi rollup dibuat di migrasi 12 (kolom local_month)
+    ]),
+    (4, 'Index keyset pagination riwayat transaksi', [
+        # get_recent_transactions: WHERE user_id, mode AND id < ? ORDER BY id DESC
+        '''CREATE INDEX IF NOT EXISTS idx_transactions_user_mode_id
+           ON transactions (user_id, mode, id)''',
+    ]),
+    (5, 'Cache file_id Telegram per hash konten', [
+        '''CREATE TABLE IF NOT EXISTS telegram_files (
+               content_hash TEXT PRIMARY KEY,
+               file_id TEXT NOT NULL,
+               kind TEXT NOT NULL,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )''',
+    ]),
+    (6, 'Job broadcast yang bisa dilanjutkan dan penanda user yang memblokir bot', [
+        'ALTER TABLE users ADD COLUMN is_blocked INTEGER NOT NULL DEFAULT 0',
+        '''CREATE TABLE IF NOT EXISTS broadcast_jobs (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               admin_chat_id INTEGER NOT NULL,
+               text TEXT NOT NULL,
+               status TEXT NOT NULL DEFAULT 'running',
+               progress_message_id INTEGER,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               finished_at TIMESTAMP
+           )''',
+        '''CREATE TABLE IF NOT EXISTS broadcast_recipients (
+               job_id INTEGER NOT NULL,
+               user_id INTEGER NOT NULL,
+               status TEXT NOT NULL DEFAULT 'pending',
+               error TEXT,
+               PRIMARY KEY (job_id, user_id)
+           ) WITHOUT ROWID''',
+        # Ambil penerima pending berikutnya & hitung progress per status
+        '''CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_job_status
+           ON broadcast_recipients (job_id, status, user_id)''',
+        # Job yang belum selesai dilanjutkan saat bot start
+        '''CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status
+           ON broadcast_jobs (status)''',
+    ]),
+    (7, 'Penghitung transaksi per user (users.transaction_count)', [
+        'ALTER TABLE users ADD COLUMN transaction_count INTEGER NOT NULL DEFAULT 0',
+        *USER_TRANSACTION_COUNT_TRIGGERS,
+        *REBUILD_USER_TRANSACTION_COUNTS,
+    ]),
+    (8, 'Fingerprint import CSV/Excel agar upload ulang tidak menggandakan transaksi', [
+        'ALTER TABLE transactions ADD COLUMN import_fingerprint TEXT',
+        # INSERT OR IGNORE import_transactions: baris dengan fingerprint yang sudah ada dilewati
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_import_fingerprint
+           ON transactions (user_id, import_fingerprint)
+           WHERE import_fingerprint IS NOT NULL''',
+    ]),
+    (9, 'Nominal sebagai INTEGER satuan terkecil (transactions, debts, budgets, ringkasan)', [
+        _convert_amounts_to_integer,
+        # Tabel ringkasan dibuat ulang dengan kolom INTEGER lalu dihitung ulang dari ledger
+        'DROP TABLE IF EXISTS user_balances',
+        '''CREATE TABLE user_balances (
+               user_id INTEGER NOT NULL,
+               mode TEXT NOT NULL,
+               income INTEGER NOT NULL DEFAULT 0,
+               expense INTEGER NOT NULL DEFAULT 0,
+               tx_count INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (user_id, mode)
+           ) WITHOUT ROWID''',
+        *REBUILD_USER_BALANCES,
+        'DROP TABLE IF EXISTS monthly_rollups',
+        '''CREATE TABLE monthly_rollups (
+               user_id INTEGER NOT NULL,
+               mode TEXT NOT NULL,
+               month TEXT NOT NULL,
+               type TEXT NOT NULL,
+               category TEXT NOT NULL,
+               total INTEGER NOT NULL DEFAULT 0,
+               tx_count INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (user_id, mode, month, type, category)
+           ) WITHOUT ROWID''',
+        # Trigger transactions hilang saat tabel di-rebuild (rollup dibuat di migrasi 12)
+        *USER_BALANCE_TRIGGERS,
+        *USER_TRANSACTION_COUNT_TRIGGERS,
+    ]),
+    (10, 'Pesan error job broadcast yang berhenti karena gagal (status failed)', [
+        'ALTER TABLE broadcast_jobs ADD COLUMN error TEXT',
+    ]),
+    (11, 'Skala nominal (CURRENCY_DECIMALS) tersimpan di database', [
+        '''CREATE TABLE IF NOT EXISTS app_meta (
+               key TEXT PRIMARY KEY,
+               value TEXT NOT NULL
+           ) WITHOUT ROWID''',
+        # Nilai saat migrasi ini jalan = nilai yang dipakai v9 untuk konversi nominal
+        _record_currency_decimals,
+    ]),
+    (12, 'Bulan lokal tersimpan di transactions.local_month; trigger rollup tanpa fungsi SQL Python', [
+        # Trigger lama memanggil local_month() yang hanya terdaftar di koneksi DBHelper
+        'DROP TRIGGER IF EXISTS trg_transactions_rollup_insert',
+        'DROP TRIGGER IF EXISTS trg_transactions_rollup_delete',
+        'DROP TRIGGER IF EXISTS trg_transactions_rollup_update',
+        'ALTER TABLE transactions ADD COLUMN local_month TEXT',
+        refresh_local_months,
+        *MONTHLY_ROLLUP_TRIGGERS,
+        _backfill_monthly_rollups,
+    ]),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Mendapatkan versi skema database saat ini"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Menjalankan semua migrasi yang belum diterapkan.
+    Koneksi harus dalam mode autocommit (isolation_level=None).
+    Returns versi skema setelah migrasi
+    """
+    current = get_schema_version(conn)
+    
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Cek ulang setelah lock didapat, bisa saja proses lain sudah migrasi
+            if get_schema_version(conn) >= version:
+                conn.execute('ROLLBACK')
+                continue
+            
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            
+            conn.execute(f'PRAGMA user_version = {version}')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        
+        current = version
+        logger.info(f"Migration {version} applied: {description}")
+    
+    return current
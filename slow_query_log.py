@@ -0,0 +1,210 @@
+"""
+Slow-query log opsional untuk DBHelper
+Statement yang melewati ambang dicatat ke log beserta bentuk parameter, jumlah baris,
+durasi dan EXPLAIN QUERY PLAN; sebagian disimpan di ring buffer untuk /slow_queries
+"""
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Hanya statement ini yang punya query plan
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+
+def _params_shape(params) -> str:
+    """Tipe parameter tanpa nilainya, misal '(int, str, NoneType)'"""
+    if isinstance(params, dict):
+        return '{' + ', '.join(f"{key}: {type(value).__name__}" for key, value in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+
+def _format_plan(rows) -> List[str]:
+    """Baris EXPLAIN QUERY PLAN (id, parent, notused, detail) -> daftar teks berindentasi"""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+class _CountingIterator:
+    """Membungkus parameter executemany (bisa generator) untuk menghitung baris & ambil contoh"""
+    
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.count = 0
+        self.first = None
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        item = next(self._iterator)
+        if self.count == 0:
+            self.first = item
+        self.count += 1
+        return item
+
+
+class SlowQueryLog:
+    """
+    - threshold_ms: statement (execute + fetch) selama ini atau lebih dianggap lambat
+    - sample_rate: porsi query lambat yang disimpan ke ring buffer (semuanya tetap di-log)
+    - max_entries: ukuran ring buffer
+    """
+    
+    def __init__(self, threshold_ms: float, sample_rate: float = 1.0, max_entries: int = 100):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+    
+    def record(self, conn: sqlite3.Connection, sql: str, params, shape: str, rows: int, elapsed: float):
+        plan = []
+        if _EXPLAINABLE.match(sql):
+            # Cursor biasa (bukan TimedCursor) agar EXPLAIN tidak ikut tercatat
+            cursor = sqlite3.Cursor(conn)
+            try:
+                plan = _format_plan(cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params or ()).fetchall())
+            except Exception as e:
+                plan = [f"(plan tidak tersedia: {e})"]
+            finally:
+                cursor.close()
+        
+        statement = ' '.join(sql.split())
+        logger.warning(
+            f"Slow query {elapsed * 1000:.1f}ms rows={rows} params={shape}: {statement} "
+            f"| plan: {' / '.join(line.strip() for line in plan) or '-'}"
+        )
+        
+        if random.random() < self.sample_rate:
+            with self._lock:
+                self._entries.append({
+                    'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'duration_ms': elapsed * 1000,
+                    'sql': statement,
+                    'params': shape,
+                    'rows': rows,
+                    'plan': plan
+                })
+    
+    def entries(self, limit: int = None) -> List[Dict]:
+        """Entri terbaru lebih dulu"""
+        with self._lock:
+            entries = list(reversed(self._entries))
+        return entries[:limit] if limit else entries
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor yang mengukur execute + fetch per statement. Statement dianggap selesai saat
+    hasilnya habis dibaca, cursor dipakai untuk statement lain, ditutup atau dibuang
+    """
+    
+    _pending = None
+    
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._begin(sql, parameters, _params_shape(parameters), started)
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        counted = _CountingIterator(seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, counted)
+        finally:
+            shape = f"{counted.count} x {_params_shape(counted.first or ())}"
+            self._begin(sql, counted.first, shape, started)
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, 0 if row is None else 1, row is None)
+        return row
+    
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(started, len(rows), len(rows) < size)
+        return rows
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+    
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+    
+    def close(self):
+        self._finish()
+        super().close()
+    
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+    
+    def _begin(self, sql, params, shape: str, started: float):
+        # [sql, params, shape, durasi, baris]
+        self._pending = [sql, params, shape, time.perf_counter() - started, 0]
+        if self.description is None:
+            # INSERT/UPDATE/DELETE/DDL: tidak ada hasil untuk di-fetch
+            self._pending[4] = max(self.rowcount, 0)
+            self._finish()
+    
+    def _fetched(self, started: float, rows: int, exhausted: bool):
+        if self._pending is not None:
+            self._pending[3] += time.perf_counter() - started
+            self._pending[4] += rows
+            if exhausted:
+                self._finish()
+    
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        sql, params, shape, elapsed, rows = pending
+        slow_log = getattr(self.connection, 'slow_query_log', None)
+        if slow_log is not None and elapsed >= slow_log.threshold:
+            slow_log.record(self.connection, sql, params, shape, rows, elapsed)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Factory koneksi sqlite3.connect: semua cursor (termasuk conn.execute) memakai TimedCursor"""
+    
+    slow_query_log = None
+    
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+    
+    # Versi bawaan conn.execute/executemany tidak memanggil cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,40 @@
+"""
+Fixture bersama test. Modul bot berada di root repo (flat), jadi root ditambahkan ke sys.path.
+Setiap test memakai database baru di folder sementara
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_helper import DBHelper, local_month  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'finance.db')
+
+
+@pytest.fixture
+def helper(db_path):
+    db = DBHelper(db_path)
+    yield db
+    db.close()
+
+
+def user_local_month(conn, user_id, created_at):
+    """local_month seperti yang ditulis DBHelper: created_at di timezone user"""
+    row = conn.execute('SELECT timezone FROM users WHERE user_id = ?', (user_id,)).fetchone()
+    return local_month(created_at, row[0] if row else None)
+
+
+def insert_transaction(conn, user_id, trans_type, category, amount, created_at,
+                       mode='personal', description='-'):
+    """INSERT langsung (created_at bisa diatur) - trigger ringkasan tetap jalan"""
+    return conn.execute('''
+        INSERT INTO transactions (user_id, type, category, amount, description, mode, created_at, local_month)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (user_id, trans_type, category, amount, description, mode, created_at,
+          user_local_month(conn, user_id, created_at))).lastrowid
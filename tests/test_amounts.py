@@ -0,0 +1,154 @@
+"""Migrasi database lama (nominal REAL) ke nominal integer & validasi input nominal"""
+import re
+import sqlite3
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+import migrations
+import utils
+from db_helper import DBHelper
+from migrations import MIGRATIONS, SchemaConfigError
+from utils import MAX_AMOUNT, validate_amount
+
+# Skema awal sebelum ada migrasi (user_version 0, nominal REAL)
+BASELINE_SCHEMA = '''
+    CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, last_name TEXT,
+        subscription_tier TEXT DEFAULT 'free', subscription_start DATE, subscription_end DATE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, type TEXT, category TEXT, amount REAL,
+        description TEXT, mode TEXT DEFAULT 'personal', tags TEXT, is_recurring INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE debts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, type TEXT, person_name TEXT, amount REAL,
+        description TEXT, status TEXT DEFAULT 'unpaid', due_date DATE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, paid_at TIMESTAMP
+    );
+    CREATE TABLE budgets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, category TEXT, amount REAL,
+        period TEXT DEFAULT 'monthly', created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE subscription_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, tier TEXT, amount REAL, payment_method TEXT,
+        payment_proof TEXT, status TEXT DEFAULT 'pending', created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        approved_at TIMESTAMP
+    );
+'''
+
+BASELINE_TRANSACTIONS = [
+    (1, 'income', 'Gaji', 5000000.0, 'personal', '2024-01-01 02:00:00'),
+    (1, 'expense', 'Makanan', 15000.4, 'personal', '2024-01-31 20:00:00'),
+    (1, 'expense', 'Transportasi', 99999.6, 'personal', '2024-02-10 08:00:00'),
+    (1, 'income', 'Penjualan', 250000.0, 'business', '2024-02-11 08:00:00'),
+    (2, 'expense', 'Makanan', 0.1 + 0.2, 'personal', '2024-03-01 00:00:00'),
+]
+
+
+def expected_minor_units(value):
+    return int((Decimal(repr(value)) * utils.AMOUNT_SCALE).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+@pytest.fixture
+def baseline_db(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO users (user_id, username) VALUES (?, ?)', [(1, 'a'), (2, 'b')])
+    conn.executemany('''
+        INSERT INTO transactions (user_id, type, category, amount, mode, created_at) VALUES (?, ?, ?, ?, ?, ?)
+    ''', BASELINE_TRANSACTIONS)
+    # ID yang sudah dihapus tidak boleh dipakai ulang setelah tabel di-rebuild
+    conn.execute("INSERT INTO transactions (user_id, type, category, amount) VALUES (2, 'expense', 'x', 1)")
+    conn.execute('DELETE FROM transactions WHERE id = 6')
+    conn.execute("INSERT INTO debts (user_id, type, person_name, amount) VALUES (1, 'hutang', 'Budi', 75000.5)")
+    conn.execute("INSERT INTO budgets (user_id, category, amount) VALUES (1, 'Makanan', 1500000.0)")
+    conn.execute("INSERT INTO subscription_history (user_id, tier, amount) VALUES (1, 'premium', 49000.0)")
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_baseline_database_migrates_to_integer_amounts(baseline_db):
+    helper = DBHelper(baseline_db)
+    try:
+        conn = helper.get_connection()
+        assert migrations.get_schema_version(conn) == MIGRATIONS[-1][0] >= 9
+        
+        for table in migrations.INTEGER_AMOUNT_TABLES:
+            types = {row[0] for row in conn.execute(f'SELECT typeof(amount) FROM {table}')}
+            assert types == {'integer'}, table
+        
+        amounts = [row[0] for row in conn.execute('SELECT amount FROM transactions ORDER BY id')]
+        assert amounts == [expected_minor_units(row[3]) for row in BASELINE_TRANSACTIONS]
+        assert conn.execute('SELECT amount FROM debts').fetchone()[0] == expected_minor_units(75000.5)
+        
+        # Ringkasan hasil migrasi sama dengan hitung ulang dari ledger
+        assert helper.verify_user_balances() == []
+        for user_id in (1, 2):
+            for mode in ('personal', 'business'):
+                rows = [row for row in BASELINE_TRANSACTIONS if row[0] == user_id and row[4] == mode]
+                income = sum(expected_minor_units(row[3]) for row in rows if row[1] == 'income')
+                expense = sum(expected_minor_units(row[3]) for row in rows if row[1] == 'expense')
+                assert helper.get_balance(user_id, mode) == {
+                    'income': income, 'expense': expense, 'balance': income - expense, 'count': len(rows)
+                }
+        assert dict(conn.execute('SELECT user_id, transaction_count FROM users')) == {1: 4, 2: 1}
+        
+        rollup_total = conn.execute('SELECT SUM(total) FROM monthly_rollups').fetchone()[0]
+        assert rollup_total == sum(expected_minor_units(row[3]) for row in BASELINE_TRANSACTIONS)
+        
+        assert conn.execute("SELECT value FROM app_meta WHERE key = 'currency_decimals'").fetchone() == (
+            str(utils.CURRENCY_DECIMALS),
+        )
+        assert helper.add_transaction(2, 'expense', 'Makanan', 1, '-')
+        assert conn.execute('SELECT MAX(id) FROM transactions').fetchone()[0] == 7
+    finally:
+        helper.close()
+
+
+def test_changed_currency_decimals_refuses_to_start(db_path, monkeypatch):
+    DBHelper(db_path).close()
+    monkeypatch.setattr(migrations, 'CURRENCY_DECIMALS', utils.CURRENCY_DECIMALS + 2)
+    with pytest.raises(SchemaConfigError):
+        DBHelper(db_path)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('50000', (True, 50000)),
+    ('50.000', (True, 50000)),
+    ('1.000.000', (True, 1000000)),
+    ('1,000,000', (True, 1000000)),
+    (' 25 000 ', (True, 25000)),
+    ('0', (False, 0)),
+    ('-5', (False, 0)),
+    ('', (False, 0)),
+    ('abc', (False, 0)),
+    ('Rp 50.000', (False, 0)),
+    ('NaN', (False, 0)),
+    ('Infinity', (False, 0)),
+    (str(MAX_AMOUNT), (True, MAX_AMOUNT)),
+    (str(MAX_AMOUNT + 1), (False, 0)),
+    ('9' * 40, (False, 0)),
+])
+def test_validate_amount_without_decimals(text, expected, monkeypatch):
+    monkeypatch.setattr(utils, 'AMOUNT_SCALE', 1)
+    monkeypatch.setattr(utils, '_DECIMAL_SUFFIX', None)
+    assert validate_amount(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('12.500,50', (True, 1250050)),
+    ('12,500.50', (True, 1250050)),
+    ('12500,5', (True, 1250050)),
+    ('0,01', (True, 1)),
+    ('0,00', (False, 0)),
+    ('12.500', (True, 1250000)),
+    ('1.000.000', (True, 100000000)),
+])
+def test_validate_amount_with_two_decimals(text, expected, monkeypatch):
+    monkeypatch.setattr(utils, 'AMOUNT_SCALE', 100)
+    monkeypatch.setattr(utils, '_DECIMAL_SUFFIX', re.compile(r'^(.*)[.,](\d{1,2})$'))
+    assert validate_amount(text) == expected
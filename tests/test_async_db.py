@@ -0,0 +1,58 @@
+"""AsyncDBHelper: query berjalan di thread pool database, event loop tetap responsif"""
+import asyncio
+import threading
+import time
+
+from db_helper import AsyncDBHelper
+
+
+def test_calls_run_in_db_pool_without_blocking_loop(helper):
+    db = AsyncDBHelper(helper, max_workers=2)
+    
+    async def scenario():
+        ticks = 0
+        
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        
+        task = asyncio.create_task(ticker())
+        # Query lambat disimulasikan dengan sleep blocking di thread database
+        thread_name = await db.run(lambda: (time.sleep(0.3), threading.current_thread().name)[1])
+        task.cancel()
+        return thread_name, ticks
+    
+    try:
+        thread_name, ticks = asyncio.run(scenario())
+    finally:
+        db.shutdown()
+    
+    assert thread_name.startswith('db')
+    assert ticks >= 10
+
+
+def test_concurrent_calls_through_facade(helper):
+    db = AsyncDBHelper(helper, max_workers=4)
+    users = range(1, 21)
+    
+    async def scenario():
+        await asyncio.gather(*(db.add_user(user_id, f"u{user_id}", 'U', '') for user_id in users))
+        results = await asyncio.gather(*(
+            db.add_transaction(user_id, trans_type, 'Makan', 1000, '-')
+            for user_id in users for trans_type in ('income', 'expense', 'expense')
+        ))
+        balances = await asyncio.gather(*(db.get_balance(user_id) for user_id in users))
+        return results, balances
+    
+    try:
+        results, balances = asyncio.run(scenario())
+    finally:
+        db.shutdown()
+    
+    assert all(results)
+    for balance in balances:
+        assert (balance['income'], balance['expense']) == (1000, 2000)
+    # Atribut non-callable diteruskan apa adanya, tidak dibungkus coroutine
+    assert db.db_path == helper.db_path
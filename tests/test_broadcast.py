@@ -0,0 +1,164 @@
+"""Engine broadcast: batas kecepatan, RetryAfter, status per penerima & resume setelah restart"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+import broadcast
+from broadcast import BroadcastEngine, TokenBucket
+from db_helper import AsyncDBHelper
+
+ADMIN_CHAT_ID = 999
+
+
+class FakeBot:
+    """Bot palsu: mencatat pesan terkirim, bisa melempar error per penerima"""
+    
+    def __init__(self, errors=None, delay=0):
+        self.errors = errors or {}
+        self.delay = delay
+        self.sent = []
+        self.admin_messages = []
+    
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.errors.get(chat_id):
+            raise self.errors[chat_id].pop(0)
+        if chat_id == ADMIN_CHAT_ID:
+            self.admin_messages.append(text)
+        else:
+            self.sent.append((chat_id, time.monotonic()))
+        return SimpleNamespace(message_id=len(self.sent) + 1)
+    
+    async def edit_message_text(self, **kwargs):
+        pass
+
+
+@pytest.fixture
+def db(helper):
+    for user_id in range(1, 21):
+        helper.add_user(user_id, f"u{user_id}", 'U', '')
+    db = AsyncDBHelper(helper)
+    yield db
+    db.shutdown()
+
+
+async def wait_for_jobs(engine):
+    while engine._tasks:
+        await asyncio.gather(*engine._tasks.values())
+
+
+def recipient_statuses(db, job_id):
+    rows = db.helper.get_connection().execute(
+        'SELECT user_id, status FROM broadcast_recipients WHERE job_id = ?', (job_id,)
+    )
+    return dict(rows)
+
+
+def test_token_bucket_limits_rate_and_pauses():
+    async def scenario():
+        bucket = TokenBucket(rate=100)
+        started = time.monotonic()
+        for _ in range(11):
+            await bucket.acquire()
+        spread = time.monotonic() - started
+        
+        bucket.pause(0.2)
+        started = time.monotonic()
+        await bucket.acquire()
+        return spread, time.monotonic() - started
+    
+    spread, paused = asyncio.run(scenario())
+    assert 0.09 <= spread < 0.5
+    assert paused >= 0.19
+
+
+def test_statuses_and_retry_after(db, monkeypatch):
+    # RetryAfter dari Telegram minimal 1 detik, dipersingkat agar test cepat
+    monkeypatch.setattr(broadcast, '_retry_after_seconds', lambda error: 0.2)
+    bot = FakeBot(errors={
+        3: [RetryAfter(1)],
+        4: [Forbidden('bot was blocked by the user')],
+        5: [BadRequest('chat not found')],
+    })
+    engine = BroadcastEngine(db, rate=200, concurrency=4, batch_size=6)
+    
+    async def scenario():
+        job_id = await engine.start(bot, ADMIN_CHAT_ID, 'Halo')
+        await wait_for_jobs(engine)
+        return job_id, await db.get_broadcast_job(job_id)
+    
+    job_id, job = asyncio.run(scenario())
+    statuses = recipient_statuses(db, job_id)
+    assert statuses[3] == 'sent'
+    assert statuses[4] == 'blocked'
+    assert statuses[5] == 'failed'
+    assert (job['status'], job['sent'], job['blocked'], job['failed']) == ('done', 18, 1, 1)
+    assert sorted(user_id for user_id, _ in bot.sent) == [user_id for user_id in range(1, 21) if user_id not in (4, 5)]
+    
+    # Flood limit menghentikan semua pengiriman selama jeda RetryAfter
+    times = sorted(sent_at for _, sent_at in bot.sent)
+    assert max(later - earlier for earlier, later in zip(times, times[1:])) >= 0.15
+    
+    # User yang memblokir bot tidak masuk daftar penerima broadcast berikutnya
+    async def next_job():
+        return await db.create_broadcast_job(ADMIN_CHAT_ID, 'Lagi')
+    
+    assert 4 not in recipient_statuses(db, asyncio.run(next_job()))
+
+
+def test_stopped_job_resumes_without_duplicates(db):
+    bot = FakeBot(delay=0.01)
+    
+    async def scenario():
+        engine = BroadcastEngine(db, rate=1000, concurrency=1, batch_size=5)
+        job_id = await engine.start(bot, ADMIN_CHAT_ID, 'Halo')
+        while len(bot.sent) < 7:
+            await asyncio.sleep(0.005)
+        await engine.stop()  # bot dimatikan di tengah job
+        
+        stopped = await db.get_broadcast_job(job_id)
+        restarted = BroadcastEngine(db, rate=1000, concurrency=4, batch_size=5)
+        resumed = await restarted.resume(bot)
+        await wait_for_jobs(restarted)
+        return job_id, stopped, resumed, await db.get_broadcast_job(job_id)
+    
+    job_id, stopped, resumed, job = asyncio.run(scenario())
+    assert stopped['status'] == 'running' and stopped['sent'] < 20
+    assert resumed == [job_id]
+    assert (job['status'], job['sent']) == ('done', 20)
+    assert sorted(user_id for user_id, _ in bot.sent) == list(range(1, 21))
+
+
+def test_flood_waits_do_not_use_up_attempts(db, monkeypatch):
+    monkeypatch.setattr(broadcast, '_retry_after_seconds', lambda error: 0.01)
+    bot = FakeBot(errors={3: [RetryAfter(1) for _ in range(4)]})
+    engine = BroadcastEngine(db, rate=1000, max_attempts=2)
+    
+    async def scenario():
+        job_id = await engine.start(bot, ADMIN_CHAT_ID, 'Halo')
+        await wait_for_jobs(engine)
+        return job_id
+    
+    assert recipient_statuses(db, asyncio.run(scenario()))[3] == 'sent'
+
+
+def test_job_error_marks_job_failed(db, monkeypatch):
+    monkeypatch.setattr(db.helper, 'save_broadcast_results', lambda job_id, results: False)
+    bot = FakeBot()
+    
+    async def scenario():
+        engine = BroadcastEngine(db, rate=1000, batch_size=5)
+        job_id = await engine.start(bot, ADMIN_CHAT_ID, 'Halo')
+        await wait_for_jobs(engine)
+        # Job yang gagal tidak di-resume lagi saat bot restart
+        resumed = await BroadcastEngine(db).resume(bot)
+        return await db.get_broadcast_job(job_id), resumed
+    
+    job, resumed = asyncio.run(scenario())
+    assert (job['status'], job['error']) == ('failed', 'Failed to save broadcast results')
+    assert resumed == []
+    assert '⚠️' in bot.admin_messages[-1]
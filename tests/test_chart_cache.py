@@ -0,0 +1,78 @@
+"""ChartCache: hasil render yang basi tidak boleh masuk cache, ukuran byte dibatasi"""
+import asyncio
+
+from chart_service import ChartCache
+
+
+def test_put_get_and_invalidate():
+    cache = ChartCache()
+    cache.put(1, 'pie', 'personal', cache.version(1), b'png-1', variant='expense')
+    cache.put(2, 'pie', 'personal', cache.version(2), b'png-2', variant='expense')
+    assert cache.get(1, 'pie', 'personal', 'expense') == b'png-1'
+    assert cache.get(1, 'pie', 'personal', 'income') is None
+    
+    cache.invalidate(1)
+    assert cache.get(1, 'pie', 'personal', 'expense') is None
+    # Chart user lain tidak ikut terbuang
+    assert cache.get(2, 'pie', 'personal', 'expense') == b'png-2'
+
+
+def test_render_racing_invalidate_is_not_cached():
+    cache = ChartCache()
+    rendering = asyncio.Event()
+    
+    async def render_chart():
+        # Urutan handler chart: ambil versi, baca data & render (await), lalu put
+        version = cache.version(1)
+        rendering.set()
+        await asyncio.sleep(0.01)
+        cache.put(1, 'bar', 'personal', version, b'stale-png')
+    
+    async def add_transaction():
+        await rendering.wait()
+        cache.invalidate(1)
+    
+    async def scenario():
+        await asyncio.gather(render_chart(), add_transaction())
+    
+    asyncio.run(scenario())
+    assert cache.get(1, 'bar', 'personal') is None
+    
+    cache.put(1, 'bar', 'personal', cache.version(1), b'fresh-png')
+    assert cache.get(1, 'bar', 'personal') == b'fresh-png'
+
+
+def test_size_bound_evicts_least_recently_used():
+    cache = ChartCache(max_bytes=10)
+    cache.put(1, 'pie', 'personal', 0, b'aaaa')
+    cache.put(2, 'pie', 'personal', 0, b'bbbb')
+    assert cache.get(1, 'pie', 'personal') == b'aaaa'  # user 1 jadi yang terbaru dipakai
+    
+    cache.put(3, 'pie', 'personal', 0, b'cccc')
+    assert cache.get(2, 'pie', 'personal') is None
+    assert cache.get(1, 'pie', 'personal') == b'aaaa'
+    assert cache.get(3, 'pie', 'personal') == b'cccc'
+    
+    # Gambar yang lebih besar dari seluruh cache tidak disimpan
+    cache.put(4, 'pie', 'personal', 0, b'x' * 11)
+    assert cache.get(4, 'pie', 'personal') is None
+    assert cache.get(3, 'pie', 'personal') == b'cccc'
+
+
+def test_invalidation_memory_is_bounded():
+    cache = ChartCache(max_tracked_users=3)
+    cache.put(1000, 'pie', 'personal', cache.version(1000), b'png-1000')
+    stale_version = cache.version(1)
+    
+    for user_id in range(1, 101):
+        cache.invalidate(user_id)
+    assert len(cache._invalidated) == 3
+    assert cache._user_keys == {1000: {(1000, 'pie', 'personal', '')}}
+    
+    # Waktu invalidate user 1 sudah dilupakan, tapi render yang dimulai sebelumnya tetap ditolak
+    cache.put(1, 'pie', 'personal', stale_version, b'stale-png')
+    assert cache.get(1, 'pie', 'personal') is None
+    # Render baru tetap masuk cache, chart user yang tidak berubah tetap terpakai
+    cache.put(1, 'pie', 'personal', cache.version(1), b'fresh-png')
+    assert cache.get(1, 'pie', 'personal') == b'fresh-png'
+    assert cache.get(1000, 'pie', 'personal') == b'png-1000'
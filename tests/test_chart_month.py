@@ -0,0 +1,57 @@
+"""Chart dashboard hanya berisi transaksi bulan berjalan di timezone user, sesuai judulnya"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from db_helper import month_bounds
+from utils import get_current_month_name
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_chart_uses_current_local_month(tmp_path):
+    code = textwrap.dedent('''
+        import asyncio
+        import json
+        from types import SimpleNamespace
+        
+        import bot
+        
+        helper = bot.db.helper
+        helper.init_db()
+        helper.add_user(1, 'a', 'A', '')
+        helper.set_user_timezone(1, 'Asia/Jakarta')
+        helper.add_transaction(1, 'expense', 'Makan', 100, '-')
+        helper.import_transactions(1, 'personal', [('expense', 'Lama', 999, '-', '2020-01-15 00:00:00', 'old')])
+        
+        rendered = []
+        
+        async def render(kind, data, title, dpi):
+            rendered.append({'data': [list(row) for row in data], 'title': title})
+            return b'png'
+        
+        async def noop(*args, **kwargs):
+            pass
+        
+        bot.chart_service.render = render
+        bot.file_cache.send_photo = noop
+        bot.send_main_menu = noop
+        query = SimpleNamespace(data='chart_expense_pie', answer=noop, edit_message_text=noop)
+        update = SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=1))
+        asyncio.run(bot.generate_chart(update, None))
+        bot.db.shutdown()
+        print(json.dumps(rendered))
+    ''')
+    # cwd di folder sementara: database default bot dibuat di sana, bukan di repo
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, BOT_TOKEN='123:test')
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    
+    rendered = json.loads(result.stdout.strip().splitlines()[-1])
+    assert rendered == [{
+        'data': [['Makan', 100]],
+        'title': f"Pengeluaran - {get_current_month_name(month_bounds('Asia/Jakarta')[0])}"
+    }]
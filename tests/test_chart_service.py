@@ -0,0 +1,48 @@
+"""Worker chart tidak di-fork dari proses bot dan aman dibuat ulang saat bot sudah berjalan"""
+import os
+import subprocess
+import sys
+import textwrap
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_pool_recreated_without_fork_or_database(tmp_path):
+    # Dijalankan sebagai modul utama seperti bot.py: worker meng-import ulang modul ini & bot
+    script = tmp_path / 'main.py'
+    script.write_text(textwrap.dedent('''
+        import asyncio
+        import os
+        import threading
+        
+        import bot
+        
+        
+        async def main():
+            service = bot.chart_service
+            service.start()
+            executor = service._get_executor()
+            assert executor._mp_context.get_start_method() != 'fork'
+            first = await service.render('pie', [('Makan', 100)], 'Test', dpi=50)
+            
+            # Bot sudah punya thread lain saat pool rusak lalu dibuat ulang
+            threading.Thread(target=threading.Event().wait, args=(5,), daemon=True).start()
+            service._discard_executor(executor)
+            second = await service.render('pie', [('Makan', 100)], 'Test', dpi=50)
+            assert service._get_executor() is not executor
+            assert first[:4] == second[:4] == b'\\x89PNG'
+            service.shutdown()
+        
+        
+        if __name__ == '__main__':
+            asyncio.run(main())
+            # Import bot (di proses ini maupun di worker) tidak membuka database
+            assert not os.path.exists('finance.db')
+            print('ok')
+    '''))
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, BOT_TOKEN='123:test',
+               CHART_BACKEND='pillow', CHART_FORMAT='png')
+    result = subprocess.run([sys.executable, str(script)], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == 'ok'
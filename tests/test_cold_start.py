@@ -0,0 +1,19 @@
+"""Import bot tidak boleh ikut meng-import library chart (matplotlib/numpy)"""
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_bot_skips_chart_libraries(tmp_path):
+    # cwd di folder sementara: database default bot dibuat di sana, bukan di repo
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, BOT_TOKEN='123:test')
+    code = (
+        "import sys, bot; "
+        "print(','.join(name for name in ('matplotlib', 'numpy', 'pandas') if name in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
@@ -0,0 +1,78 @@
+"""Koneksi SQLite persisten per thread dengan WAL & pragma"""
+import sqlite3
+import threading
+
+import pytest
+
+from config import DB_CACHE_SIZE_KB
+from db_helper import DBHelper
+
+
+def test_connection_is_reused_per_thread(helper):
+    conn = helper.get_connection()
+    assert helper.get_connection() is conn
+    helper.add_user(1, 'a', 'A', '')
+    helper.get_balance(1)
+    assert helper.get_connection() is conn
+    
+    other = []
+    thread = threading.Thread(target=lambda: other.append(helper.get_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_connection_pragmas(helper):
+    conn = helper.get_connection()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2  # MEMORY
+    assert conn.execute('PRAGMA cache_size').fetchone()[0] == -DB_CACHE_SIZE_KB
+    assert conn.isolation_level is None
+
+
+def test_transaction_rolls_back_on_error(helper):
+    helper.add_user(1, 'a', 'A', '')
+    with pytest.raises(RuntimeError):
+        with helper.transaction() as conn:
+            conn.execute("UPDATE users SET username = 'b' WHERE user_id = 1")
+            raise RuntimeError('gagal')
+    
+    conn = helper.get_connection()
+    assert not conn.in_transaction
+    assert conn.execute('SELECT username FROM users WHERE user_id = 1').fetchone()[0] == 'a'
+
+
+def test_failed_commit_is_rolled_back(helper):
+    conn = helper.get_connection()
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute('CREATE TABLE parent (id INTEGER PRIMARY KEY)')
+    conn.execute('''CREATE TABLE child (
+        parent_id INTEGER REFERENCES parent (id) DEFERRABLE INITIALLY DEFERRED
+    )''')
+    
+    # Foreign key deferred baru dicek saat COMMIT, jadi COMMIT-nya yang gagal
+    with pytest.raises(sqlite3.IntegrityError):
+        with helper.transaction() as conn:
+            conn.execute('INSERT INTO child (parent_id) VALUES (1)')
+    
+    assert not conn.in_transaction
+    assert conn.execute('SELECT COUNT(*) FROM child').fetchone()[0] == 0
+    with helper.transaction() as conn:
+        conn.execute('INSERT INTO parent (id) VALUES (1)')
+
+
+def test_close_closes_every_thread_connection(db_path):
+    helper = DBHelper(db_path)
+    conns = [helper.get_connection()]
+    thread = threading.Thread(target=lambda: conns.append(helper.get_connection()))
+    thread.start()
+    thread.join()
+    
+    helper.close()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+    # Koneksi baru dibuat lagi setelah close
+    assert helper.get_connection() not in conns
+    helper.close()
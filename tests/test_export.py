@@ -0,0 +1,175 @@
+"""Export streaming & pengiriman lewat InputFile python-telegram-bot yang asli"""
+import asyncio
+import csv
+import gzip
+import io
+import json
+import zipfile
+
+import pytest
+from openpyxl import load_workbook
+from telegram import Bot
+from telegram.request import BaseRequest
+
+import utils
+from db_helper import AsyncDBHelper, TRANSACTION_COLUMNS
+from file_cache import TelegramFileCache, content_hash
+from utils import export_rows_to_csv, export_rows_to_excel, upload_content
+
+
+class RecordingRequest(BaseRequest):
+    """Pengganti HTTP client Bot API: menyimpan file yang di-upload, tanpa jaringan"""
+    
+    def __init__(self):
+        self.uploads = []
+        self.file_ids = []
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+    
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if url.endswith('/getMe'):
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bot', 'username': 'test_bot'}
+        else:
+            files = request_data.multipart_data
+            if files:
+                self.uploads.extend(files.values())
+            else:
+                self.file_ids.append(request_data.parameters['document'])
+            result = {
+                'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'},
+                'document': {'file_id': 'file-1', 'file_unique_id': 'unique-1'},
+            }
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def send_document(file_buffer, filename):
+    """Kirim file seperti export_data; returns (nama file, isi) yang sampai di Bot API"""
+    request = RecordingRequest()
+    
+    async def send():
+        async with Bot('123:test', request=request, get_updates_request=RecordingRequest()) as bot:
+            await bot.send_document(chat_id=1, document=upload_content(file_buffer), filename=filename)
+    
+    asyncio.run(send())
+    (uploaded_name, content, _mimetype), = request.uploads
+    return uploaded_name, content
+
+
+@pytest.fixture
+def history(helper):
+    helper.add_user(1, 'a', 'A', '')
+    for i in range(1200):
+        helper.add_transaction(1, 'expense' if i % 3 else 'income', 'Makan', 1000 + i, f"transaksi {i}")
+    return helper
+
+
+def read_csv(content):
+    return list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+
+
+@pytest.mark.parametrize('spool_size, in_memory', [(utils.EXPORT_SPOOL_MAX_SIZE, True), (1024, False)])
+def test_csv_export_is_streamed_and_sent(history, monkeypatch, spool_size, in_memory):
+    # spool_size kecil memaksa file pindah ke disk, default tetap di memori
+    monkeypatch.setattr(utils, 'EXPORT_SPOOL_MAX_SIZE', spool_size)
+    file_buffer = export_rows_to_csv(history.iter_transactions(1, chunk_size=100), TRANSACTION_COLUMNS)
+    assert (file_buffer.name is None) == in_memory
+    
+    try:
+        uploaded_name, content = send_document(file_buffer, 'transaksi_1.csv')
+    finally:
+        file_buffer.close()
+    
+    rows = read_csv(content)
+    assert uploaded_name == 'transaksi_1.csv'
+    assert rows[0] == TRANSACTION_COLUMNS
+    assert len(rows) == 1201
+    assert sorted(float(row[2]) for row in rows[1:]) == [1000 + i for i in range(1200)]
+
+
+def test_gzip_csv_export_is_sent(history):
+    file_buffer = export_rows_to_csv(history.iter_transactions(1), TRANSACTION_COLUMNS, compress=True)
+    try:
+        _, content = send_document(file_buffer, 'transaksi_1.csv.gz')
+    finally:
+        file_buffer.close()
+    
+    assert len(read_csv(gzip.decompress(content))) == 1201
+
+
+def test_excel_export_is_sent(history):
+    file_buffer = export_rows_to_excel(history.iter_transactions(1, chunk_size=100), TRANSACTION_COLUMNS)
+    try:
+        uploaded_name, content = send_document(file_buffer, 'transaksi_1.xlsx')
+    finally:
+        file_buffer.close()
+    
+    rows = list(load_workbook(io.BytesIO(content), read_only=True)['Transaksi'].values)
+    assert uploaded_name == 'transaksi_1.xlsx'
+    assert list(rows[0]) == TRANSACTION_COLUMNS
+    assert len(rows) == 1201
+
+
+def send_exports_through_cache(helper, files, max_entries=5000):
+    """Kirim (file_buffer, nama file) berurutan lewat TelegramFileCache; returns RecordingRequest"""
+    request = RecordingRequest()
+    db = AsyncDBHelper(helper)
+    file_cache = TelegramFileCache(db, max_entries=max_entries)
+    
+    async def send_all():
+        async with Bot('123:test', request=request, get_updates_request=RecordingRequest()) as bot:
+            for file_buffer, filename in files:
+                try:
+                    await file_cache.send_document(bot, 1, file_buffer, filename)
+                finally:
+                    file_buffer.close()
+    
+    try:
+        asyncio.run(send_all())
+    finally:
+        db.shutdown()
+    return request
+
+
+@pytest.mark.parametrize('export_rows, filename', [
+    (export_rows_to_csv, 'transaksi_1.csv'),
+    (export_rows_to_excel, 'transaksi_1.xlsx'),
+])
+def test_identical_export_reuses_file_id(history, export_rows, filename):
+    files = ((export_rows(history.iter_transactions(1), TRANSACTION_COLUMNS), filename) for _ in range(2))
+    request = send_exports_through_cache(history, files)
+    
+    assert len(request.uploads) == 1
+    assert request.file_ids == ['file-1']
+
+
+def test_excel_export_has_no_save_time(history):
+    # Waktu simpan di properti dokumen atau entri zip membuat bytes (dan hash) selalu berbeda
+    file_buffer = export_rows_to_excel(history.iter_transactions(1), TRANSACTION_COLUMNS)
+    try:
+        content = file_buffer.read()
+    finally:
+        file_buffer.close()
+    
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        assert {info.date_time for info in archive.infolist()} == {(2000, 1, 1, 0, 0, 0)}
+    properties = load_workbook(io.BytesIO(content)).properties
+    assert properties.created == properties.modified == utils.EXCEL_FIXED_TIMESTAMP
+
+
+def test_file_id_table_is_bounded(helper):
+    contents = [f"Nominal\n{i}\n".encode() for i in range(5)]
+    send_exports_through_cache(helper, ((io.BytesIO(content), 'data.csv') for content in contents),
+                               max_entries=3)
+    
+    stored = [row[0] for row in helper.get_connection().execute('SELECT content_hash FROM telegram_files')]
+    assert sorted(stored) == sorted(content_hash('document', content, 'data.csv') for content in contents[2:])
+
+
+def test_empty_export_returns_none(helper):
+    assert export_rows_to_csv(helper.iter_transactions(1), TRANSACTION_COLUMNS) is None
+    assert export_rows_to_excel(helper.iter_transactions(1), TRANSACTION_COLUMNS) is None
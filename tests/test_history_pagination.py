@@ -0,0 +1,34 @@
+"""Keyset pagination riwayat: tiap halaman lanjut tepat dari halaman sebelumnya"""
+from conftest import insert_transaction
+
+
+def test_pages_cover_history_without_gaps(helper):
+    helper.add_user(1, 'a', 'A', '')
+    helper.add_user(2, 'b', 'B', '')
+    conn = helper.get_connection()
+    ids = []
+    for i in range(23):
+        ids.append(insert_transaction(conn, 1, 'expense', 'Makan', i + 1, '2024-01-01 00:00:00'))
+        # Transaksi user lain & mode lain tidak boleh ikut masuk halaman
+        insert_transaction(conn, 2, 'expense', 'Makan', i + 1, '2024-01-01 00:00:00')
+        insert_transaction(conn, 1, 'income', 'Gaji', i + 1, '2024-01-01 00:00:00', mode='business')
+    
+    pages = []
+    before_id = None
+    while True:
+        page = helper.get_recent_transactions(1, limit=10, before_id=before_id)
+        if not page:
+            break
+        pages.append([trans['id'] for trans in page])
+        before_id = page[-1]['id']
+    
+    assert [len(page) for page in pages] == [10, 10, 3]
+    assert sum(pages, []) == sorted(ids, reverse=True)
+    
+    # Kembali ke halaman lebih baru dari halaman kedua = halaman pertama lagi
+    newer = helper.get_recent_transactions(1, limit=10, after_id=pages[1][0])
+    assert [trans['id'] for trans in newer] == pages[0]
+    
+    # Halaman pertama dari after_id terlalu dekat ke atas hanya berisi yang memang lebih baru
+    newest = helper.get_recent_transactions(1, limit=10, after_id=ids[-3])
+    assert [trans['id'] for trans in newest] == ids[-2:][::-1]
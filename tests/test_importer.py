@@ -0,0 +1,126 @@
+"""Import file CSV/XLSX: upload ulang tidak menggandakan data, export bisa di-import kembali"""
+import io
+
+import pytest
+from openpyxl import Workbook
+
+from config import EXPENSE_CATEGORIES, INCOME_CATEGORIES
+from db_helper import TRANSACTION_COLUMNS
+from importer import ImportFileError, parse_transactions
+from utils import export_rows_to_csv, export_rows_to_excel
+
+
+def csv_file(text):
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def xlsx_file(rows):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    out = io.BytesIO()
+    workbook.save(out)
+    out.seek(0)
+    return out
+
+
+def import_file(helper, file, filename, user_id=1, tz_name=None):
+    parsed = parse_transactions(file, filename, 'personal', tz_name=tz_name)
+    return helper.import_transactions(user_id, 'personal', parsed['rows']), parsed['errors']
+
+
+def ledger(helper, user_id=1):
+    return helper.get_connection().execute('''
+        SELECT type, category, amount, description, created_at FROM transactions
+        WHERE user_id = ? ORDER BY id
+    ''', (user_id,)).fetchall()
+
+
+def test_same_csv_twice_is_deduplicated(helper):
+    helper.add_user(1, 'a', 'A', '')
+    text = (
+        "Tanggal,Tipe,Kategori,Nominal,Deskripsi\n"
+        "2024-01-05,pengeluaran,Makanan,15.000,Nasi\n"
+        "2024-01-05,pengeluaran,Makanan,15.000,Nasi\n"
+        "2024-01-06,pemasukan,Gaji,5000000,Gaji Januari\n"
+        "2024-01-07,pengeluaran,Makanan,abc,Rusak\n"
+    )
+    
+    # Baris kembar dalam satu file tetap masuk dua-duanya
+    assert import_file(helper, csv_file(text), 'data.csv') == ((3, 0), [(5, "nominal tidak valid")])
+    assert import_file(helper, csv_file(text), 'data.csv') == ((0, 3), [(5, "nominal tidak valid")])
+    assert len(ledger(helper)) == 3
+    assert helper.get_balance(1)['count'] == 3
+
+
+def test_same_xlsx_twice_is_deduplicated(helper):
+    helper.add_user(1, 'a', 'A', '')
+    helper.set_user_timezone(1, 'Asia/Jakarta')
+    rows = [
+        ('Tanggal', 'Tipe', 'Kategori', 'Nominal', 'Deskripsi'),
+        ('05/01/2024 08:30', 'keluar', 'Transportasi', 12000, 'Ojek'),
+        ('06/01/2024', 'masuk', 'Gaji', '2.500.000', None),
+    ]
+    
+    assert import_file(helper, xlsx_file(rows), 'data.xlsx', tz_name='Asia/Jakarta') == ((2, 0), [])
+    assert import_file(helper, xlsx_file(rows), 'data.xlsx', tz_name='Asia/Jakarta') == ((0, 2), [])
+    # Tanggal lokal WIB disimpan sebagai UTC
+    assert [row[4] for row in ledger(helper)] == ['2024-01-05 01:30:00', '2024-01-05 17:00:00']
+
+
+def test_dateless_file_twice_adds_nothing(helper):
+    helper.add_user(1, 'a', 'A', '')
+    text = "Tipe,Kategori,Nominal\npengeluaran,Makanan,10000\npemasukan,Gaji,20000\n"
+    
+    assert import_file(helper, csv_file(text), 'data.csv')[0] == (2, 0)
+    assert import_file(helper, csv_file(text), 'data.csv')[0] == (0, 2)
+    assert len(ledger(helper)) == 2
+
+
+def test_different_dateless_files_are_not_deduplicated(helper):
+    helper.add_user(1, 'a', 'A', '')
+    january = "Tipe,Kategori,Nominal,Deskripsi\npengeluaran,Makanan,10000,Kopi\n"
+    # File lain (mis. catatan bulan berikutnya) dengan baris yang sama persis
+    february = january + "pengeluaran,Transportasi,5000,Parkir\n"
+    
+    assert import_file(helper, csv_file(january), 'januari.csv')[0] == (1, 0)
+    assert import_file(helper, csv_file(february), 'februari.csv')[0] == (2, 0)
+    assert import_file(helper, csv_file(february), 'februari.csv')[0] == (0, 2)
+    assert len(ledger(helper)) == 3
+
+
+@pytest.mark.parametrize('export_rows, filename', [
+    (export_rows_to_csv, 'transaksi.csv'),
+    (export_rows_to_excel, 'transaksi.xlsx'),
+])
+def test_export_round_trip(helper, export_rows, filename):
+    helper.add_user(1, 'a', 'A', '')
+    helper.add_user(2, 'b', 'B', '')
+    helper.set_user_timezone(1, 'Asia/Jakarta')
+    conn = helper.get_connection()
+    for category, trans_type, amount, created_at in (
+        (INCOME_CATEGORIES[0], 'income', 5000000, '2024-01-31 20:00:00'),
+        (EXPENSE_CATEGORIES[0], 'expense', 12500, '2024-02-01 01:30:00'),
+        (EXPENSE_CATEGORIES[1], 'expense', 7000, '2024-03-15 23:59:59'),
+    ):
+        conn.execute('''
+            INSERT INTO transactions (user_id, type, category, amount, description, mode, created_at)
+            VALUES (1, ?, ?, ?, 'ket', 'personal', ?)
+        ''', (trans_type, category, amount, created_at))
+    
+    exported = export_rows(helper.iter_transactions(1, 'personal', tz_name='Asia/Jakarta'), TRANSACTION_COLUMNS)
+    data = exported.read()
+    
+    # Di-import user lain dengan zona waktu berbeda: offset di file tetap dihormati
+    assert import_file(helper, io.BytesIO(data), filename, user_id=2, tz_name='America/New_York') == ((3, 0), [])
+    assert sorted(ledger(helper, 2)) == sorted(ledger(helper, 1))
+    
+    # File export yang sama di-import ulang tidak menggandakan data
+    assert import_file(helper, io.BytesIO(data), filename, user_id=2)[0] == (0, 3)
+
+
+def test_unknown_format_and_missing_amount_column():
+    with pytest.raises(ImportFileError):
+        parse_transactions(csv_file("a,b\n1,2\n"), 'data.txt', 'personal')
+    with pytest.raises(ImportFileError):
+        parse_transactions(csv_file("Tipe,Kategori\nexpense,Makanan\n"), 'data.csv', 'personal')
@@ -0,0 +1,81 @@
+"""last_active ditahan di memori, ditulis per batch, dan tidak hilang saat bot berhenti"""
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from db_helper import AsyncDBHelper
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OLD = '2000-01-01 00:00:00'
+
+
+@pytest.fixture
+def db(helper):
+    for user_id in (1, 2, 3):
+        helper.add_user(user_id, f"u{user_id}", 'U', '')
+    helper.get_connection().execute('UPDATE users SET last_active = ?', (OLD,))
+    db = AsyncDBHelper(helper)
+    yield db
+    db.shutdown()
+
+
+def last_active(db):
+    return dict(db.helper.get_connection().execute('SELECT user_id, last_active FROM users'))
+
+
+def test_activity_is_written_in_one_flush(db):
+    for user_id in (1, 2, 1, 1, 2):
+        db.update_last_active(user_id)
+    assert set(last_active(db).values()) == {OLD}
+    
+    assert asyncio.run(db.flush_last_active()) == 2
+    values = last_active(db)
+    assert values[1] != OLD and values[2] != OLD and values[3] == OLD
+    assert asyncio.run(db.flush_last_active()) == 0
+
+
+def test_failed_flush_keeps_activity(db, monkeypatch):
+    db.update_last_active(1)
+    monkeypatch.setattr(db.helper, 'update_last_active_many', lambda updates: False)
+    assert asyncio.run(db.flush_last_active()) == 0
+    
+    monkeypatch.undo()
+    assert asyncio.run(db.flush_last_active()) == 1
+    assert last_active(db)[1] != OLD
+
+
+def test_bot_shutdown_flushes_pending_activity(tmp_path):
+    code = textwrap.dedent(f'''
+        import asyncio
+        from types import SimpleNamespace
+        
+        import bot
+        
+        bot.db.helper.init_db()
+        bot.db.helper.add_user(1, 'a', 'A', '')
+        bot.db.helper.get_connection().execute("UPDATE users SET last_active = '{OLD}'")
+        
+        async def main():
+            application = SimpleNamespace(bot_data={{}})
+            application.bot_data['last_active_task'] = asyncio.create_task(bot.db.run_last_active_flusher(3600))
+            bot.db.update_last_active(1)
+            await bot.post_shutdown(application)
+        
+        asyncio.run(main())
+    ''')
+    # cwd di folder sementara: database default bot dibuat di sana, bukan di repo
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, BOT_TOKEN='123:test')
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    
+    conn = sqlite3.connect(str(tmp_path / 'finance.db'))
+    try:
+        assert conn.execute('SELECT last_active FROM users WHERE user_id = 1').fetchone()[0] != OLD
+    finally:
+        conn.close()
@@ -0,0 +1,41 @@
+"""instrument_handler: satu update tercatat sekali walaupun handler memanggil handler lain"""
+import asyncio
+
+import pytest
+
+from metrics import HANDLER_DURATION, HANDLER_ERRORS, HANDLER_IN_PROGRESS, instrument_handler
+
+
+def observed(name):
+    state = HANDLER_DURATION._values.get(name)
+    return state[2] if state else 0
+
+
+@instrument_handler
+async def nested_menu(update, context):
+    if update == 'fail':
+        raise ValueError('boom')
+    return 'menu'
+
+
+@instrument_handler
+async def nested_callback(update, context):
+    return await nested_menu(update, context)
+
+
+def test_nested_handler_recorded_once():
+    assert asyncio.run(nested_callback('ok', None)) == 'menu'
+    assert observed('nested_callback') == 1
+    assert observed('nested_menu') == 0
+    
+    # Dipanggil langsung oleh Application tetap tercatat atas namanya sendiri
+    asyncio.run(nested_menu('ok', None))
+    assert observed('nested_menu') == 1
+
+
+def test_nested_error_counted_once():
+    with pytest.raises(ValueError):
+        asyncio.run(nested_callback('fail', None))
+    assert HANDLER_ERRORS._values.get('nested_callback') == 1
+    assert 'nested_menu' not in HANDLER_ERRORS._values
+    assert HANDLER_IN_PROGRESS._values.get('nested_callback') == 0
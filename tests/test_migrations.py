@@ -0,0 +1,48 @@
+"""Migrasi skema: idempotent dan atomik per versi"""
+import sqlite3
+
+import pytest
+
+import migrations
+from db_helper import DBHelper
+from migrations import MIGRATIONS, get_schema_version, run_migrations
+
+
+def schema(conn):
+    return sorted(conn.execute('SELECT type, name, sql FROM sqlite_master').fetchall(), key=str)
+
+
+def test_migrations_are_idempotent(db_path):
+    helper = DBHelper(db_path)
+    conn = helper.get_connection()
+    latest = MIGRATIONS[-1][0]
+    assert get_schema_version(conn) == latest
+    before = schema(conn)
+    
+    assert run_migrations(conn) == latest
+    helper.close()
+    
+    # Bot dijalankan ulang di database yang sama
+    helper = DBHelper(db_path)
+    conn = helper.get_connection()
+    assert get_schema_version(conn) == latest
+    assert schema(conn) == before
+    helper.close()
+
+
+def test_failed_migration_is_rolled_back(helper, monkeypatch):
+    conn = helper.get_connection()
+    version = get_schema_version(conn)
+    monkeypatch.setattr(migrations, 'MIGRATIONS', MIGRATIONS + [
+        (version + 1, 'Migrasi rusak', [
+            'CREATE TABLE half_done (id INTEGER)',
+            'SELECT * FROM missing_table',
+        ]),
+    ])
+    
+    with pytest.raises(sqlite3.OperationalError):
+        run_migrations(conn)
+    
+    assert get_schema_version(conn) == version
+    assert not conn.in_transaction
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
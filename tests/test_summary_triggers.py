@@ -0,0 +1,147 @@
+"""Trigger user_balances, monthly_rollups & transaction_count harus sama dengan hitung ulang dari ledger"""
+import random
+import sqlite3
+
+from conftest import insert_transaction, user_local_month
+from db_helper import month_bounds
+
+
+def balances(conn):
+    return {
+        (user_id, mode): (income, expense, count)
+        for user_id, mode, income, expense, count in conn.execute(
+            'SELECT user_id, mode, income, expense, tx_count FROM user_balances WHERE tx_count > 0'
+        )
+    }
+
+
+def rollups(conn):
+    return {
+        row[:5]: row[5:]
+        for row in conn.execute('''
+            SELECT user_id, mode, month, type, category, total, tx_count
+            FROM monthly_rollups WHERE tx_count > 0
+        ''')
+    }
+
+
+def transaction_counts(conn):
+    return dict(conn.execute('SELECT user_id, transaction_count FROM users'))
+
+
+def assert_matches_rebuild(helper):
+    """Snapshot hasil trigger == hasil rebuild penuh dari tabel transactions"""
+    conn = helper.get_connection()
+    maintained = (balances(conn), rollups(conn), transaction_counts(conn))
+    assert helper.verify_user_balances() == []
+    assert helper.rebuild_user_balances()
+    assert helper.rebuild_monthly_rollups()
+    assert helper.rebuild_transaction_counts()
+    assert maintained == (balances(conn), rollups(conn), transaction_counts(conn))
+
+
+def test_update_and_delete_keep_balances(helper):
+    helper.add_user(1, 'a', 'A', '')
+    conn = helper.get_connection()
+    income_id = insert_transaction(conn, 1, 'income', 'Gaji', 1000, '2024-01-10 03:00:00')
+    expense_id = insert_transaction(conn, 1, 'expense', 'Makan', 300, '2024-01-10 04:00:00')
+    assert balances(conn) == {(1, 'personal'): (1000, 300, 2)}
+    
+    conn.execute('UPDATE transactions SET amount = 500 WHERE id = ?', (expense_id,))
+    assert balances(conn) == {(1, 'personal'): (1000, 500, 2)}
+    
+    conn.execute("UPDATE transactions SET type = 'expense' WHERE id = ?", (income_id,))
+    assert balances(conn) == {(1, 'personal'): (0, 1500, 2)}
+    
+    conn.execute("UPDATE transactions SET mode = 'business' WHERE id = ?", (income_id,))
+    assert balances(conn) == {(1, 'personal'): (0, 500, 1), (1, 'business'): (0, 1000, 1)}
+    
+    conn.execute('DELETE FROM transactions WHERE id = ?', (expense_id,))
+    assert balances(conn) == {(1, 'business'): (0, 1000, 1)}
+    assert transaction_counts(conn) == {1: 1}
+    assert_matches_rebuild(helper)
+
+
+def test_rollup_month_follows_user_timezone(helper):
+    helper.add_user(1, 'a', 'A', '')
+    helper.set_user_timezone(1, 'Asia/Jakarta')
+    conn = helper.get_connection()
+    
+    # 31 Jan 20:00 UTC = 1 Feb 03:00 WIB
+    trans_id = insert_transaction(conn, 1, 'expense', 'Makan', 250, '2024-01-31 20:00:00')
+    assert rollups(conn) == {(1, 'personal', '2024-02', 'expense', 'Makan'): (250, 1)}
+    
+    # Pindah tanggal & kategori: rollup lama dikurangi, rollup baru ditambah
+    conn.execute('UPDATE transactions SET created_at = ?, local_month = ?, category = ? WHERE id = ?',
+                 ('2024-01-15 01:00:00', user_local_month(conn, 1, '2024-01-15 01:00:00'), 'Transport', trans_id))
+    assert rollups(conn) == {(1, 'personal', '2024-01', 'expense', 'Transport'): (250, 1)}
+    
+    conn.execute('DELETE FROM transactions WHERE id = ?', (trans_id,))
+    assert rollups(conn) == {}
+    assert_matches_rebuild(helper)
+
+
+def test_random_changes_match_rebuild(helper):
+    rng = random.Random(7)
+    conn = helper.get_connection()
+    for user_id in (1, 2, 3):
+        helper.add_user(user_id, f"u{user_id}", 'U', '')
+    helper.set_user_timezone(3, 'Asia/Jayapura')
+    
+    ids = []
+    for _ in range(300):
+        action = rng.random()
+        if action < 0.6 or not ids:
+            ids.append(insert_transaction(
+                conn, rng.choice((1, 2, 3)), rng.choice(('income', 'expense')), rng.choice(('A', 'B', 'C')),
+                rng.randint(1, 10 ** 6), f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+                f"{rng.randint(0, 23):02d}:00:00", mode=rng.choice(('personal', 'business'))
+            ))
+        elif action < 0.85:
+            trans_id, user_id = rng.choice(ids), rng.choice((1, 2, 3))
+            created_at = conn.execute('SELECT created_at FROM transactions WHERE id = ?', (trans_id,)).fetchone()[0]
+            conn.execute('UPDATE transactions SET amount = ?, type = ?, user_id = ?, local_month = ? WHERE id = ?',
+                         (rng.randint(1, 10 ** 6), rng.choice(('income', 'expense')), user_id,
+                          user_local_month(conn, user_id, created_at), trans_id))
+        else:
+            conn.execute('DELETE FROM transactions WHERE id = ?', (ids.pop(rng.randrange(len(ids))),))
+    
+    assert_matches_rebuild(helper)
+
+
+def test_plain_sqlite_connection_can_write_transactions(helper, db_path):
+    """Trigger hanya membaca kolom: koneksi sqlite3 biasa (CLI, script restore) bisa menulis"""
+    helper.add_user(1, 'a', 'A', '')
+    helper.set_user_timezone(1, 'Asia/Jakarta')
+    assert helper.add_transaction(1, 'expense', 'Makan', 100, '-')
+    this_month = month_bounds('Asia/Jakarta')[0]
+    
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # Tanpa local_month: 31 Jan 20:00 UTC masuk bulan UTC
+        trans_id = conn.execute('''
+            INSERT INTO transactions (user_id, type, category, amount, created_at)
+            VALUES (1, 'expense', 'Makan', 250, '2024-01-31 20:00:00')
+        ''').lastrowid
+        conn.execute('UPDATE transactions SET amount = 300 WHERE id = ?', (trans_id,))
+        other_id = conn.execute('''
+            INSERT INTO transactions (user_id, type, category, amount, created_at)
+            VALUES (1, 'expense', 'Makan', 50, '2024-03-10 00:00:00')
+        ''').lastrowid
+        conn.execute('DELETE FROM transactions WHERE id = ?', (other_id,))
+    finally:
+        conn.close()
+    
+    helper_conn = helper.get_connection()
+    assert rollups(helper_conn) == {
+        (1, 'personal', this_month, 'expense', 'Makan'): (100, 1),
+        (1, 'personal', '2024-01', 'expense', 'Makan'): (300, 1),
+    }
+    
+    # Rebuild mengisi local_month dengan timezone user: 1 Feb 03:00 WIB
+    assert helper.rebuild_monthly_rollups(1)
+    assert rollups(helper_conn) == {
+        (1, 'personal', this_month, 'expense', 'Makan'): (100, 1),
+        (1, 'personal', '2024-02', 'expense', 'Makan'): (300, 1),
+    }
+    assert_matches_rebuild(helper)
@@ -0,0 +1,65 @@
+"""Limit transaksi per tier harus tetap tepat walau banyak insert berjalan bersamaan"""
+import threading
+
+import pytest
+
+from db_helper import TransactionLimitError
+
+LIMIT = 25
+
+
+def test_limit_holds_under_concurrent_inserts(helper):
+    helper.add_user(1, 'a', 'A', '')
+    threads_count, per_thread = 8, 10
+    barrier = threading.Barrier(threads_count)
+    results = {'ok': 0, 'limit': 0, 'failed': 0}
+    lock = threading.Lock()
+    
+    def worker():
+        barrier.wait()
+        for _ in range(per_thread):
+            try:
+                outcome = 'ok' if helper.add_transaction(1, 'expense', 'Makan', 1000, '-',
+                                                         max_transactions=LIMIT) else 'failed'
+            except TransactionLimitError:
+                outcome = 'limit'
+            with lock:
+                results[outcome] += 1
+    
+    # Setiap thread memakai koneksi thread-local sendiri dari DBHelper yang sama
+    threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert results == {'ok': LIMIT, 'limit': threads_count * per_thread - LIMIT, 'failed': 0}
+    conn = helper.get_connection()
+    assert conn.execute('SELECT COUNT(*) FROM transactions WHERE user_id = 1').fetchone()[0] == LIMIT
+    assert conn.execute('SELECT transaction_count FROM users WHERE user_id = 1').fetchone()[0] == LIMIT
+    assert helper.get_balance(1)['count'] == LIMIT
+
+
+def test_import_over_limit_is_rolled_back(helper):
+    helper.add_user(1, 'a', 'A', '')
+    for _ in range(LIMIT - 2):
+        helper.add_transaction(1, 'expense', 'Makan', 1000, '-', max_transactions=LIMIT)
+    
+    rows = [('expense', 'Makan', 1000, '-', '2024-01-01 00:00:00', f"fp-{i}") for i in range(3)]
+    with pytest.raises(TransactionLimitError):
+        helper.import_transactions(1, 'personal', rows, max_transactions=LIMIT)
+    
+    conn = helper.get_connection()
+    assert conn.execute('SELECT transaction_count FROM users WHERE user_id = 1').fetchone()[0] == LIMIT - 2
+    assert helper.import_transactions(1, 'personal', rows[:2], max_transactions=LIMIT) == (2, 0)
+
+
+def test_import_without_users_row_is_still_limited(helper):
+    # Tanpa baris users trigger transaction_count tidak punya baris untuk dihitung
+    rows = [('expense', 'Makan', 1000, '-', '2024-01-01 00:00:00', f"fp-{i}") for i in range(LIMIT + 1)]
+    with pytest.raises(TransactionLimitError):
+        helper.import_transactions(7, 'personal', rows, max_transactions=LIMIT)
+    
+    conn = helper.get_connection()
+    assert conn.execute('SELECT COUNT(*) FROM transactions WHERE user_id = 7').fetchone()[0] == 0
+    assert helper.import_transactions(7, 'personal', rows[:LIMIT], max_transactions=LIMIT) == (LIMIT, 0)
@@ -0,0 +1,92 @@
+"""Test PerUserUpdateProcessor: paralel antar user, berurutan per user, dibatasi max_concurrent_updates"""
+import asyncio
+
+from telegram import Update
+
+from update_processor import PerUserUpdateProcessor
+
+
+def message_update(update_id: int, user_id: int) -> Update:
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+            'text': 'x'
+        }
+    }, None)
+
+
+async def dispatch(processor, updates, handler):
+    """Seperti Application._update_fetcher: satu task per update, dibuat sesuai urutan datang"""
+    tasks = [asyncio.create_task(processor.process_update(update, handler(update))) for update in updates]
+    await asyncio.gather(*tasks)
+
+
+def test_same_user_sequential_other_users_parallel():
+    events = []
+    running = {}
+    
+    async def handler(update):
+        user_id = update.effective_user.id
+        running[user_id] = running.get(user_id, 0) + 1
+        assert running[user_id] == 1, "dua update user yang sama diproses bersamaan"
+        events.append(('start', update.update_id))
+        # Update pertama user 1 lambat; update user 2 tidak boleh menunggunya
+        await asyncio.sleep(0.2 if update.update_id == 1 else 0.01)
+        events.append(('end', update.update_id))
+        running[user_id] -= 1
+    
+    async def main():
+        processor = PerUserUpdateProcessor(8)
+        updates = [message_update(1, 1), message_update(2, 1), message_update(3, 2), message_update(4, 1)]
+        await dispatch(processor, updates, handler)
+        return processor
+    
+    processor = asyncio.run(main())
+    
+    # Urutan per user dipertahankan
+    user_1 = [update_id for kind, update_id in events if kind == 'start' and update_id in (1, 2, 4)]
+    assert user_1 == [1, 2, 4]
+    # User 2 selesai selagi update pertama user 1 masih berjalan
+    assert events.index(('end', 3)) < events.index(('end', 1))
+    # Lock dibuang setelah semua update selesai
+    assert processor._locks == {} and processor._pending == {}
+
+
+def test_concurrency_bounded():
+    active = 0
+    peak = 0
+    
+    async def handler(update):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+    
+    async def main():
+        processor = PerUserUpdateProcessor(3)
+        await dispatch(processor, [message_update(i, i) for i in range(1, 13)], handler)
+    
+    asyncio.run(main())
+    assert peak == 3
+
+
+def test_update_without_user_not_serialized():
+    finished = []
+    
+    async def handler(update):
+        await asyncio.sleep(0.05 if update == 'slow' else 0)
+        finished.append(update)
+    
+    async def main():
+        processor = PerUserUpdateProcessor(4)
+        await dispatch(processor, ['slow', 'fast'], handler)
+        return processor
+    
+    processor = asyncio.run(main())
+    assert finished == ['fast', 'slow']
+    assert processor._locks == {}
@@ -0,0 +1,60 @@
+"""
+Update processor untuk Application.concurrent_updates
+Update dari user berbeda diproses paralel (dibatasi max_concurrent_updates), sedangkan update
+dari user yang sama tetap diproses satu per satu sesuai urutan datang, sehingga state
+ConversationHandler dan data sementara per user tidak pernah diubah dua update sekaligus
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def _update_key(update: object) -> Optional[int]:
+    """User (atau chat jika tanpa user) pemilik update; None = tidak perlu diurutkan"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Lock per user dibuat saat dibutuhkan dan dibuang begitu tidak ada update user itu yang
+    sedang diproses atau menunggu. asyncio.Lock melayani penunggu secara FIFO, jadi urutan
+    update per user sama dengan urutan diterima
+    """
+    
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._pending: Dict[int, int] = {}
+    
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = _update_key(update)
+        if key is None:
+            await coroutine
+            return
+        
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._pending[key] = self._pending.get(key, 0) + 1
+        try:
+            async with lock:
+                await coroutine
+        finally:
+            self._pending[key] -= 1
+            if not self._pending[key]:
+                del self._pending[key]
+                del self._locks[key]
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        pass
@@ -1,27 +1,88 @@
 """
 Utility functions untuk formatting, chart generation, dan export
 """
+import csv
+import gzip
 import io
-from typing import List, Tuple, Dict
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Backend non-GUI untuk server
-import matplotlib.pyplot as plt
-import seaborn as sns
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal, ROUND_HALF_UP
+from typing import List, Tuple, Dict, Iterable, Sequence, IO, Union
 from datetime import datetime
 
-# Set style untuk chart yang lebih estetik
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (10, 6)
-plt.rcParams['font.size'] = 10
+from config import CURRENCY_DECIMALS
+
+# matplotlib di-import saat chart pertama dibuat (lihat load_chart_libraries),
+# supaya bot yang baru bangun tidak menunggu import berat sebelum bisa menjawab
+_chart_libraries = None
+
+# File export di bawah ukuran ini tetap di memori, di atasnya pindah ke disk
+EXPORT_SPOOL_MAX_SIZE = 1024 * 1024
+
+# Lebar kolom Excel maksimum & jumlah baris awal yang dipakai untuk mengukurnya
+EXCEL_MAX_COLUMN_WIDTH = 50
+EXCEL_WIDTH_SAMPLE_ROWS = 500
+
+# Tanggal tetap untuk properti dokumen & entri zip file Excel: isi sama -> bytes sama,
+# sehingga TelegramFileCache bisa memakai ulang file_id export sebelumnya
+EXCEL_FIXED_TIMESTAMP = datetime(2000, 1, 1)
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Nominal di database & di dalam bot berupa integer satuan terkecil (nominal x AMOUNT_SCALE)
+AMOUNT_SCALE = 10 ** CURRENCY_DECIMALS
+# Batas nominal per transaksi, agar SUM di SQLite jauh dari batas INTEGER 64-bit
+MAX_AMOUNT = 10 ** 15
+
+# Pemisah terakhir diikuti 1..CURRENCY_DECIMALS digit dianggap koma desimal ("12.500,50")
+_DECIMAL_SUFFIX = re.compile(rf'^(.*)[.,](\d{{1,{CURRENCY_DECIMALS}}})$') if CURRENCY_DECIMALS else None
+
+
+def load_chart_libraries():
+    """
+    Import matplotlib (backend Agg) lalu set style chart, hanya sekali per proses.
+    Style whitegrid bawaan matplotlib dipakai tanpa seaborn (seaborn ikut meng-import pandas).
+    Returns pyplot
+    """
+    global _chart_libraries
+    if _chart_libraries is None:
+        import matplotlib
+        matplotlib.use('Agg')  # Backend non-GUI untuk server
+        import matplotlib.pyplot as plt
+        
+        # Set style untuk chart yang lebih estetik
+        plt.style.use('seaborn-v0_8-whitegrid')
+        plt.rcParams['figure.figsize'] = (10, 6)
+        plt.rcParams['font.size'] = 10
+        _chart_libraries = plt
+    return _chart_libraries
+
+
+def to_minor_units(value) -> int:
+    """Nominal (angka atau string angka) -> integer satuan terkecil, dibulatkan"""
+    return int((Decimal(str(value)) * AMOUNT_SCALE).to_integral_value(ROUND_HALF_UP))
+
+
+def from_minor_units(amount: int) -> Decimal:
+    """Integer satuan terkecil -> nominal persis (Decimal), untuk export"""
+    return Decimal(amount).scaleb(-CURRENCY_DECIMALS)
+
+
+def format_amount(amount: float) -> str:
+    """Format nominal (satuan terkecil) dengan pemisah ribuan Indonesia: 1.234.567,50"""
+    text = f"{Decimal(str(amount)).scaleb(-CURRENCY_DECIMALS):,.{CURRENCY_DECIMALS}f}"
+    return text.replace(',', '_').replace('.', ',').replace('_', '.')
 
 
 def format_currency(amount: float) -> str:
-    """Format angka menjadi format Rupiah"""
-    return f"Rp {amount:,.0f}".replace(',', '.')
+    """Format nominal (satuan terkecil) menjadi format Rupiah"""
+    return f"Rp {format_amount(amount)}"
 
 
-def generate_pie_chart(data: List[Tuple], title: str) -> io.BytesIO:
+def generate_pie_chart(data: List[Tuple], title: str, dpi: int = 150) -> io.BytesIO:
     """
     Generate Pie Chart dari data kategori
     Returns BytesIO object yang bisa langsung dikirim ke Telegram
@@ -30,48 +91,15 @@ def generate_pie_chart(data: List[Tuple], title: str) -> io.BytesIO:
         return None
     
     try:
-        # Prepare data
-        categories = [row[0] for row in data]
-        amounts = [row[1] for row in data]
-        
-        # Create figure
-        fig, ax = plt.subplots(figsize=(10, 8))
-        
-        # Color palette yang menarik
-        colors = sns.color_palette("husl", len(categories))
-        
-        # Create pie chart
-        wedges, texts, autotexts = ax.pie(
-            amounts, 
-            labels=categories,
-            autopct='%1.1f%%',
-            startangle=90,
-            colors=colors,
-            textprops={'fontsize': 11}
-        )
-        
-        # Styling
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-        
-        ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
-        
-        # Save to BytesIO
-        buf = io.BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        buf.seek(0)
-        plt.close(fig)
-        
-        return buf
+        from chart_renderers import render_chart
+        return io.BytesIO(render_chart('pie', data, title, dpi=dpi))
     except Exception as e:
         print(f"Error generating pie chart: {e}")
         return None
 
 
 def generate_bar_chart(data: List[Tuple], title: str, xlabel: str = "Kategori", 
-                       ylabel: str = "Nominal (Rp)") -> io.BytesIO:
+                       ylabel: str = "Nominal (Rp)", dpi: int = 150) -> io.BytesIO:
     """
     Generate Bar Chart dari data kategori
     Returns BytesIO object yang bisa langsung dikirim ke Telegram
@@ -80,131 +108,187 @@ def generate_bar_chart(data: List[Tuple], title: str, xlabel: str = "Kategori",
         return None
     
     try:
-        # Prepare data
-        categories = [row[0] for row in data]
-        amounts = [row[1] for row in data]
-        
-        # Create figure
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        # Color palette
-        colors = sns.color_palette("viridis", len(categories))
-        
-        # Create bar chart
-        bars = ax.bar(categories, amounts, color=colors, edgecolor='black', linewidth=0.5)
-        
-        # Add value labels on top of bars
-        for bar in bars:
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'{format_currency(height)}',
-                   ha='center', va='bottom', fontsize=9, rotation=0)
-        
-        # Styling
-        ax.set_xlabel(xlabel, fontsize=12, fontweight='bold')
-        ax.set_ylabel(ylabel, fontsize=12, fontweight='bold')
-        ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
-        
-        # Rotate x labels if too many categories
-        if len(categories) > 5:
-            plt.xticks(rotation=45, ha='right')
-        
-        # Grid
-        ax.yaxis.grid(True, linestyle='--', alpha=0.7)
-        ax.set_axisbelow(True)
-        
-        # Save to BytesIO
-        buf = io.BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        buf.seek(0)
-        plt.close(fig)
-        
-        return buf
+        from chart_renderers import render_chart
+        return io.BytesIO(render_chart('bar', data, title, dpi=dpi, xlabel=xlabel, ylabel=ylabel))
     except Exception as e:
         print(f"Error generating bar chart: {e}")
         return None
 
 
-def export_to_csv(data: List[Dict]) -> io.BytesIO:
+def export_rows_to_csv(rows: Iterable[Sequence], columns: List[str],
+                       compress: bool = False) -> IO[bytes]:
     """
-    Export data ke CSV format
-    Returns BytesIO object
+    Export baris (tuple) ke CSV secara streaming, opsional gzip.
+    Ditulis ke SpooledTemporaryFile sehingga memori tetap konstan berapa pun jumlah baris.
+    Returns file object di posisi awal, atau None jika tidak ada baris
     """
-    if not data:
-        return None
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
     
     try:
-        df = pd.DataFrame(data)
-        buf = io.BytesIO()
-        df.to_csv(buf, index=False, encoding='utf-8-sig')
-        buf.seek(0)
-        return buf
+        # mtime=0 agar isi gzip identik untuk data yang sama
+        raw = gzip.GzipFile(fileobj=out, mode='wb', mtime=0) if compress else out
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        
+        row_count = 0
+        for row in rows:
+            writer.writerow(row)
+            row_count += 1
+        
+        text.detach()  # flush tanpa menutup file di bawahnya
+        if compress:
+            raw.close()  # menulis trailer gzip, tidak menutup `out`
+        
+        if row_count == 0:
+            out.close()
+            return None
+        
+        out.seek(0)
+        return out
     except Exception as e:
         print(f"Error exporting to CSV: {e}")
+        out.close()
         return None
 
 
-def export_to_excel(data: List[Dict], sheet_name: str = "Transaksi") -> io.BytesIO:
+def export_to_csv(data: List[Dict]) -> IO[bytes]:
     """
-    Export data ke Excel format dengan styling
-    Returns BytesIO object
+    Export data (list of dict) ke CSV format
+    Returns file object
     """
     if not data:
         return None
     
+    columns = list(data[0].keys())
+    return export_rows_to_csv((row.values() for row in data), columns)
+
+
+def upload_content(file: IO[bytes]) -> Union[bytes, IO[bytes]]:
+    """
+    Isi file export untuk parameter document send_document.
+    SpooledTemporaryFile yang masih di memori tidak punya nama (name None) dan ditolak
+    InputFile python-telegram-bot, jadi isinya dibaca ke bytes. File di disk dikirim apa adanya
+    """
+    if isinstance(file, bytes) or getattr(file, 'name', None) is not None:
+        return file
+    return file.read()
+
+
+class _FixedTimeZipFile(zipfile.ZipFile):
+    """ZipFile yang menulis semua entri dengan tanggal EXCEL_FIXED_TIMESTAMP, bukan waktu simpan"""
+    
+    def _fixed_info(self, arcname: str) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(arcname, date_time=EXCEL_FIXED_TIMESTAMP.timetuple()[:6])
+        info.compress_type = self.compression
+        info.external_attr = 0o600 << 16
+        return info
+    
+    def writestr(self, zinfo_or_arcname, data, *args, **kwargs):
+        if not isinstance(zinfo_or_arcname, zipfile.ZipInfo):
+            zinfo_or_arcname = self._fixed_info(zinfo_or_arcname)
+        super().writestr(zinfo_or_arcname, data, *args, **kwargs)
+    
+    def write(self, filename, arcname=None, *args, **kwargs):
+        # openpyxl write-only: sheet ditulis ke file sementara lalu disalin ke zip
+        info = self._fixed_info(arcname or os.path.basename(filename))
+        with open(filename, 'rb') as source, self.open(info, 'w', force_zip64=True) as target:
+            shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+
+
+def export_rows_to_excel(rows: Iterable[Sequence], columns: List[str],
+                         sheet_name: str = "Transaksi") -> IO[bytes]:
+    """
+    Export baris (tuple) ke Excel dengan workbook write-only openpyxl.
+    Baris di-stream langsung ke file, tidak ada sheet utuh di memori dan tidak ada
+    pass kedua untuk lebar kolom. Data yang sama selalu menghasilkan bytes yang sama.
+    Returns file object di posisi awal, atau None jika tidak ada baris
+    """
+    out = None
     try:
-        df = pd.DataFrame(data)
-        buf = io.BytesIO()
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+        from openpyxl.writer.excel import ExcelWriter
+        
+        rows = iter(rows)
+        
+        # Workbook write-only menulis lebar kolom sebelum baris pertama, jadi lebar
+        # dihitung bertahap dari header + sampel baris awal yang di-buffer sementara
+        widths = [len(str(column)) for column in columns]
+        sample = []
+        for row in itertools.islice(rows, EXCEL_WIDTH_SAMPLE_ROWS):
+            sample.append(row)
+            for index, value in enumerate(row):
+                if value is not None:
+                    widths[index] = max(widths[index], len(str(value)))
         
-        # Create Excel writer
-        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            # Get workbook and worksheet
-            workbook = writer.book
-            worksheet = writer.sheets[sheet_name]
-            
-            # Auto-adjust column width
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(cell.value)
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
+        if not sample:
+            return None
         
-        buf.seek(0)
-        return buf
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(sheet_name)
+        for index, width in enumerate(widths, 1):
+            worksheet.column_dimensions[get_column_letter(index)].width = min(width + 2, EXCEL_MAX_COLUMN_WIDTH)
+        
+        worksheet.append(columns)
+        for row in itertools.chain(sample, rows):
+            worksheet.append(list(row))
+        
+        # Bukan workbook.save(): save mengisi properties.modified dengan waktu sekarang
+        workbook.properties.created = workbook.properties.modified = EXCEL_FIXED_TIMESTAMP
+        out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
+        ExcelWriter(workbook, _FixedTimeZipFile(out, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)).save()
+        out.seek(0)
+        return out
     except Exception as e:
         print(f"Error exporting to Excel: {e}")
+        if out:
+            out.close()
+        return None
+
+
+def export_to_excel(data: List[Dict], sheet_name: str = "Transaksi") -> IO[bytes]:
+    """
+    Export data (list of dict) ke Excel format
+    Returns file object
+    """
+    if not data:
         return None
+    
+    columns = list(data[0].keys())
+    return export_rows_to_excel((row.values() for row in data), columns, sheet_name)
 
 
-def get_current_month_name() -> str:
-    """Mendapatkan nama bulan saat ini dalam Bahasa Indonesia"""
+def get_current_month_name(month: str = None) -> str:
+    """
+    Mendapatkan nama bulan dalam Bahasa Indonesia
+    month: 'YYYY-MM' (misalnya dari month_bounds), default bulan saat ini
+    """
     months = [
         'Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
         'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember'
     ]
-    return months[datetime.now().month - 1]
+    month_number = int(month[5:7]) if month else datetime.now().month
+    return months[month_number - 1]
 
 
-def validate_amount(text: str) -> Tuple[bool, float]:
+def validate_amount(text: str) -> Tuple[bool, int]:
     """
     Validasi input nominal
-    Returns (is_valid, amount)
+    Returns (is_valid, amount) dengan amount integer satuan terkecil
     """
     try:
+        cleaned = text.replace(' ', '')
+        fraction = ''
+        match = _DECIMAL_SUFFIX.match(cleaned) if _DECIMAL_SUFFIX else None
+        if match:
+            cleaned, fraction = match.groups()
+        
         # Remove common separators
-        cleaned = text.replace('.', '').replace(',', '').replace(' ', '')
-        amount = float(cleaned)
+        cleaned = cleaned.replace('.', '').replace(',', '')
+        amount = to_minor_units(f"{cleaned}.{fraction}" if fraction else cleaned)
         
-        if amount <= 0:
+        if amount <= 0 or amount > MAX_AMOUNT:
             return False, 0
         
         return True, amount
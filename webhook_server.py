@@ -0,0 +1,112 @@
+"""
+Server webhook (tornado) pengganti Application.run_webhook
+Melayani update Telegram dan endpoint /metrics (Prometheus) di port yang sama
+"""
+import asyncio
+import json
+import logging
+import signal
+from http import HTTPStatus
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+from telegram import Update
+
+from metrics import CONTENT_TYPE, render_metrics
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = '/metrics'
+
+
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    """Menerima update dari Telegram dan memasukkannya ke update_queue Application"""
+    
+    def initialize(self, bot_application, secret_token: str = None):
+        self.bot_application = bot_application
+        self.secret_token = secret_token
+    
+    async def post(self):
+        if self.secret_token and self.request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.secret_token:
+            raise tornado.web.HTTPError(HTTPStatus.FORBIDDEN)
+        
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            raise tornado.web.HTTPError(HTTPStatus.BAD_REQUEST)
+        
+        update = Update.de_json(data, self.bot_application.bot)
+        if update:
+            await self.bot_application.update_queue.put(update)
+        self.set_status(HTTPStatus.OK)
+    
+    def log_exception(self, typ, value, tb):
+        logger.error(f"Error handling webhook request: {value}")
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """GET /metrics - jika token diset, wajib header Authorization: Bearer <token>"""
+    
+    def initialize(self, token: str = None):
+        self.token = token
+    
+    def get(self):
+        if self.token and self.request.headers.get('Authorization') != f"Bearer {self.token}":
+            raise tornado.web.HTTPError(HTTPStatus.UNAUTHORIZED)
+        self.set_header('Content-Type', CONTENT_TYPE)
+        self.write(render_metrics())
+
+
+def make_web_app(application, url_path: str, metrics_token: str = None,
+                 secret_token: str = None) -> tornado.web.Application:
+    return tornado.web.Application([
+        (rf"/{url_path.strip('/')}/?", TelegramWebhookHandler,
+         {'bot_application': application, 'secret_token': secret_token}),
+        (METRICS_PATH, MetricsHandler, {'token': metrics_token}),
+    ], log_function=lambda handler: None)
+
+
+async def serve_webhook(application, listen: str, port: int, url_path: str, webhook_url: str = None,
+                        metrics_token: str = None, secret_token: str = None,
+                        stop_event: asyncio.Event = None):
+    """
+    Menjalankan bot sampai SIGINT/SIGTERM (atau stop_event di-set), urutan sama dengan
+    run_webhook: initialize -> post_init -> server & set_webhook -> start, lalu
+    stop -> shutdown -> post_shutdown. webhook_url None = tidak memanggil setWebhook
+    """
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    
+    server = None
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        
+        server = HTTPServer(make_web_app(application, url_path, metrics_token, secret_token))
+        server.listen(port, address=listen)
+        
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url, allowed_updates=Update.ALL_TYPES, secret_token=secret_token
+            )
+        await application.start()
+        
+        await stop_event.wait()
+        logger.info("Stopping bot...")
+    finally:
+        if server is not None:
+            server.stop()
+            await server.close_all_connections()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)